@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+micro-benchmark for the Job body sent on every check run.
+
+Every run used to build the V1PodSpec, V1PodTemplateSpec, V1JobSpec and
+V1Job models from the check spec, which the client then serialized again.
+This times what the client does with the body of create_namespaced_job for
+a freshly built Job against the serialized body a Check now keeps
+(mozalert.check.Check.job_body).
+
+    PYTHONPATH=. python benchmarks/bench_job_body.py [iterations]
+"""
+
+import sys
+import timeit
+
+from kubernetes import client
+
+from mozalert.check import build_job, job_body
+
+NAME = "check-test-1"
+SPEC = {
+    "restart_policy": "Never",
+    "containers": [
+        {
+            "name": NAME,
+            "image": "afrank/mozalert-pinger",
+            "args": ["--url", "https://example.com"],
+            "env": [
+                {"name": "CHECK_URL", "value": "https://example.com"},
+                {"name": "TIMEOUT", "value": "30"},
+            ],
+            "resources": {"limits": {"cpu": "100m", "memory": "64Mi"}},
+        }
+    ],
+}
+
+api_client = client.ApiClient()
+
+
+def before():
+    return api_client.sanitize_for_serialization(build_job(NAME, SPEC))
+
+
+def after(body=job_body(NAME, SPEC)):
+    return api_client.sanitize_for_serialization(body)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    assert before() == after(), "the job bodies differ"
+    old = min(timeit.repeat(before, number=iterations, repeat=5))
+    new = min(timeit.repeat(after, number=iterations, repeat=5))
+    print(f"job body per check run ({iterations} runs, best of 5)")
+    print(f"  before: {old / iterations * 1e6:8.3f} us")
+    print(f"  after:  {new / iterations * 1e6:8.3f} us")
+    print(f"  speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+micro-benchmark for the interval parsing done on every check event.
+
+Every event the controller processes parses the check_interval,
+retry_interval, notification_interval and timeout of the check. This times
+those four calls with the original parse_time (regex compiled on every call,
+returning a timedelta) against mozalert.controller.parse_time.
+
+    PYTHONPATH=. python benchmarks/bench_parse_time.py [iterations]
+"""
+
+import re
+import sys
+import timeit
+from datetime import timedelta
+
+from mozalert.controller import parse_time
+
+SPEC = {
+    "check_interval": "1m",
+    "retry_interval": "30s",
+    "notification_interval": "1h5m",
+    "timeout": "5m",
+}
+
+
+def legacy_parse_time(time_str):
+    """
+    parse_time as it was before it was cached
+    """
+    try:
+        minutes = float(time_str)
+        return timedelta(minutes=minutes)
+    except:
+        pass
+    regex = re.compile(r"((?P<hours>\d+?)h)?((?P<minutes>\d+?)m)?((?P<seconds>\d+?)s)?")
+    parts = regex.match(time_str)
+    if not parts:
+        return
+    parts = parts.groupdict()
+    time_params = {}
+    for name, param in iter(parts.items()):
+        if param:
+            time_params[name] = int(param)
+    return timedelta(**time_params)
+
+
+def legacy_event():
+    return [legacy_parse_time(SPEC[k]).seconds for k in SPEC]
+
+
+def event():
+    return [parse_time(SPEC[k]) for k in SPEC]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    assert legacy_event() == event(), "the parsers disagree"
+    before = min(timeit.repeat(legacy_event, number=iterations, repeat=5))
+    after = min(timeit.repeat(event, number=iterations, repeat=5))
+    print(f"interval parsing per event ({iterations} events, best of 5)")
+    print(f"  before: {before / iterations * 1e6:8.3f} us")
+    print(f"  after:  {after / iterations * 1e6:8.3f} us")
+    print(f"  speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
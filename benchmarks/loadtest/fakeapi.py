@@ -0,0 +1,482 @@
+"""
+an in-process stand-in for the parts of the kubernetes apiserver mozalert
+talks to:
+
+* the checks CRD: list, watch (with bookmarks and 410 Gone for expired
+  resourceVersions) and merge patches of the status subresource
+* Jobs: create, read, delete, and list/watch across namespaces. Every Job
+  runs for job_duration seconds (+/- job_jitter) and then succeeds, or
+  fails with probability failure_rate.
+* Pods: a pod per Job, for listing by app label and reading logs
+* everything else the controller lists at startup answers with an empty list
+
+Every request is delayed by latency seconds and counted by verb and
+resource, so a benchmark can report the QPS the controller puts on the
+apiserver.
+"""
+
+import re
+import json
+import heapq
+import queue
+import random
+import threading
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import sleep, time, monotonic
+from urllib.parse import urlsplit, parse_qs
+
+GROUP = "crd.k8s.afrank.local"
+VERSION = "v1"
+PLURAL = "checks"
+
+CHECKS = re.compile(rf"^/apis/{GROUP}/{VERSION}/{PLURAL}$")
+CHECK_STATUS = re.compile(
+    rf"^/apis/{GROUP}/{VERSION}/namespaces/(?P<ns>[^/]+)/{PLURAL}/(?P<name>[^/]+)/status$"
+)
+JOBS = re.compile(r"^/apis/batch/v1/jobs$")
+NAMESPACED_JOBS = re.compile(r"^/apis/batch/v1/namespaces/(?P<ns>[^/]+)/jobs$")
+JOB = re.compile(
+    r"^/apis/batch/v1/namespaces/(?P<ns>[^/]+)/jobs/(?P<name>[^/]+?)(?P<status>/status)?$"
+)
+PODS = re.compile(r"^/api/v1/namespaces/(?P<ns>[^/]+)/pods$")
+POD_LOG = re.compile(r"^/api/v1/namespaces/(?P<ns>[^/]+)/pods/(?P<name>[^/]+)/log$")
+
+
+def timestamp(t=None):
+    return datetime.fromtimestamp(t or time(), timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+def merge(target, patch):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        elif value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
+
+
+class Resource:
+    """
+    the objects of one kind, with a bounded history of their events for
+    watches to resume from
+    """
+
+    def __init__(self, server, history=100000):
+        self.server = server
+        self.objects = {}
+        self.events = deque(maxlen=history)
+        self.watchers = []
+
+    def emit(self, operation, obj):
+        """
+        record an event; must be called with the server lock held
+        """
+        obj = json.loads(json.dumps(obj))
+        rv = int(obj["metadata"]["resourceVersion"])
+        self.events.append((rv, operation, obj))
+        for q in self.watchers:
+            q.put((operation, obj))
+
+    def since(self, rv):
+        """
+        the events after rv, or None if they're no longer in the history
+        """
+        if self.events and rv < self.events[0][0] - 1:
+            return None
+        return [(op, obj) for v, op, obj in self.events if v > rv]
+
+
+class FakeApiServer:
+    def __init__(self, **kwargs):
+        self.latency = float(kwargs.get("latency", 0))
+        self.job_duration = float(kwargs.get("job_duration", 1))
+        self.job_jitter = float(kwargs.get("job_jitter", 0))
+        self.failure_rate = float(kwargs.get("failure_rate", 0))
+        self.bookmark_interval = float(kwargs.get("bookmark_interval", 10))
+        # called with (namespace, name) when a Job is created, returns when
+        # the controller meant that run to start (see loadtest.py)
+        self.expected_start = kwargs.get("expected_start", None)
+
+        self.lock = threading.RLock()
+        self._rv = 0
+        self.checks = Resource(self)
+        self.jobs = Resource(self)
+        # (deadline, namespace, name, uid) of the running Jobs
+        self._completions = []
+        self._wakeup = threading.Condition(self.lock)
+        self._shutdown = False
+
+        self.requests = Counter()
+        self.status_patches = 0
+        self.jobs_created = 0
+        self.lag = []
+
+        self.httpd = ThreadingHTTPServer(
+            (kwargs.get("host", "127.0.0.1"), int(kwargs.get("port", 0))), Handler
+        )
+        self.httpd.daemon_threads = True
+        self.httpd.api = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_rv(self):
+        self._rv += 1
+        return str(self._rv)
+
+    def start(self):
+        threading.Thread(
+            target=self.httpd.serve_forever, name="fake-apiserver", daemon=True
+        ).start()
+        threading.Thread(
+            target=self.run_jobs, name="fake-apiserver-jobs", daemon=True
+        ).start()
+
+    def stop(self):
+        with self.lock:
+            self._shutdown = True
+            self._wakeup.notify()
+            for resource in [self.checks, self.jobs]:
+                for q in resource.watchers:
+                    q.put(None)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_check(self, namespace, name, spec):
+        with self.lock:
+            obj = {
+                "apiVersion": f"{GROUP}/{VERSION}",
+                "kind": "Check",
+                "metadata": {
+                    "name": name,
+                    "namespace": namespace,
+                    "uid": str(uuid.uuid4()),
+                    "generation": 1,
+                    "resourceVersion": self.next_rv(),
+                },
+                "spec": spec,
+            }
+            self.checks.objects[(namespace, name)] = obj
+            self.checks.emit("ADDED", obj)
+
+    def patch_check_status(self, namespace, name, body):
+        with self.lock:
+            obj = self.checks.objects.get((namespace, name))
+            if obj is None:
+                return None
+            merge(obj, {"status": body.get("status", {})})
+            obj["metadata"]["resourceVersion"] = self.next_rv()
+            self.checks.emit("MODIFIED", obj)
+            self.status_patches += 1
+            return obj
+
+    def create_job(self, namespace, body):
+        name = body["metadata"]["name"]
+        now = time()
+        with self.lock:
+            if (namespace, name) in self.jobs.objects:
+                return None
+            body["metadata"].update(
+                namespace=namespace,
+                uid=str(uuid.uuid4()),
+                creationTimestamp=timestamp(now),
+                resourceVersion=self.next_rv(),
+            )
+            body["status"] = {"active": 1, "startTime": timestamp(now)}
+            self.jobs.objects[(namespace, name)] = body
+            self.jobs.emit("ADDED", body)
+            self.jobs_created += 1
+            duration = self.job_duration + random.uniform(
+                -self.job_jitter, self.job_jitter
+            )
+            heapq.heappush(
+                self._completions,
+                (
+                    monotonic() + max(duration, 0),
+                    namespace,
+                    name,
+                    body["metadata"]["uid"],
+                ),
+            )
+            self._wakeup.notify()
+        if self.expected_start is not None:
+            expected = self.expected_start(namespace, name)
+            if expected is not None:
+                self.lag.append(now - expected)
+        return body
+
+    def delete_job(self, namespace, name):
+        with self.lock:
+            job = self.jobs.objects.pop((namespace, name), None)
+            if job is not None:
+                job["metadata"]["resourceVersion"] = self.next_rv()
+                self.jobs.emit("DELETED", job)
+            return job
+
+    def run_jobs(self):
+        """
+        finish every Job when its duration is up
+        """
+        with self.lock:
+            while not self._shutdown:
+                if not self._completions:
+                    self._wakeup.wait()
+                    continue
+                delay = self._completions[0][0] - monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                _, namespace, name, uid = heapq.heappop(self._completions)
+                job = self.jobs.objects.get((namespace, name))
+                if job is None or job["metadata"]["uid"] != uid:
+                    continue
+                status = {"startTime": job["status"]["startTime"]}
+                if random.random() < self.failure_rate:
+                    status["failed"] = 1
+                else:
+                    status["succeeded"] = 1
+                    status["completionTime"] = timestamp()
+                job["status"] = status
+                job["metadata"]["resourceVersion"] = self.next_rv()
+                self.jobs.emit("MODIFIED", job)
+
+    def pods(self, namespace, selector):
+        app = None
+        for term in (selector or "").split(","):
+            if term.startswith("app="):
+                app = term[len("app=") :]
+        with self.lock:
+            jobs = [
+                job
+                for (ns, name), job in self.jobs.objects.items()
+                if ns == namespace and (app is None or name == app)
+            ]
+            return [
+                {
+                    "metadata": {
+                        "name": f"{job['metadata']['name']}-pod",
+                        "namespace": namespace,
+                        "labels": {"app": job["metadata"]["name"]},
+                    },
+                    "spec": job["spec"]["template"]["spec"],
+                    "status": {
+                        "phase": (
+                            "Succeeded"
+                            if job["status"].get("succeeded")
+                            else "Failed" if job["status"].get("failed") else "Running"
+                        ),
+                        "containerStatuses": [
+                            {
+                                "name": container["name"],
+                                "image": container["image"],
+                                "imageID": "",
+                                "ready": False,
+                                "restartCount": 0,
+                                "state": {
+                                    "running": {"startedAt": job["status"]["startTime"]}
+                                },
+                            }
+                            for container in job["spec"]["template"]["spec"][
+                                "containers"
+                            ]
+                        ],
+                    },
+                }
+                for job in jobs
+            ]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, code, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def status(self, code, reason):
+        self.reply(
+            code,
+            {
+                "kind": "Status",
+                "apiVersion": "v1",
+                "status": "Failure",
+                "reason": reason,
+                "code": code,
+            },
+        )
+
+    def body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def route(self, verb):
+        url = urlsplit(self.path)
+        path = url.path
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        watching = query.get("watch") in ["true", "1", "True"]
+        if watching:
+            verb = "WATCH"
+        for pattern, resource in [
+            (CHECKS, "checks"),
+            (CHECK_STATUS, "checks/status"),
+            (JOBS, "jobs"),
+            (NAMESPACED_JOBS, "jobs"),
+            (JOB, "jobs"),
+            (PODS, "pods"),
+            (POD_LOG, "pods/log"),
+        ]:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            match, resource = None, path.rsplit("/", 1)[-1] or path
+        self.api.requests[(verb, resource)] += 1
+        if self.api.latency and not watching:
+            sleep(self.api.latency)
+        return path, query, match, resource, watching
+
+    def do_GET(self):
+        path, query, match, resource, watching = self.route("GET")
+        api = self.api
+        if resource == "checks" or (resource == "jobs" and JOBS.match(path)):
+            store = api.checks if resource == "checks" else api.jobs
+            if watching:
+                return self.watch(store, query)
+            with api.lock:
+                items = list(store.objects.values())
+                rv = str(api._rv)
+            return self.reply(
+                200, {"items": items, "metadata": {"resourceVersion": rv}}
+            )
+        if resource == "jobs" and match and match.re is JOB:
+            with api.lock:
+                job = api.jobs.objects.get((match["ns"], match["name"]))
+            if job is None:
+                return self.status(404, "NotFound")
+            return self.reply(200, job)
+        if resource == "pods" and match:
+            return self.reply(
+                200,
+                {
+                    "items": api.pods(match["ns"], query.get("labelSelector")),
+                    "metadata": {},
+                },
+            )
+        if resource == "pods/log" and match:
+            return self.reply(200, b"Check finished with status code 0\n")
+        # anything else the controller lists (runner pods, leases, ...)
+        return self.reply(200, {"items": [], "metadata": {"resourceVersion": "0"}})
+
+    def do_POST(self):
+        path, query, match, resource, _ = self.route("POST")
+        if resource == "jobs" and match and match.re is NAMESPACED_JOBS:
+            job = self.api.create_job(match["ns"], self.body())
+            if job is None:
+                return self.status(409, "Conflict")
+            return self.reply(201, job)
+        return self.status(404, "NotFound")
+
+    def do_PATCH(self):
+        path, query, match, resource, _ = self.route("PATCH")
+        if resource == "checks/status":
+            obj = self.api.patch_check_status(match["ns"], match["name"], self.body())
+            if obj is None:
+                return self.status(404, "NotFound")
+            return self.reply(200, obj)
+        return self.status(404, "NotFound")
+
+    def do_DELETE(self):
+        path, query, match, resource, _ = self.route("DELETE")
+        self.body()
+        if resource == "jobs" and match and match.re is JOB:
+            job = self.api.delete_job(match["ns"], match["name"])
+            if job is None:
+                return self.status(404, "NotFound")
+            return self.reply(200, job)
+        return self.status(404, "NotFound")
+
+    def watch(self, store, query):
+        """
+        stream the events after the requested resourceVersion, one JSON
+        object per line, until timeoutSeconds is up
+        """
+        api = self.api
+        q = queue.Queue()
+        with api.lock:
+            rv = int(query.get("resourceVersion") or api._rv)
+            backlog = store.since(rv)
+            store.watchers.append(q)
+        # events are sent as chunks, which the client reads as they come
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self.stream_events(q, backlog, rv, query)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            with api.lock:
+                store.watchers.remove(q)
+
+    def stream_events(self, q, backlog, rv, query):
+        api = self.api
+        if backlog is None:
+            self.write_event(
+                "ERROR",
+                {
+                    "kind": "Status",
+                    "status": "Failure",
+                    "reason": "Expired",
+                    "message": f"too old resource version: {rv}",
+                    "code": 410,
+                },
+            )
+            return
+        for operation, obj in backlog:
+            self.write_event(operation, obj)
+        deadline = monotonic() + float(query.get("timeoutSeconds") or 3600)
+        bookmarks = query.get("allowWatchBookmarks") in ["true", "True"]
+        next_bookmark = monotonic() + api.bookmark_interval
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = q.get(timeout=min(remaining, 1))
+            except queue.Empty:
+                event = ()
+            if event is None:
+                return
+            if event:
+                self.write_event(*event)
+            if bookmarks and monotonic() > next_bookmark:
+                next_bookmark = monotonic() + api.bookmark_interval
+                self.write_event(
+                    "BOOKMARK", {"metadata": {"resourceVersion": str(api._rv)}}
+                )
+
+    def write_event(self, operation, obj):
+        line = (json.dumps({"type": operation, "object": obj}) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+load test for the threaded controller.
+
+Runs the real mozalert Controller against the in-process fake apiserver in
+fakeapi.py, with as many checks as you like, and reports how it keeps up:
+
+* scheduling lag: how late each check run's Job was created, compared to
+  when the check meant to start it (its next_check)
+* threads and RSS of the process
+* apiserver requests per second, by verb and resource
+* check status writes per second
+
+    PYTHONPATH=. python benchmarks/loadtest/loadtest.py --checks 10000 \\
+        --interval 1m --duration 300
+
+The controller is configured from the environment as usual, e.g. set
+MOZALERT_MAX_RUNNING or MOZALERT_STATUS_QPS to see how they change the
+numbers. The controller's service endpoint binds port 8080, so that has to
+be free.
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import threading
+from time import sleep, monotonic
+
+from fakeapi import FakeApiServer
+
+
+def rss_bytes():
+    """
+    the resident set size of this process
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    # ru_maxrss is the peak, in kilobytes on linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def timings(controller):
+    """
+    the count and mean of each of the controller's hot path histograms
+    """
+    from mozalert.metrics import TIMINGS
+
+    registry = controller.metrics_thread.registry
+    result = {}
+    for key in TIMINGS:
+        count = registry.get_sample_value(f"{key}_count") or 0
+        total = registry.get_sample_value(f"{key}_sum") or 0
+        result[key] = (int(count), total / count if count else float("nan"))
+    return result
+
+
+def kubeconfig(url):
+    """
+    a kubeconfig pointing at the fake apiserver
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="mozalert-loadtest-"), "config")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "apiVersion": "v1",
+                "kind": "Config",
+                "clusters": [{"name": "fake", "cluster": {"server": url}}],
+                "users": [{"name": "fake", "user": {"token": "fake"}}],
+                "contexts": [
+                    {"name": "fake", "context": {"cluster": "fake", "user": "fake"}}
+                ],
+                "current-context": "fake",
+            },
+            f,
+        )
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--namespaces", type=int, default=10)
+    parser.add_argument(
+        "--interval", default="1m", help="check_interval, a bare number is minutes"
+    )
+    parser.add_argument("--duration", type=float, default=120, help="seconds")
+    parser.add_argument("--sample", type=float, default=5, help="seconds")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds")
+    parser.add_argument("--job-duration", type=float, default=2, help="seconds")
+    parser.add_argument("--job-jitter", type=float, default=1, help="seconds")
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--json", action="store_true", help="print a JSON summary")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(threadName)s %(message)s",
+    )
+    # thousands of checks share a few connection pools, which urllib3
+    # complains about on every request
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    # the controller must not think it's in a cluster
+    os.environ.pop("KUBERNETES_PORT", None)
+
+    controller = None
+
+    def expected_start(namespace, name):
+        check = controller.threads.get(f"{namespace}/{name}") if controller else None
+        return getattr(check, "_next_run", None)
+
+    api = FakeApiServer(
+        latency=args.latency,
+        job_duration=args.job_duration,
+        job_jitter=args.job_jitter,
+        failure_rate=args.failure_rate,
+        expected_start=expected_start,
+    )
+    api.start()
+    os.environ["KUBECONFIG"] = kubeconfig(api.url)
+
+    for i in range(args.checks):
+        api.add_check(
+            f"loadtest-{i % args.namespaces}",
+            f"check-{i}",
+            {
+                "image": "afrank/mozalert-pinger",
+                "check_url": f"http://example.invalid/{i}",
+                "check_interval": args.interval,
+                "timeout": "5m",
+            },
+        )
+
+    from mozalert.controller import Controller
+
+    start_threads = threading.active_count()
+    start_rss = rss_bytes()
+    controller = Controller()
+    runner = threading.Thread(target=controller.run, name="controller", daemon=True)
+    started = monotonic()
+    runner.start()
+
+    samples = []
+    seen_lag = 0
+    last = {"t": monotonic(), "requests": 0, "patches": 0}
+    print(
+        f"{'t':>6} {'checks':>7} {'threads':>7} {'rss MB':>7} {'api qps':>8} "
+        f"{'status/s':>8} {'jobs':>6} {'lag p50':>8} {'lag p99':>8}"
+    )
+    while monotonic() - started < args.duration:
+        sleep(args.sample)
+        now = monotonic()
+        requests = sum(api.requests.values())
+        elapsed = now - last["t"]
+        lag = api.lag[seen_lag:]
+        seen_lag += len(lag)
+        sample = {
+            "t": round(now - started, 1),
+            "checks": len(controller.threads),
+            "threads": threading.active_count(),
+            "rss": rss_bytes(),
+            "qps": (requests - last["requests"]) / elapsed,
+            "status_writes": (api.status_patches - last["patches"]) / elapsed,
+            "jobs": api.jobs_created,
+            "lag_p50": percentile(lag, 50),
+            "lag_p99": percentile(lag, 99),
+        }
+        samples.append(sample)
+        last = {"t": now, "requests": requests, "patches": api.status_patches}
+        print(
+            f"{sample['t']:6.0f} {sample['checks']:7d} {sample['threads']:7d} "
+            f"{sample['rss'] / 2 ** 20:7.1f} {sample['qps']:8.1f} "
+            f"{sample['status_writes']:8.1f} {sample['jobs']:6d} "
+            f"{sample['lag_p50']:8.3f} {sample['lag_p99']:8.3f}"
+        )
+
+    elapsed = monotonic() - started
+    summary = {
+        "checks": args.checks,
+        "duration": round(elapsed, 1),
+        "threads_before": start_threads,
+        "threads_max": max(s["threads"] for s in samples) if samples else None,
+        "rss_before": start_rss,
+        "rss_max": max(s["rss"] for s in samples) if samples else None,
+        "jobs_created": api.jobs_created,
+        "status_writes": api.status_patches,
+        "status_writes_per_second": api.status_patches / elapsed,
+        "api_qps": sum(api.requests.values()) / elapsed,
+        "api_requests": {
+            f"{verb} {resource}": count
+            for (verb, resource), count in sorted(api.requests.items())
+        },
+        "lag_p50": percentile(api.lag, 50),
+        "lag_p90": percentile(api.lag, 90),
+        "lag_p99": percentile(api.lag, 99),
+        "lag_max": max(api.lag) if api.lag else None,
+        "timings": timings(controller),
+        "metrics_queue_depth": controller.metrics_queue.qsize(),
+        "metrics_dropped": controller.metrics_queue.dropped,
+    }
+
+    print()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for key, value in summary.items():
+            if key == "timings":
+                print("controller timings:")
+                for name, (count, mean) in value.items():
+                    print(f"  {name:<36} {count:8d} {mean:8.3f}s mean")
+            elif key == "api_requests":
+                print("api requests:")
+                for name, count in value.items():
+                    print(f"  {name:<24} {count:8d} {count / elapsed:8.1f}/s")
+            elif isinstance(value, float):
+                print(f"{key:<26} {value:.3f}")
+            else:
+                print(f"{key:<26} {value}")
+
+    # shutting the controller down cleanly would wait on every running
+    # check, there's nothing to keep
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,34 @@
 #!/bin/bash
 
+if [[ "$1" == "--batch" ]]; then
+	# batch mode: each argument is <timeout>:<url>. Every url is checked,
+	# PING_CONCURRENCY at a time, and one result line is printed per url:
+	# MOZALERT_RESULT {"index": N, "url": "...", "code": N, "seconds": N}
+	shift
+	ping() {
+		index=$1
+		timeout=${2%%:*}
+		url=${2#*:}
+		start=$(date +%s%N)
+		wget -q -O- --timeout="$timeout" --tries=1 "$url" >/dev/null 2>&1
+		res=$?
+		end=$(date +%s%N)
+		seconds=$(awk "BEGIN { printf \"%.3f\", ($end - $start) / 1000000000 }")
+		url=${url//\\/\\\\}
+		url=${url//\"/\\\"}
+		printf 'MOZALERT_RESULT {"index": %d, "url": "%s", "code": %d, "seconds": %s}\n' \
+			"$index" "$url" "$res" "$seconds"
+	}
+	export -f ping
+	i=0
+	for arg in "$@"; do
+		printf '%d\0%s\0' "$i" "$arg"
+		((i++))
+	done | xargs -0 -n2 -P "${PING_CONCURRENCY:-32}" bash -c 'ping "$0" "$1"'
+	echo "Batch of $# urls finished"
+	exit 0
+fi
+
 if [[ ! $1 ]]; then
 	echo "Must specify URL to check"
 	exit 2
@@ -0,0 +1,201 @@
+import os
+import logging
+import threading
+from collections import deque
+
+from prometheus_client.core import GaugeMetricFamily
+
+
+class AdmissionController:
+    """
+    the AdmissionController bounds how many checks have a pod running at
+    once, both in total (max_running) and in each namespace
+    (max_per_namespace), so a burst of due checks can't exhaust a
+    namespace's ResourceQuota or the cluster's capacity. A limit of 0 means
+    no limit.
+
+    Checks don't hold a scheduler worker while their Job runs, but checks
+    with execution: pool do. The controller gives the scheduler a worker
+    for each of max_running on top of its own, so these limits are what
+    bounds the running checks. Without a global limit, pooled checks are
+    also bounded by MOZALERT_SCHEDULER_WORKERS.
+
+    Checks over the limits wait in a queue without holding a scheduler
+    worker. Each namespace has its own queue and they are served round
+    robin, so one namespace with many due checks can't starve the others.
+    Checks which are retrying or escalated are admitted before the rest,
+    since those are the results someone is waiting on.
+    """
+
+    def __init__(self, **kwargs):
+        self._shutdown = False
+        self.scheduler = kwargs.get("scheduler", None)
+        self._max_running = int(
+            kwargs.get("max_running", os.environ.get("MOZALERT_MAX_RUNNING", 0))
+        )
+        self._max_per_namespace = int(
+            kwargs.get(
+                "max_per_namespace",
+                os.environ.get("MOZALERT_MAX_RUNNING_PER_NAMESPACE", 0),
+            )
+        )
+        self._lock = threading.Lock()
+        self._running = 0
+        # namespace -> running checks
+        self._namespaces = {}
+        # namespace -> (priority queue, normal queue) of (name, function)
+        self._queues = {}
+        # the namespaces with queued checks, in the order they're served
+        self._rotation = deque()
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def max_running(self):
+        return self._max_running
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def queued(self):
+        with self._lock:
+            return sum(len(q) for queues in self._queues.values() for q in queues)
+
+    def terminate(self):
+        logging.info("Stopping admission controller")
+        with self._lock:
+            self._shutdown = True
+            self._queues.clear()
+            self._rotation.clear()
+
+    def _has_room(self, namespace):
+        if self._max_running > 0 and self._running >= self._max_running:
+            return False
+        if (
+            self._max_per_namespace > 0
+            and self._namespaces.get(namespace, 0) >= self._max_per_namespace
+        ):
+            return False
+        return True
+
+    def _take(self, namespace):
+        self._running += 1
+        self._namespaces[namespace] = self._namespaces.get(namespace, 0) + 1
+
+    def submit(self, namespace, function, name=None, priority=False):
+        """
+        run function once a slot in namespace is free: right away on the
+        calling thread if there's room, otherwise from the scheduler when
+        an earlier check releases its slot. Whoever runs function must call
+        release(namespace) once its pod is gone.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            if not self._queues.get(namespace) and self._has_room(namespace):
+                self._take(namespace)
+                admitted = True
+            else:
+                if namespace not in self._queues:
+                    self._queues[namespace] = (deque(), deque())
+                    self._rotation.append(namespace)
+                self._queues[namespace][0 if priority else 1].append((name, function))
+                admitted = False
+        if admitted:
+            function()
+        else:
+            logging.debug(f"Queued {name} until a slot in {namespace} is free")
+
+    def admit(self, namespace):
+        """
+        take a slot in namespace right away, past the limits if need be.
+        This is for checks whose pod is already running, like a job adopted
+        from the previous controller, which count against the limits but
+        have nothing to wait for. They call release(namespace) as usual.
+        """
+        with self._lock:
+            self._take(namespace)
+
+    def release(self, namespace):
+        """
+        give back a slot taken by submit and start whatever can run now
+        """
+        with self._lock:
+            self._running -= 1
+            self._namespaces[namespace] -= 1
+            if not self._namespaces[namespace]:
+                del self._namespaces[namespace]
+            ready = self._next_ready()
+        for name, function in ready:
+            self.start(name, function)
+
+    def _next_ready(self):
+        """
+        pop every queued check which fits in the limits. Priority checks go
+        first; within a tier the namespaces take turns.
+        """
+        ready = []
+        while not self._shutdown:
+            item = self._pop(0) or self._pop(1)
+            if item is None:
+                break
+            ready.append(item)
+        return ready
+
+    def _pop(self, tier):
+        for _ in range(len(self._rotation)):
+            namespace = self._rotation[0]
+            self._rotation.rotate(-1)
+            queue = self._queues[namespace][tier]
+            if not queue or not self._has_room(namespace):
+                continue
+            item = queue.popleft()
+            self._take(namespace)
+            if not any(self._queues[namespace]):
+                del self._queues[namespace]
+                self._rotation.remove(namespace)
+            return item
+        return None
+
+    def start(self, name, function):
+        if self.scheduler is not None:
+            # the check already took its turn at the start rate when it
+            # came due
+            self.scheduler.schedule(0, function, name=name, rate_limited=False)
+        else:
+            threading.Thread(target=function, name=name).start()
+
+    def collect(self):
+        """
+        the limits, running and queued checks as prometheus metrics, so
+        the controller can be registered as a collector
+        """
+        limits = GaugeMetricFamily(
+            "mozalert_admission_limit",
+            "the most checks allowed to run at once, 0 is unlimited "
+            "(pooled checks are still bounded by the scheduler workers)",
+            labels=["scope"],
+        )
+        limits.add_metric(["global"], self._max_running)
+        limits.add_metric(["namespace"], self._max_per_namespace)
+        running = GaugeMetricFamily(
+            "mozalert_admission_running",
+            "checks running",
+            labels=["namespace"],
+        )
+        queued = GaugeMetricFamily(
+            "mozalert_admission_queued",
+            "checks waiting for a slot",
+            labels=["namespace", "priority"],
+        )
+        with self._lock:
+            for namespace, count in self._namespaces.items():
+                running.add_metric([namespace], count)
+            for namespace, (high, normal) in self._queues.items():
+                queued.add_metric([namespace, "true"], len(high))
+                queued.add_metric([namespace, "false"], len(normal))
+        return [limits, running, queued]
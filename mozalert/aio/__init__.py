@@ -0,0 +1,4 @@
+"""
+the asyncio engine for mozalert. This requires the optional
+kubernetes_asyncio package.
+"""
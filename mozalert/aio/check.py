@@ -0,0 +1,296 @@
+import sys
+import logging
+import asyncio
+from time import monotonic
+
+from types import SimpleNamespace
+import datetime
+import pytz
+
+from kubernetes_asyncio.client.rest import ApiException
+
+from mozalert.status import EnumStatus, EnumState
+from mozalert.base import BaseCheck
+from mozalert.check import Check
+from mozalert.jobwatch import job_status
+from mozalert.metrics import observe
+from mozalert.utils.backoff import backoff, retryable
+
+
+class AsyncCheck(BaseCheck):
+    """
+    the AsyncCheck is the asyncio counterpart of Check. It shares all of the
+    interval logic with BaseCheck, but every run is a coroutine on the
+    controller's event loop instead of a thread, and the clients are
+    kubernetes_asyncio clients:
+    * the next run is a loop.call_later handle instead of a timer
+    * run_job, get_job_logs, get_job_status and delete_job are coroutines
+    * set_crd_status and escalate only schedule work on the loop, so they
+      can still be called from the BaseCheck bookkeeping
+    """
+
+    def __init__(self, **kwargs):
+        self.client = kwargs.get("client")
+        self.pod_client = kwargs.get("pod_client")
+        self.crd_client = kwargs.get("crd_client")
+        self._loop = kwargs.get("loop", None) or asyncio.get_event_loop()
+        # caps how many checks may have a job in flight at once
+        self._concurrency = kwargs.get("concurrency", None)
+        # the controller's aiohttp session, used by probes and escalations
+        self.http_session = kwargs.get("http_session", None)
+        self._task = None
+        self._status_task = None
+        self._status_dirty = False
+        # background work (status patches, escalations, cleanup) is tracked
+        # here so the loop doesn't drop the tasks before they finish
+        self._background = set()
+        self._job_body = None
+
+        super().__init__(**kwargs)
+
+    # the serialized Job is built once, as for threaded checks
+    job_body = Check.job_body
+
+    def spawn(self, coro):
+        """
+        run coro in the background on the loop
+        """
+        task = self._loop.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def schedule_check(self, delay):
+        return self._loop.call_later(delay, self._start_check)
+
+    def _start_check(self):
+        self._task = self._loop.create_task(self.check())
+
+    async def check(self):
+        """
+        the coroutine version of BaseCheck.check
+        """
+        if self._concurrency is not None:
+            async with self._concurrency:
+                await self._check()
+        else:
+            await self._check()
+
+    async def _check(self):
+        self.begin_check()
+        try:
+            await self.run_job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.info(sys.exc_info()[0])
+            logging.info(e)
+        logging.info(f"Check {self} finished")
+        await self.delete_job()
+        self.finish_check()
+
+    def terminate(self, join=False, keep_job=False):
+        """
+        cancel the next run and any running check, then clean up the job in
+        the background. Use join() to wait for all of it to finish. With
+        keep_job a running job is left alone, as for threaded checks.
+        """
+        self.shutdown = True
+        self._keep_job = keep_job
+        logging.debug(f"Stopping check {self}")
+        if self._thread:
+            self._thread.cancel()
+        if self._task and not self._task.done():
+            self._task.cancel()
+        if not keep_job:
+            self.spawn(self.delete_job())
+
+    async def join(self):
+        tasks = list(self._background)
+        if self._task:
+            tasks.append(self._task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def escalate(self, recovery=False):
+        self.escalated = not recovery
+        for esc in self.config.escalations:
+            self.spawn(self._escalate(esc))
+
+    async def _escalate(self, esc):
+        escalation_type = esc.get("type", "email")
+        logging.info(f"Escalating {self} via {escalation_type}")
+        try:
+            await self.build_escalation(esc).arun(session=self.http_session)
+        except Exception as e:
+            logging.error(
+                f"Failed to send escalation type {escalation_type} for {self}"
+            )
+            logging.error(sys.exc_info()[0])
+            logging.error(e)
+
+    def set_crd_status(self):
+        """
+        patches are sent by a single background task per check. Calls made
+        while a patch is in flight are folded into one follow-up patch of the
+        latest status.
+        """
+        self._status_dirty = True
+        if self._status_task is None or self._status_task.done():
+            self._status_task = self.spawn(self._patch_status())
+
+    async def _patch_status(self):
+        while self._status_dirty:
+            self._status_dirty = False
+            started = monotonic()
+            try:
+                await self.crd_client.patch_namespaced_custom_object_status(
+                    "crd.k8s.afrank.local",
+                    "v1",
+                    self.config.namespace,
+                    "checks",
+                    self.config.name,
+                    body=self.status.to_patch(),
+                )
+            except Exception as e:
+                logging.debug(sys.exc_info()[0])
+                logging.debug(e)
+                continue
+            observe(
+                self.metrics_queue,
+                "mozalert_status_patch_seconds",
+                monotonic() - started,
+            )
+
+    async def run_job(self):
+        """
+        the coroutine version of Check.run_job
+        """
+        job = self.job_body
+        tries = 0
+        max_tries = self._create_retries
+        while tries < max_tries:
+            try:
+                started = monotonic()
+                await self.client.create_namespaced_job(
+                    body=job, namespace=self.config.namespace
+                )
+                observe(
+                    self.metrics_queue,
+                    "mozalert_job_create_seconds",
+                    monotonic() - started,
+                )
+                break
+            except ApiException as e:
+                if not retryable(e):
+                    logging.info(e.reason)
+                    raise
+                if e.status == 409:
+                    logging.debug(
+                        "Found another job already running. Deleting that job"
+                    )
+                    await self.delete_job()
+                else:
+                    logging.info(f"Failed to create the job ({e.reason}), retrying")
+                tries += 1
+                if tries < max_tries:
+                    await asyncio.sleep(
+                        backoff(tries - 1, self._retry_backoff, self._max_retry_backoff)
+                    )
+
+        if tries >= max_tries:
+            raise Exception(
+                f"Max attempts to start the job ({tries}/{max_tries}) exceeded"
+            )
+
+        self.status.state = EnumState.RUNNING
+        self.set_crd_status()
+
+        self._job_poller.reset()
+        while True:
+            status = await self.get_job_status()
+            if self.update_job_status(status):
+                self._job_poller.record(self._runtime.total_seconds())
+                await self.get_job_logs()
+                if self.log_store is not None:
+                    await self._loop.run_in_executor(None, self.store_logs)
+                break
+            if self.timed_out:
+                logging.info(f"Job Timeout triggered for {self}")
+                self.status.status = EnumStatus.CRITICAL
+                self.status.state = EnumState.IDLE
+                self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+                self.set_crd_status()
+                raise Exception("Job Timeout")
+            await asyncio.sleep(self._job_poller.next())
+        logging.info(
+            f"Job {self} finished in {self._runtime.total_seconds()} seconds with status {self.status.status.name}"
+        )
+        self.status.state = EnumState.IDLE
+        self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+        self.set_crd_status()
+
+    async def get_job_logs(self):
+        try:
+            res = await self.pod_client.list_namespaced_pod(
+                namespace=self.config.namespace,
+                label_selector=f"app={self.config.name}",
+            )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            self.status.logs = ""
+            return
+
+        logs = self.new_log_buffer()
+        capture = self.new_log_capture()
+        for pod in res.items:
+            tail_lines = None if capture is not None else logs.max_lines + 1
+            try:
+                resp = await self.pod_client.read_namespaced_pod_log(
+                    pod.metadata.name,
+                    self.config.namespace,
+                    tail_lines=tail_lines,
+                    _preload_content=False,
+                )
+            except Exception as e:
+                logging.debug(sys.exc_info()[0])
+                logging.debug(e)
+                continue
+            try:
+                async for chunk in resp.content.iter_chunked(4096):
+                    logs.feed(chunk)
+                    if capture is not None:
+                        capture.write(chunk)
+            finally:
+                resp.release()
+            logs.close(tail_lines=tail_lines)
+        self.status.logs = logs.getvalue()
+        self.set_log_capture(capture)
+
+    async def get_job_status(self):
+        try:
+            res = await self.client.read_namespaced_job_status(
+                self.config.name, self.config.namespace
+            )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            return SimpleNamespace(
+                uid=None, active=False, succeeded=False, failed=True, start_time=None
+            )
+
+        return job_status(res)
+
+    async def delete_job(self):
+        try:
+            await self.client.delete_namespaced_job(
+                self.config.name,
+                self.config.namespace,
+                propagation_policy="Foreground",
+                grace_period_seconds=0,
+            )
+        except ApiException as e:
+            # failure is probably ok here, if the job doesn't exist
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
@@ -0,0 +1,170 @@
+import os
+import sys
+import logging
+import asyncio
+import signal
+
+from kubernetes_asyncio import client, config, watch
+
+from mozalert.controller import Controller
+from mozalert.metrics import MetricsThread
+from mozalert.service import ServiceEndpoint
+from mozalert.aio.check import AsyncCheck
+from mozalert.aio.probe import AsyncProbeCheck, aiohttp
+from mozalert.probe import PROBE_TYPES
+
+
+class AsyncController(Controller):
+    """
+    the AsyncController is the asyncio engine for mozalert. Event handling is
+    shared with the threaded Controller, but the watch loop, the cluster
+    monitor and every check run as coroutines on a single event loop over the
+    kubernetes_asyncio client, so a check costs a few objects rather than a
+    thread.
+
+    Metrics and the service endpoint are still run on their own threads.
+    """
+
+    def setup(self, **kwargs):
+        # the async clients can only be created once the loop is running,
+        # see setup_clients
+        self._clients = {}
+        # status patches are coalesced per check by AsyncCheck itself
+        self.status_writer = None
+        self.sharding = None
+        # checks start from their status alone on the asyncio engine
+        self.snapshotter = None
+        self._snapshot = {}
+        # escalations are spawned on the loop by AsyncCheck
+        self.escalation_dispatcher = None
+        self.log_store = None
+        # checks always run as jobs on the asyncio engine
+        self.runner_pool = None
+        self.batcher = None
+        self._concurrency_limit = int(
+            kwargs.get(
+                "concurrency", os.environ.get("MOZALERT_ASYNC_CONCURRENCY", 1000)
+            )
+        )
+        self._loop = None
+        self._watch = None
+        self._monitor_task = None
+        self._main_task = None
+        # shared by every http probe and escalation, see AsyncProbeCheck
+        self._http_session = None
+
+    async def setup_clients(self):
+        if "KUBERNETES_PORT" in os.environ:
+            config.load_incluster_config()
+        else:
+            await config.load_kube_config()
+
+        self._api_client = client.ApiClient()
+        self._clients = {
+            "client": client.BatchV1Api(self._api_client),
+            "pod_client": client.CoreV1Api(self._api_client),
+            "crd_client": client.CustomObjectsApi(self._api_client),
+        }
+
+    def new_check(self, **kwargs):
+        cls = AsyncCheck
+        if kwargs.get("check_type") in PROBE_TYPES:
+            cls = AsyncProbeCheck
+        kwargs["http_session"] = self._http_session
+        return cls(
+            loop=self._loop,
+            concurrency=self._concurrency,
+            metrics_queue=self.metrics_queue,
+            **self.clients,
+            **kwargs,
+        )
+
+    def terminate(self, signum=-1, frame=None):
+        logging.info("Received SIGTERM. Shutting down.")
+        self._shutdown = True
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        if self._watch:
+            self._watch.stop()
+        # the watch only notices stop() on the next event, so cancel the
+        # main task to get out of a quiet stream
+        if self._main_task:
+            self._main_task.cancel()
+
+    async def cluster_monitor(self):
+        """
+        the coroutine version of the check_cluster thread
+        """
+        while not self.shutdown:
+            await asyncio.sleep(self._check_cluster_interval)
+            logging.info("Checking Cluster Status")
+            try:
+                check_list = await self.clients[
+                    "crd_client"
+                ].list_cluster_custom_object(self.domain, self.version, self.plural)
+                self.audit_checks(check_list.get("items"))
+            except Exception as e:
+                logging.info(sys.exc_info()[0])
+                logging.info(e)
+
+    def run(self):
+        return asyncio.run(self.arun())
+
+    async def arun(self):
+        """
+        the asyncio version of Controller.run
+        """
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        self._concurrency = asyncio.Semaphore(self._concurrency_limit)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self._loop.add_signal_handler(sig, self.terminate)
+
+        await self.setup_clients()
+        if aiohttp is not None:
+            self._http_session = aiohttp.ClientSession()
+
+        self.metrics_thread = MetricsThread(q=self.metrics_queue)
+        self.metrics_thread.setName("metrics-thread")
+        self.metrics_thread.start()
+
+        self.service_thread = ServiceEndpoint(registry=self.metrics_thread.registry)
+        self.service_thread.setName("service-endpoint")
+        self.service_thread.start()
+
+        self._monitor_task = self._loop.create_task(self.cluster_monitor())
+
+        logging.info("Waiting for events...")
+        try:
+            while not self.shutdown:
+                self._watch = watch.Watch()
+                async for event in self._watch.stream(
+                    self.clients["crd_client"].list_cluster_custom_object,
+                    self.domain,
+                    self.version,
+                    self.plural,
+                    resource_version=self._resource_version,
+                ):
+                    self.handle_event(event)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.shutdown_checks()
+        logging.info("Controller shut down")
+
+    async def shutdown_checks(self):
+        """
+        stop every check and wait for their jobs to be cleaned up
+        """
+        self._shutdown = True
+        for t in self.threads.keys():
+            self._threads[t].terminate()
+        await asyncio.gather(
+            *[self._threads[t].join() for t in self.threads.keys()],
+            return_exceptions=True,
+        )
+        self.metrics_thread.terminate()
+        self.service_thread.terminate()
+        await self._api_client.close()
+        if self._http_session is not None:
+            await self._http_session.close()
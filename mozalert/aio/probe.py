@@ -0,0 +1,79 @@
+import sys
+import logging
+import asyncio
+from time import monotonic
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from mozalert.status import EnumState
+from mozalert.aio.check import AsyncCheck
+from mozalert.probe import (
+    tcp_target,
+    http_ok,
+    record_probe,
+    finish_probe,
+    MAX_DRAIN_BYTES,
+)
+
+
+class AsyncProbeCheck(AsyncCheck):
+    """
+    the asyncio counterpart of ProbeCheck. http checks share the
+    controller's aiohttp session (http_session), so connections are pooled
+    across every check on the loop.
+    """
+
+    async def run_job(self):
+        self.status.state = EnumState.RUNNING
+        self.set_crd_status()
+
+        start = monotonic()
+        try:
+            result = await self.probe()
+            ok = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            result = f"{type(e).__name__}: {e}"
+            ok = False
+        record_probe(self, ok, result, monotonic() - start)
+        if self.log_store is not None:
+            await self._loop.run_in_executor(None, self.store_logs)
+        finish_probe(self)
+
+    async def probe(self):
+        timeout = self.config.timeout or None
+        if self.config.check_type == "tcp":
+            host, port = tcp_target(self.config.check_url)
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout
+            )
+            writer.close()
+            await writer.wait_closed()
+            return "connected"
+        if aiohttp is None or self.http_session is None:
+            raise Exception("http checks on the asyncio engine need aiohttp")
+        async with self.http_session.get(
+            self.config.check_url, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as resp:
+            status = resp.status
+            # read off the body, see mozalert.probe.drain
+            read = 0
+            async for chunk in resp.content.iter_chunked(65536):
+                read += len(chunk)
+                if read > MAX_DRAIN_BYTES:
+                    break
+        if not http_ok(status, self.config.expected_status):
+            raise Exception(f"unexpected status {status}")
+        return f"status {status}"
+
+    async def get_job_logs(self):
+        pass
+
+    async def delete_job(self):
+        pass
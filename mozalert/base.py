@@ -1,13 +1,23 @@
+import os
 import sys
 import logging
 import threading
+import tempfile
+from time import time
 
 from types import SimpleNamespace
 import datetime
 import pytz
 
 from mozalert.status import EnumState, EnumStatus, Status
-from mozalert.metrics import MetricsQueueItem
+from mozalert.metrics import MetricsQueueItem, observe
+from mozalert.escalations import get_escalation
+from mozalert.utils.logbuffer import LogBuffer
+from mozalert.scheduler import phase
+from mozalert.utils.backoff import JobPoller
+
+# captured pod logs past this size are spooled to disk, see new_log_capture
+LOG_SPOOL_BYTES = 1024 * 1024
 
 
 class BaseCheck:
@@ -15,6 +25,9 @@ class BaseCheck:
     BaseCheck implements the thread/interval logic of a check without any
     actual execution.
 
+    Check runs are scheduled on the shared Scheduler when one is passed in
+    with the scheduler kwarg, otherwise each run gets its own threading.Timer.
+
     To use this class as your base class, you should implement the
     job-related methods:
         * delete_job
@@ -30,11 +43,44 @@ class BaseCheck:
         """
 
         self._job_poll_interval = float(kwargs.get("job_poll_interval", 3))
+        # polls of the job status speed up or slow down with the check's
+        # runtimes, see JobPoller
+        self._job_poller = JobPoller(default=self._job_poll_interval)
+        # creating the job is retried on conflicts and apiserver errors, with
+        # capped exponential backoff
+        self._create_retries = int(kwargs.get("create_retries", 10))
+        self._retry_backoff = float(kwargs.get("retry_backoff", 0.5))
+        self._max_retry_backoff = float(kwargs.get("max_retry_backoff", 30))
         # if the process is restarted the status is re-read
         # from k8s and fed into the new check
         # this is removed from the object once its read
         self._pre_status = kwargs.get("pre_status", {})
+        # the state saved by the previous controller, see mozalert.snapshot.
+        # it is more recent than pre_status and says which job to adopt
+        self._snapshot = kwargs.get("snapshot", None)
+        # a check taken over from another controller replica doesn't run for
+        # this many seconds, until that replica has stopped running it (see
+        # ShardCoordinator.fence)
+        self._fence = float(kwargs.get("fence", 0))
         self.metrics_queue = kwargs.get("metrics_queue", None)
+        self.scheduler = kwargs.get("scheduler", None)
+        # checks which are due when the controller starts are spread over
+        # this many seconds (or their check_interval, if that's shorter)
+        self._startup_spread = float(
+            kwargs.get("startup_spread", os.environ.get("MOZALERT_STARTUP_SPREAD", 60))
+        )
+        # when set the full logs of each run are written here and the status
+        # only carries their tail, see store_logs
+        self.log_store = kwargs.get("log_store", None)
+        # the full pod logs of the last run, see new_log_capture
+        self._log_capture = None
+        # only the tail of the job logs is kept, see new_log_buffer
+        self._log_max_bytes = int(
+            kwargs.get("log_max_bytes", os.environ.get("MOZALERT_LOG_MAX_BYTES", 16384))
+        )
+        self._log_max_lines = int(
+            kwargs.get("log_max_lines", os.environ.get("MOZALERT_LOG_MAX_LINES", 200))
+        )
 
         self.config = SimpleNamespace(
             name=kwargs.get("name"),
@@ -45,6 +91,17 @@ class BaseCheck:
             escalations=kwargs.get("escalations", []),
             max_attempts=int(kwargs.get("max_attempts", "3")),
             timeout=float(kwargs.get("timeout", 0)),
+            uid=kwargs.get("uid", None),
+            # job: a Job per run, pool: exec in a long-lived runner pod
+            execution=kwargs.get("execution", "job"),
+            entrypoint=kwargs.get("entrypoint", None),
+            check_url=kwargs.get("check_url", None),
+            # job, or one of the in-process probe types, see mozalert.probe
+            check_type=kwargs.get("check_type", "job"),
+            expected_status=kwargs.get("expected_status", None),
+            # the pod spec of the job; set before the first run is scheduled,
+            # which may start right away
+            spec=kwargs.get("spec", {}),
         )
 
         if not self.config.retry_interval:
@@ -57,8 +114,26 @@ class BaseCheck:
         self._thread = None
         self.escalated = False
         self._next_interval = self.config.check_interval
-
-        self._status = Status(status=EnumStatus.PENDING, state=EnumState.IDLE)
+        if self.scheduler is not None:
+            # only the first run of a new check is jittered, so checks created
+            # together don't run in lockstep. From then on runs (and retries)
+            # keep to their intervals
+            self._next_interval = self.scheduler.jittered(self._next_interval)
+        self._next_run = None
+        # the uid of a job left running by the previous controller
+        self._adopt_job_uid = None
+        # set when the check shuts down mid-run and leaves its job running
+        # for the next controller to adopt
+        self._keep_job = False
+        self._job_handed_off = False
+
+        self._status = Status(
+            status=EnumStatus.PENDING,
+            state=EnumState.IDLE,
+            summary_lines=kwargs.get(
+                "status_log_lines", os.environ.get("MOZALERT_STATUS_LOG_LINES", 10)
+            ),
+        )
 
         if self._pre_status:
             self.status.status = self._pre_status.get("status", self.status.status)
@@ -71,11 +146,12 @@ class BaseCheck:
             )
             self.status.attempt = self._pre_status.get("attempt", self.status.attempt)
             self.status.logs = self._pre_status.get("logs", self.status.logs)
+            self.status.logs_ref = self._pre_status.get("logsRef", None)
             if self.status.RUNNING:
                 # when the pre_status was created a check was running,
                 # that check is dead to us so we need to just decrement our attempt,
                 # and reschedule the check ASAP
-                self._next_interval = 1
+                self._next_interval = self.startup_delay()
                 if self.status.attempt:
                     self.status.attempt -= 1
             elif self.status.next_check:
@@ -86,11 +162,17 @@ class BaseCheck:
                 if now > next_check:
                     # the check was in the process of starting
                     # when the controller restarted
-                    self._next_interval = 1
+                    self._next_interval = self.startup_delay()
                 else:
-                    self._next_interval = (next_check - now).seconds
+                    self._next_interval = (next_check - now).total_seconds()
             self._pre_status = {}
 
+        if self._snapshot:
+            self.restore(self._snapshot)
+            self._snapshot = None
+
+        self._next_interval = max(self._next_interval, self._fence)
+
         self.start_thread()
         self.set_crd_status()
 
@@ -145,6 +227,55 @@ class BaseCheck:
         logging.info("Executing mock get_job_logs")
         return ""
 
+    def new_log_buffer(self):
+        """
+        the buffer get_job_logs streams the pod logs into
+        """
+        return LogBuffer(max_bytes=self._log_max_bytes, max_lines=self._log_max_lines)
+
+    def new_log_capture(self):
+        """
+        where get_job_logs copies the untruncated pod logs for store_logs,
+        or None if there's no log store. Logs past a megabyte are spooled
+        to disk rather than held in memory.
+        """
+        if self.log_store is None:
+            return None
+        return tempfile.SpooledTemporaryFile(max_size=LOG_SPOOL_BYTES)
+
+    def set_log_capture(self, capture):
+        if self._log_capture is not None:
+            self._log_capture.close()
+        self._log_capture = capture
+
+    def store_logs(self):
+        """
+        write the logs of the last run to the log store, if there is one,
+        and point the status at them. These are the full pod logs captured
+        by get_job_logs, or the status logs for runs without a pod of their
+        own.
+        """
+        capture, self._log_capture = self._log_capture, None
+        if self.log_store is None:
+            return
+        try:
+            self.status.logs_ref = self.log_store.write(
+                self.config.namespace,
+                self.config.name,
+                capture if capture is not None else self.status.logs,
+                status=self.status.status.name,
+                uid=self.config.uid,
+            )
+        except Exception as e:
+            # fall back to keeping the logs in the status
+            logging.warning(f"Failed to store the logs of {self}")
+            logging.warning(sys.exc_info()[0])
+            logging.warning(e)
+            self.status.logs_ref = None
+        finally:
+            if capture is not None:
+                capture.close()
+
     def delete_job(self):
         logging.info("Executing mock delete_job")
 
@@ -152,11 +283,30 @@ class BaseCheck:
         self.escalated = not recovery
         logging.info("Executing mock escalation")
 
-    def terminate(self, join=False):
+    def build_escalation(self, esc):
         """
-        stop the thread and cleanup any leftover jobs
+        create the Escalation object for one entry of config.escalations,
+        loaded with the current status of the check
+        """
+        Escalation = get_escalation(esc.get("type", "email"))
+        return Escalation(
+            f"{self}",
+            self.status.status.name,
+            attempt=self.status.attempt,
+            max_attempts=self.config.max_attempts,
+            last_check=str(self.status.last_check),
+            logs=self.status.logs,
+            logs_ref=self.status.logs_ref,
+            args=esc.get("args", {}),
+        )
+
+    def terminate(self, join=False, keep_job=False):
+        """
+        stop the thread and cleanup any leftover jobs. With keep_job a
+        running job is left alone, so the next controller can adopt it.
         """
         self.shutdown = True
+        self._keep_job = keep_job
         logging.debug("Stopping check thread")
         if self._thread:
             try:
@@ -165,7 +315,8 @@ class BaseCheck:
                 logging.info(sys.exc_info()[0])
                 logging.info(e)
 
-        self.delete_job()
+        if not keep_job:
+            self.delete_job()
 
         if join:
             self.join()
@@ -177,21 +328,58 @@ class BaseCheck:
     def check(self):
         """
         main thread for creating then watching a check job; this is called as
-        the Timer thread target.
+        the Timer thread target, or from a Scheduler worker.
+
+        run_job either blocks until the job is done, or returns True when it
+        has left the job running and will call end_check itself once it's
+        done, so the worker is free in the meantime.
         """
-        self.status.attempt += 1
-        logging.info(f"Starting check attempt {self.status.attempt}")
-        # run the job; this blocks until completion
+        self.begin_check()
         try:
-            self.run_job()
+            if self.run_job():
+                return
         except Exception as e:
             logging.info(sys.exc_info()[0])
             logging.info(e)
             self.delete_job()
+        self.end_check()
+
+    def end_check(self):
+        """
+        clean up after a run_job and schedule the next run
+        """
+        if self._job_handed_off:
+            logging.info("Leaving the job running for the next controller")
+            return
         logging.info("Check finished")
         logging.debug("Cleaning up finished job")
         self.delete_job()
+        self.finish_check()
+
+    def begin_check(self):
+        """
+        the bookkeeping done before every check run
+        """
+        if self._adopt_job_uid:
+            # the attempt was counted by the previous controller
+            logging.info(f"Adopting the running job of attempt {self.status.attempt}")
+            return
+        if self._next_run is not None:
+            # this includes any wait for an admission slot
+            observe(
+                self.metrics_queue,
+                "mozalert_schedule_lag_seconds",
+                max(time() - self._next_run, 0),
+            )
+        self.status.attempt += 1
+        logging.info(f"Starting check attempt {self.status.attempt}")
 
+    def finish_check(self):
+        """
+        the bookkeeping done after every check run: work out the next
+        interval from the result, escalate or recover if needed, report
+        metrics and schedule the next run.
+        """
         __labels = {
             "name": self.config.name,
             "namespace": self.config.namespace,
@@ -219,7 +407,9 @@ class BaseCheck:
         if self.metrics_queue:
             self.metrics_queue.put(
                 MetricsQueueItem(
-                    "mozalert_check_runtime", **__labels, value=self._runtime.seconds,
+                    "mozalert_check_runtime",
+                    **__labels,
+                    value=self._runtime.total_seconds(),
                 )
             )
             self.metrics_queue.put(
@@ -229,7 +419,9 @@ class BaseCheck:
             )
             self.metrics_queue.put(
                 MetricsQueueItem(
-                    "mozalert_check_escalations", **__labels, value=int(self.escalated),
+                    "mozalert_check_escalations",
+                    **__labels,
+                    value=int(self.escalated),
                 )
             )
 
@@ -244,9 +436,36 @@ class BaseCheck:
             # update the CRD status subresource
             self.set_crd_status()
 
+    def update_job_status(self, status):
+        """
+        apply a job status (see get_job_status) to the check status and
+        runtime. Returns True once the job has finished running.
+        """
+        if status.active and not self.status.RUNNING:
+            self.status.state = EnumState.RUNNING
+        if status.start_time:
+            self._runtime = datetime.datetime.utcnow() - status.start_time.replace(
+                tzinfo=None
+            )
+        if status.succeeded:
+            self.status.status = EnumStatus.OK
+            self.status.state = EnumState.IDLE
+        elif status.failed:
+            self.status.status = EnumStatus.CRITICAL
+            self.status.state = EnumState.IDLE
+        return not self.status.PENDING and not self.status.RUNNING
+
+    @property
+    def timed_out(self):
+        return (
+            bool(self.config.timeout)
+            and self._runtime.total_seconds() > self.config.timeout
+        )
+
     def start_thread(self):
         """
-        starts the thread and updates the next_check time in the object.
+        starts the thread (or schedules the next run on the shared scheduler)
+        and updates the next_check time in the object.
 
         For this to work you must have a self.check and a self._next_interval >=0 seconds
         """
@@ -254,10 +473,99 @@ class BaseCheck:
             f"Starting {self} thread at interval {self._next_interval} seconds"
         )
 
-        self._thread = threading.Timer(self._next_interval, self.check)
-        self._thread.setName(f"{self}")
-        self._thread.start()
+        self._thread = self.schedule_check(self._next_interval)
+        self._next_run = time() + self._next_interval
 
         self.status.next_check = pytz.utc.localize(
             datetime.datetime.utcnow()
         ) + datetime.timedelta(seconds=self._next_interval)
+
+    def snapshot(self):
+        """
+        the scheduler state of the check, for mozalert.snapshot
+        """
+        state = {
+            "uid": self.config.uid,
+            "attempt": self.status.attempt,
+            "escalated": self.escalated,
+            "running": self.status.RUNNING,
+        }
+        if self._next_run is not None:
+            state["next"] = round(self._next_run, 3)
+        job_uid = self.running_job_uid()
+        if job_uid:
+            state["job"] = job_uid
+        return state
+
+    def describe(self):
+        """
+        the in-memory state of the check, for /debug/checks
+        """
+        next_run = None
+        if self._next_run is not None:
+            next_run = round(self._next_run - time(), 3)
+        return {
+            "name": self.config.name,
+            "namespace": self.config.namespace,
+            "uid": self.config.uid,
+            "state": self.status.state.name,
+            "status": self.status.status.name,
+            "attempt": self.status.attempt,
+            "max_attempts": self.config.max_attempts,
+            "escalated": self.escalated,
+            "last_check": self.status.last_check,
+            "next_check": self.status.next_check,
+            "next_run_in": next_run,
+            "runtime": self._runtime.total_seconds(),
+            "job": self.running_job_uid(),
+        }
+
+    def running_job_uid(self):
+        """
+        the uid of the job running the check right now, if it could be
+        adopted by another controller
+        """
+        return None
+
+    def restore(self, state):
+        """
+        pick up from a snapshot saved by the previous controller. A running
+        job is adopted on the first run instead of being replaced.
+        """
+        if state.get("uid") != self.config.uid:
+            # the check was deleted and created again in the meantime
+            return
+        self.status.attempt = state.get("attempt", self.status.attempt)
+        self.escalated = state.get("escalated", self.escalated)
+        if state.get("job"):
+            self._adopt_job_uid = state["job"]
+            self._next_interval = 0
+            return
+        if state.get("running") and self.status.attempt:
+            # the run was lost with the previous controller, see pre_status
+            self.status.attempt -= 1
+        if state.get("next") is not None:
+            delay = state["next"] - time()
+            self._next_interval = delay if delay > 0 else self.startup_delay()
+
+    def startup_delay(self):
+        """
+        how long a check which is already due waits when the controller
+        starts. Each check gets its own fixed offset in the startup spread,
+        so a restart ramps the checks up instead of starting them all at
+        once.
+        """
+        window = min(self._startup_spread, self.config.check_interval)
+        return 1 + phase(f"{self.config.namespace}/{self.config.name}", window)
+
+    def schedule_check(self, delay):
+        """
+        arrange for self.check to run in delay seconds, and return a handle
+        to it which supports cancel() and join()
+        """
+        if self.scheduler is not None:
+            return self.scheduler.schedule(delay, self.check, name=f"{self}")
+        timer = threading.Timer(delay, self.check)
+        timer.setName(f"{self}")
+        timer.start()
+        return timer
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import math
+import uuid
+import logging
+import threading
+from time import sleep, monotonic
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.check import build_job
+from mozalert.jobwatch import job_status
+
+# lines the pinger prints for each url it checked in batch mode
+RESULT_PREFIX = "MOZALERT_RESULT "
+
+
+class PingBatcher(threading.Thread):
+    """
+    the PingBatcher runs the url checks which set execution: batch together.
+    Instead of a Job per check, every check which comes due within window
+    seconds of the first one is collected (up to max_batch of them, per
+    namespace and image), and a single pinger Job checks all of their urls
+    concurrently. The pinger prints one JSON result per url, and the
+    results are handed back to the individual checks with
+    Check.finish_batch.
+
+    Checks don't hold a worker while they wait on their batch; the batch
+    Job itself is run from the scheduler like any other check.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self._shutdown = False
+        self.client = kwargs.get("client")
+        self.pod_client = kwargs.get("pod_client")
+        self.job_watcher = kwargs.get("job_watcher", None)
+        self.scheduler = kwargs.get("scheduler", None)
+        self.admission = kwargs.get("admission", None)
+        self._window = float(
+            kwargs.get("window", os.environ.get("MOZALERT_BATCH_WINDOW", 2))
+        )
+        self._max_batch = int(
+            kwargs.get("max_batch", os.environ.get("MOZALERT_BATCH_SIZE", 500))
+        )
+        self._concurrency = int(
+            kwargs.get("concurrency", os.environ.get("MOZALERT_BATCH_CONCURRENCY", 32))
+        )
+        self._poll_interval = float(kwargs.get("poll_interval", 3))
+        self._cond = threading.Condition()
+        # (namespace, image) -> (deadline, [checks])
+        self._pending = {}
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    def terminate(self):
+        logging.info("Stopping ping batcher")
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify()
+
+    def submit(self, check):
+        """
+        add a check to the next batch for its namespace and image
+        """
+        key = (check.config.namespace, check.config.spec["containers"][0]["image"])
+        with self._cond:
+            if key not in self._pending:
+                self._pending[key] = (monotonic() + self._window, [])
+                self._cond.notify()
+            batch = self._pending[key][1]
+            batch.append(check)
+            if len(batch) >= self._max_batch:
+                del self._pending[key]
+                self.start_batch(key, batch)
+
+    def run(self):
+        logging.info("Ping batcher running")
+        with self._cond:
+            while not self.shutdown:
+                now = monotonic()
+                timeout = None
+                for key, (deadline, batch) in list(self._pending.items()):
+                    if deadline <= now:
+                        del self._pending[key]
+                        self.start_batch(key, batch)
+                    else:
+                        remaining = deadline - now
+                        timeout = (
+                            remaining if timeout is None else min(timeout, remaining)
+                        )
+                self._cond.wait(timeout)
+        logging.info("Ping batcher shut down")
+
+    def start_batch(self, key, checks):
+        name = f"mozalert-batch-{uuid.uuid4().hex[:10]}"
+        if self.admission is not None:
+            # the batch Job takes one slot for all of its checks
+            self.admission.submit(
+                key[0],
+                lambda: self.spawn(name, lambda: self.run_admitted(name, key, checks)),
+                name=name,
+            )
+        else:
+            self.spawn(name, lambda: self.run_batch(name, key, checks))
+
+    def spawn(self, name, function):
+        """
+        run function off the batcher thread
+        """
+        if self.scheduler is not None:
+            self.scheduler.schedule(0, function, name)
+        else:
+            threading.Thread(target=function, name=name).start()
+
+    def run_admitted(self, name, key, checks):
+        try:
+            self.run_batch(name, key, checks)
+        finally:
+            self.admission.release(key[0])
+
+    def run_batch(self, name, key, checks):
+        """
+        run one batch Job and hand every check its result
+        """
+        namespace, image = key
+        logging.info(f"Running {len(checks)} url checks in batch {namespace}/{name}")
+        results = {}
+        start = monotonic()
+        try:
+            uid = self.create_job(name, namespace, image, checks)
+            if self.wait_job(name, namespace, uid, self.batch_timeout(checks)):
+                results = self.read_results(name, namespace)
+            else:
+                logging.info(f"Batch {namespace}/{name} timed out")
+        except Exception as e:
+            logging.info(sys.exc_info()[0])
+            logging.info(e)
+        finally:
+            self.delete_job(name, namespace)
+        runtime = monotonic() - start
+        for i, check in enumerate(checks):
+            result = results.get(i)
+            if result is None:
+                result = {
+                    "code": None,
+                    "seconds": runtime,
+                    "log": f"No result from batch {name}",
+                }
+            try:
+                check.finish_batch(result)
+            except Exception as e:
+                logging.error(f"Failed to finish {check} from batch {name}")
+                logging.error(sys.exc_info()[0])
+                logging.error(e)
+
+    def batch_timeout(self, checks):
+        """
+        the pinger checks PING_CONCURRENCY urls at a time, each with the
+        timeout of its check
+        """
+        rounds = math.ceil(len(checks) / max(self._concurrency, 1))
+        longest = max(check.config.timeout or 300 for check in checks)
+        return longest * rounds + 60
+
+    def create_job(self, name, namespace, image, checks):
+        args = ["--batch"] + [
+            f"{int(check.config.timeout or 300)}:{check.config.check_url}"
+            for check in checks
+        ]
+        spec = {
+            "restart_policy": "Never",
+            "containers": [
+                {
+                    "name": name,
+                    "image": image,
+                    "args": args,
+                    "env": [
+                        {"name": "PING_CONCURRENCY", "value": str(self._concurrency)}
+                    ],
+                }
+            ],
+        }
+        res = self.client.create_namespaced_job(
+            body=build_job(name, spec), namespace=namespace
+        )
+        return res.metadata.uid
+
+    def wait_job(self, name, namespace, uid, timeout):
+        """
+        wait for the batch Job to finish, returning False on timeout
+        """
+        deadline = monotonic() + timeout
+        while monotonic() < deadline and not self.shutdown:
+            if self.job_watcher is not None and self.job_watcher.healthy:
+                status = self.job_watcher.wait(
+                    namespace, name, uid, min(60, deadline - monotonic())
+                )
+                if status:
+                    return True
+            else:
+                sleep(self._poll_interval)
+            status = job_status(self.client.read_namespaced_job_status(name, namespace))
+            if status.succeeded or status.failed:
+                return True
+        return False
+
+    def read_results(self, name, namespace):
+        """
+        stream the pinger output and collect the result of every url, keyed
+        by its position in the batch
+        """
+        results = {}
+        pods = self.pod_client.list_namespaced_pod(
+            namespace=namespace, label_selector=f"app={name}"
+        )
+        for pod in pods.items:
+            resp = self.pod_client.read_namespaced_pod_log(
+                pod.metadata.name, namespace, _preload_content=False
+            )
+            try:
+                # the response yields the log line by line as it's read
+                for line in resp:
+                    line = line.decode("utf-8", errors="replace").strip()
+                    if not line.startswith(RESULT_PREFIX):
+                        continue
+                    try:
+                        result = json.loads(line[len(RESULT_PREFIX) :])
+                        results[int(result["index"])] = result
+                    except (ValueError, KeyError, TypeError) as e:
+                        logging.debug(f"Bad result line in batch {name}: {line}")
+                        logging.debug(e)
+            finally:
+                resp.release_conn()
+        return results
+
+    def delete_job(self, name, namespace):
+        try:
+            self.client.delete_namespaced_job(
+                name,
+                namespace,
+                propagation_policy="Foreground",
+                grace_period_seconds=0,
+            )
+        except ApiException as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
@@ -2,7 +2,8 @@ import os
 import sys
 from kubernetes import client, config, watch
 import logging
-from time import sleep
+import threading
+from time import sleep, monotonic
 
 from types import SimpleNamespace
 import datetime
@@ -10,16 +11,48 @@ import pytz
 
 from mozalert.status import EnumStatus, EnumState, Status
 from mozalert.base import BaseCheck
-
-import importlib
+from mozalert.jobwatch import JOB_LABELS, job_status
+from mozalert.metrics import observe
+from mozalert.utils.backoff import backoff, retryable
 
 from kubernetes.client.rest import ApiException
 
 
+def build_job(name, spec):
+    """
+    Build the k8s resources for a check run. They take the form:
+        pod spec -> pod template -> job spec -> job
+    """
+    pod_spec = client.V1PodSpec(**spec)
+    template = client.V1PodTemplateSpec(
+        metadata=client.V1ObjectMeta(labels={"app": name}),
+        spec=pod_spec,
+    )
+    job_spec = client.V1JobSpec(template=template, backoff_limit=0)
+    return client.V1Job(
+        api_version="batch/v1",
+        kind="Job",
+        metadata=client.V1ObjectMeta(name=name, labels=JOB_LABELS),
+        spec=job_spec,
+    )
+
+
+# only used to serialize the job models, never to talk to the apiserver
+_serializer = client.ApiClient()
+
+
+def job_body(name, spec):
+    """
+    the Job built by build_job, serialized to the plain dict which is sent
+    to the apiserver
+    """
+    return _serializer.sanitize_for_serialization(build_job(name, spec))
+
+
 class Check(BaseCheck):
     """
     the Check object handles the entire lifecycle of a check:
-    * maintains the check interval using threading.Timer (BaseCheck)
+    * maintains the check interval using the Scheduler (BaseCheck)
     * manages the resources for running the check itself
     * reports status to the CRD object
     * handles escalation
@@ -29,32 +62,49 @@ class Check(BaseCheck):
         self.client = kwargs.get("client", client.BatchV1Api())
         self.pod_client = kwargs.get("pod_client", client.CoreV1Api())
         self.crd_client = kwargs.get("crd_client", client.CustomObjectsApi())
+        # when a JobWatcher is available we wait on its events for job
+        # completion instead of polling the job status
+        self.job_watcher = kwargs.get("job_watcher", None)
+        self._job_resync_interval = float(kwargs.get("job_resync_interval", 60))
+        self._job_uid = None
+        # (spec, serialized Job) of the spec the job body was built from
+        self._job_body = None
+        # when the job of the current run was created, for mozalert_job_start_seconds
+        self._job_created = None
+        self.status_writer = kwargs.get("status_writer", None)
+        # escalations are handed to the dispatcher rather than sent from the
+        # check thread when one is available
+        self.escalation_dispatcher = kwargs.get("escalation_dispatcher", None)
+        # runs checks with execution: pool, see mozalert.runnerpool
+        self.runner_pool = kwargs.get("runner_pool", None)
+        # runs url checks with execution: batch, see mozalert.batch
+        self.batcher = kwargs.get("batcher", None)
+        # bounds the number of checks running at once, see mozalert.admission
+        self.admission = kwargs.get("admission", None)
+        # whether the check holds a slot from the AdmissionController
+        self._admission_slot = False
+        # guards _thread and _admission_slot against the JobWatcher thread
+        # and terminate while a job is followed from the scheduler
+        self._job_lock = threading.Lock()
 
         super().__init__(**kwargs)
 
-        self._config.spec = kwargs.get("spec", {})
-
     def escalate(self, recovery=False):
         self.escalated = not recovery
         for esc in self.config.escalations:
             escalation_type = esc.get("type", "email")
             logging.info(f"Escalating {self} via {escalation_type}")
-            args = esc.get("args", {})
             try:
-                module = importlib.import_module(
-                    f".escalations.{escalation_type}", "mozalert"
-                )
-                Escalation = getattr(module, "Escalation")
-                e = Escalation(
-                    f"{self}",
-                    self.status.status.name,
-                    attempt=self.status.attempt,
-                    max_attempts=self.config.max_attempts,
-                    last_check=str(self.status.last_check),
-                    logs=self.status.logs,
-                    args=args,
-                )
-                e.run()
+                escalation = self.build_escalation(esc)
+                if self.escalation_dispatcher is not None:
+                    # repeats of the same status are dropped until the next
+                    # notification is due
+                    self.escalation_dispatcher.submit(
+                        escalation,
+                        dedupe_interval=self.config.notification_interval,
+                    )
+                else:
+                    escalation.run()
             except Exception as e:
                 logging.error(
                     f"Failed to send escalation type {escalation_type} for {self}"
@@ -62,52 +112,200 @@ class Check(BaseCheck):
                 logging.error(sys.exc_info()[0])
                 logging.error(e)
 
+    @property
+    def batched(self):
+        return (
+            self.config.execution == "batch"
+            and self.batcher is not None
+            and bool(self.config.check_url)
+        )
+
+    @property
+    def admitted(self):
+        """
+        whether the check waits for a slot from the AdmissionController
+        before it runs. Batched checks share the slot of their batch.
+        """
+        return self.admission is not None and not self.batched
+
+    def check(self):
+        """
+        batched checks are handed to the PingBatcher, which calls
+        finish_batch once their batch has run. The rest wait for a slot
+        from the AdmissionController, if there is one. A job adopted from
+        the previous controller is already running, so it takes its slot
+        without queueing.
+        """
+        if self.admitted and self._adopt_job_uid:
+            self.admission.admit(self.config.namespace)
+            return self.run_admitted()
+        if self.admitted:
+            # retries and escalated checks jump the queue
+            self.admission.submit(
+                self.config.namespace,
+                self.run_admitted,
+                name=f"{self}",
+                priority=self.escalated or self.status.attempt > 0,
+            )
+            return
+        if not self.batched:
+            return super().check()
+        # there's no job of our own to adopt in a batch
+        self._adopt_job_uid = None
+        self.begin_check()
+        self.status.state = EnumState.RUNNING
+        self.set_crd_status()
+        self.batcher.submit(self)
+
+    def run_admitted(self):
+        """
+        run the check in the slot the AdmissionController gave it. The slot
+        is given back by end_check, once the job is done.
+        """
+        with self._job_lock:
+            self._admission_slot = True
+        if self.shutdown:
+            self.release_slot()
+            return
+        try:
+            super().check()
+        except Exception:
+            self.release_slot()
+            raise
+
+    def release_slot(self):
+        with self._job_lock:
+            if not self._admission_slot:
+                return
+            self._admission_slot = False
+        self.admission.release(self.config.namespace)
+
+    def end_check(self):
+        try:
+            super().end_check()
+        finally:
+            self.release_slot()
+
+    def terminate(self, join=False, keep_job=False):
+        with self._job_lock:
+            # from here on schedule_job_poll leaves the job alone, so the
+            # poll cancelled below is the last one
+            self.shutdown = True
+        super().terminate(join=join, keep_job=keep_job)
+        # a job followed from the scheduler doesn't come back for its slot
+        # once its poll is cancelled
+        self.release_slot()
+
+    def finish_batch(self, result):
+        """
+        apply the result of this check's url from a batch run (see
+        PingBatcher.run_batch) and do the usual bookkeeping
+        """
+        self._runtime = datetime.timedelta(seconds=float(result.get("seconds") or 0))
+        if result.get("code") == 0:
+            self.status.status = EnumStatus.OK
+        else:
+            self.status.status = EnumStatus.CRITICAL
+        log = result.get("log")
+        if log is None:
+            log = (
+                f"{result.get('url')}: status code {result.get('code')} "
+                f"in {result.get('seconds')} seconds"
+            )
+        self.status.logs = log + "\n"
+        self.store_logs()
+        logging.info(
+            f"Check finished in {self._runtime.total_seconds()} seconds with status {self.status.status.name}"
+        )
+        self.status.state = EnumState.IDLE
+        self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+        self.set_crd_status()
+        self.finish_check()
+
+    @property
+    def job_body(self):
+        """
+        the serialized Job for this check. It is built once and sent as is
+        on every run, so the models aren't rebuilt and serialized again each
+        time. A modified check is replaced by a new one, but the body is also
+        rebuilt if the spec is ever swapped out underneath it.
+        """
+        spec = self.config.spec
+        if self._job_body is None or self._job_body[0] is not spec:
+            self._job_body = (spec, job_body(self.config.name, spec))
+        return self._job_body[1]
+
+    @property
+    def pooled(self):
+        return self.config.execution == "pool" and self.runner_pool is not None
+
     def run_job(self):
         """
-        Build the k8s resources, apply them, then poll for completion, and
-        report status back to the thread.
-        
-        The k8s resources take the form:
-            pod spec -> pod template -> job spec -> job
+        Build the k8s resources (see build_job), apply them, then wait for
+        completion, and report status back to the thread.
 
+        With a scheduler the wait doesn't block: run_job returns True and the
+        job is followed by poll_job tasks, the last of which ends the check.
         """
+        if self.pooled:
+            return self.run_pooled()
         logging.debug(f"Running job")
-        pod_spec = client.V1PodSpec(**self.config.spec)
-        template = client.V1PodTemplateSpec(
-            metadata=client.V1ObjectMeta(labels={"app": self.config.name}),
-            spec=pod_spec,
-        )
-        job_spec = client.V1JobSpec(template=template, backoff_limit=0)
-        job = client.V1Job(
-            api_version="batch/v1",
-            kind="Job",
-            metadata=client.V1ObjectMeta(name=self.config.name),
-            spec=job_spec,
-        )
+        job = self.job_body
         logging.debug(f"Creating job")
-        # TODO refactor this
         tries = 0
-        max_tries = 100
-        while tries < max_tries:
+        max_tries = self._create_retries
+        # an adopted job is already there, go straight to waiting on it
+        adopted = self.adopt_job()
+        if not adopted:
+            self._job_uid = None
+        self._job_created = None
+        while not adopted and tries < max_tries:
             try:
+                started = monotonic()
                 res = self.client.create_namespaced_job(
                     body=job, namespace=self.config.namespace
                 )
+                observe(
+                    self.metrics_queue,
+                    "mozalert_job_create_seconds",
+                    monotonic() - started,
+                )
+                self._job_uid = res.metadata.uid
+                self._job_created = res.metadata.creation_timestamp
                 logging.debug(f"Job created")
                 break
             except ApiException as e:
-                if e.reason == "Conflict":
-                    logging.debug(
-                        "Found another job already running. Deleting that job"
-                    )
-                    self.delete_job()
-                    tries += 1
-                    sleep(self._job_poll_interval)
-                else:
+                if not retryable(e):
                     logging.info(e.reason)
                     raise
+                if e.status == 409:
+                    existing = self.read_job()
+                    if existing is not None and self.owns_job(existing):
+                        # a run nobody has reported on yet, most likely handed
+                        # off by the replica which ran the check before us.
+                        # wait on it rather than throw it away. Anything else
+                        # that isn't already going is deleted below
+                        logging.info(f"Adopting job {existing.metadata.uid}")
+                        self._job_uid = existing.metadata.uid
+                        adopted = True
+                        break
+                    if (
+                        existing is not None
+                        and not existing.metadata.deletion_timestamp
+                    ):
+                        logging.debug(
+                            "Found another job already running. Deleting that job"
+                        )
+                        self.delete_job(uid=existing.metadata.uid)
+                else:
+                    logging.info(f"Failed to create the job ({e.reason}), retrying")
+                tries += 1
+                if tries < max_tries:
+                    sleep(
+                        backoff(tries - 1, self._retry_backoff, self._max_retry_backoff)
+                    )
 
-        if tries >= max_tries:
+        if not adopted and tries >= max_tries:
             raise Exception(
                 f"Max attempts to start the job ({tries}/{max_tries}) exceeded"
             )
@@ -116,36 +314,162 @@ class Check(BaseCheck):
         self.set_crd_status()
 
         # wait for the job to finish
-        while True:
-            status = self.get_job_status()
-            if status.active and not self.status.RUNNING:
-                self.status.state = EnumState.RUNNING
-            if status.start_time:
-                self._runtime = datetime.datetime.utcnow() - status.start_time.replace(
-                    tzinfo=None
-                )
-            if status.succeeded:
-                self.status.status = EnumStatus.OK
-                self.status.state = EnumState.IDLE
-            elif status.failed:
-                self.status.status = EnumStatus.CRITICAL
-                self.status.state = EnumState.IDLE
+        self._job_poller.reset()
+        if self.follow_job(self.get_job_status()):
+            return False
+        if self.scheduler is None:
+            # the check has a thread of its own to block
+            while not self.follow_job(self.wait_job_status()):
+                pass
+            return False
+        # come back to the job later rather than hold a worker while it runs
+        self.schedule_job_poll()
+        return True
+
+    def follow_job(self, status):
+        """
+        apply the latest status of the job to the check. Returns True once
+        the run is over: the job finished (and its logs are read), or it was
+        left running for the next controller.
+        """
+        if self.update_job_status(status):
             # job is done running so get its logs
-            if not self.status.PENDING and not self.status.RUNNING:
-                self.get_job_logs()
-                for log_line in self.status.logs.split("\n"):
-                    logging.debug(log_line)
-                break
-            if self.config.timeout and self._runtime.seconds > self.config.timeout:
-                logging.info("Job Timeout triggered")
-                self.status.status = EnumStatus.CRITICAL
-                self.status.state = EnumState.IDLE
-                self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
-                self.set_crd_status()
-                raise Exception("Job Timeout")
-            sleep(self._job_poll_interval)
+            self._job_poller.record(self._runtime.total_seconds())
+            self.get_job_logs()
+            self.store_logs()
+            for log_line in self.status.logs.split("\n"):
+                logging.debug(log_line)
+            logging.info(
+                f"Job finished in {self._runtime.total_seconds()} seconds with status {self.status.status.name}"
+            )
+            self.status.state = EnumState.IDLE
+            self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+            self.set_crd_status()
+            return True
+        if self.timed_out:
+            logging.info("Job Timeout triggered")
+            self.status.status = EnumStatus.CRITICAL
+            self.status.state = EnumState.IDLE
+            self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+            self.set_crd_status()
+            raise Exception("Job Timeout")
+        if self.shutdown and self._keep_job:
+            # the next controller adopts the job and picks up from here
+            self._job_handed_off = True
+            return True
+        return False
+
+    def schedule_job_poll(self):
+        """
+        arrange for poll_job to look at the job again: after the next poll
+        interval, or with a healthy JobWatcher once the watch reports the
+        job done (and after the resync interval at the latest).
+        """
+        watcher = self.job_watcher
+        if watcher is not None and watcher.healthy:
+            delay = self.job_wait_timeout()
+        else:
+            watcher = None
+            delay = self._job_poller.next()
+        with self._job_lock:
+            if self.shutdown:
+                return
+            task = self._thread = self.scheduler.schedule(
+                delay, self.poll_job, name=f"{self}", rate_limited=False
+            )
+        if watcher is not None:
+            watcher.notify(
+                self.config.namespace,
+                self.config.name,
+                self._job_uid,
+                lambda: self.wake_job_poll(task),
+            )
+
+    def wake_job_poll(self, task):
+        """
+        called by the JobWatcher: run the job poll task right away instead
+        of at its deadline
+        """
+        with self._job_lock:
+            if self._thread is not task or not task.cancel():
+                # the poll has already started, or the run is over
+                return
+            self._thread = self.scheduler.schedule(
+                0, self.poll_job, name=f"{self}", rate_limited=False
+            )
+
+    def poll_job(self):
+        """
+        the rest of a run_job which left its job running: look at the job,
+        and either come back later or finish the run
+        """
+        try:
+            if not self.follow_job(self.get_job_status()):
+                self.schedule_job_poll()
+                return
+        except Exception as e:
+            logging.info(sys.exc_info()[0])
+            logging.info(e)
+            self.delete_job()
+        self.end_check()
+
+    def adopt_job(self):
+        """
+        take over the job a previous controller left running for this
+        check, if it's still there. Returns True if there's a job to wait on.
+        """
+        uid, self._adopt_job_uid = self._adopt_job_uid, None
+        if not uid:
+            return False
+        status = self.get_job_status()
+        if status.uid != uid:
+            logging.info("The job to adopt is gone, starting a new one")
+            return False
+        logging.info(f"Adopted running job {uid}")
+        self._job_uid = uid
+        return True
+
+    def running_job_uid(self):
+        if self.status.RUNNING and not self.batched and not self.pooled:
+            return self._job_uid
+        return None
+
+    def run_pooled(self):
+        """
+        the run_job for execution: pool. The check is exec'd in a runner pod
+        from the RunnerPool, and its output is streamed straight into the
+        logs.
+        """
+        self.status.state = EnumState.RUNNING
+        self.set_crd_status()
+
+        logs = self.new_log_buffer()
+        try:
+            result = self.runner_pool.run_check(
+                self.config.namespace,
+                self.config.spec,
+                self.config.entrypoint,
+                logs,
+                timeout=self.config.timeout,
+            )
+        finally:
+            logs.close()
+            self.status.logs = logs.getvalue()
+        self._runtime = datetime.timedelta(seconds=result.runtime)
+        if result.timed_out:
+            logging.info("Job Timeout triggered")
+            self.status.status = EnumStatus.CRITICAL
+            self.status.state = EnumState.IDLE
+            self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+            self.set_crd_status()
+            raise Exception("Job Timeout")
+        if result.returncode == 0:
+            self.status.status = EnumStatus.OK
+        else:
+            self.status.status = EnumStatus.CRITICAL
+        self.store_logs()
         logging.info(
-            f"Job finished in {self._runtime.seconds} seconds with status {self.status.status.name}"
+            f"Check finished in {self._runtime.total_seconds()} seconds with status {self.status.status.name}"
         )
         self.status.state = EnumState.IDLE
         self.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
@@ -156,6 +480,11 @@ class Check(BaseCheck):
         since the CRD deletes the pod after its done running, it is nice
         to have a way to save the logs before deleting it. this retrieves
         the pod logs so they can be blasted into the controller logs.
+
+        Only the tail of the logs is kept in the status (see new_log_buffer):
+        the logs are streamed into a ring buffer rather than read whole, and
+        the apiserver is only asked for the last lines. With a log store the
+        whole log is read instead and copied aside for store_logs.
         """
         try:
             res = self.pod_client.list_namespaced_pod(
@@ -168,12 +497,93 @@ class Check(BaseCheck):
             self.status.logs = ""
             return
 
-        logs = ""
+        self.observe_job_start(res.items)
+        logs = self.new_log_buffer()
+        capture = self.new_log_capture()
         for pod in res.items:
-            logs += self.pod_client.read_namespaced_pod_log(
-                pod.metadata.name, self.config.namespace
+            tail_lines = None if capture is not None else logs.max_lines + 1
+            try:
+                resp = self.pod_client.read_namespaced_pod_log(
+                    pod.metadata.name,
+                    self.config.namespace,
+                    tail_lines=tail_lines,
+                    _preload_content=False,
+                )
+            except Exception as e:
+                logging.debug(sys.exc_info()[0])
+                logging.debug(e)
+                continue
+            try:
+                for chunk in resp.stream(4096):
+                    logs.feed(chunk)
+                    if capture is not None:
+                        capture.write(chunk)
+            finally:
+                resp.release_conn()
+            logs.close(tail_lines=tail_lines)
+        self.status.logs = logs.getvalue()
+        self.set_log_capture(capture)
+
+    def observe_job_start(self, pods):
+        """
+        report how long the job took to get its container running, from
+        the container start time the kubelet recorded in the pod status
+        """
+        if self._job_created is None:
+            return
+        started = []
+        for pod in pods:
+            for container in (pod.status and pod.status.container_statuses) or []:
+                state = container.state
+                state = state and (state.terminated or state.running)
+                if state and state.started_at:
+                    started.append(state.started_at)
+        if started:
+            observe(
+                self.metrics_queue,
+                "mozalert_job_start_seconds",
+                max((min(started) - self._job_created).total_seconds(), 0),
+            )
+
+    def read_job(self):
+        """
+        the job named after this check, or None if there isn't one
+        """
+        try:
+            return self.client.read_namespaced_job(
+                self.config.name, self.config.namespace
             )
-        self.status.logs = logs
+        except ApiException as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            return None
+
+    def owns_job(self, job):
+        """
+        whether job was created for a check by mozalert, isn't on its way
+        out, and is a run the check hasn't reported on yet: it's still
+        running, or it was created after the last check. A finished job from
+        before then is a leftover whose result is stale.
+        """
+        metadata = job.metadata
+        labels = metadata.labels or {}
+        if metadata.deletion_timestamp or not all(
+            labels.get(k) == v for k, v in JOB_LABELS.items()
+        ):
+            return False
+        if job.status is not None and job.status.active:
+            return True
+        created = metadata.creation_timestamp
+        if created is None:
+            return False
+        last_check = self.status.last_check
+        if last_check is None:
+            return True
+        if last_check.tzinfo is None:
+            last_check = pytz.utc.localize(last_check)
+        if created.tzinfo is None:
+            created = pytz.utc.localize(created)
+        return created > last_check
 
     def get_job_status(self):
         """
@@ -181,7 +591,7 @@ class Check(BaseCheck):
         """
 
         status = SimpleNamespace(
-            active=False, succeeded=False, failed=False, start_time=None
+            uid=None, active=False, succeeded=False, failed=False, start_time=None
         )
 
         try:
@@ -194,19 +604,42 @@ class Check(BaseCheck):
             status.failed = True
             return status
 
-        if res.status.active == 1:
-            status.active = True
-
-        if res.status.succeeded:
-            status.succeeded = True
+        return job_status(res)
 
-        if res.status.failed:
-            status.failed = True
+    def wait_job_status(self):
+        """
+        block until the job has likely changed and return its latest status.
 
-        if res.status.start_time:
-            status.start_time = res.status.start_time
+        With a healthy JobWatcher this returns as soon as the watch reports
+        the job finished. The wait is capped by the job timeout and the resync
+        interval, after which the job status is read directly anyway, so a
+        missed watch event can only delay a check, never hang it. Without a
+        watcher the job is polled, fast at first and then less often (see
+        JobPoller).
+        """
+        if self.job_watcher is not None and self.job_watcher.healthy:
+            status = self.job_watcher.wait(
+                self.config.namespace,
+                self.config.name,
+                self._job_uid,
+                self.job_wait_timeout(),
+            )
+            if status:
+                return status
+        else:
+            sleep(self._job_poller.next())
+        return self.get_job_status()
 
-        return status
+    def job_wait_timeout(self):
+        """
+        how long to rely on the JobWatcher before reading the job status
+        directly: the resync interval, or until the job times out
+        """
+        timeout = self._job_resync_interval
+        if self.config.timeout:
+            remaining = self.config.timeout - self._runtime.total_seconds() + 1
+            timeout = max(min(timeout, remaining), self._job_poll_interval)
+        return timeout
 
     def set_crd_status(self):
         """
@@ -214,20 +647,19 @@ class Check(BaseCheck):
         status. NOTE: In what I've read in the docs, this should NOT cause a modify
         event, however it does, even when hitting the apiserver directly. We are careful
         to account for this but TODO to understand this further.
+
+        With a StatusWriter the patch is queued, coalesced and rate limited
+        there instead of being sent from the check thread.
         """
         logging.debug(f"Setting CRD status")
 
-        status = {
-            "status": {
-                "status": str(self.status.status.name),
-                "state": str(self.status.state.name),
-                "attempt": str(self.status.attempt),
-                "lastCheckTimestamp": str(self.status.last_check).split(".")[0],
-                "nextCheckTimestamp": str(self.status.next_check).split(".")[0],
-                "logs": self.status.logs,
-            }
-        }
+        status = self.status.to_patch()
+
+        if self.status_writer is not None:
+            self.status_writer.submit(self.config.namespace, self.config.name, status)
+            return
 
+        started = monotonic()
         try:
             res = self.crd_client.patch_namespaced_custom_object_status(
                 "crd.k8s.afrank.local",
@@ -242,16 +674,34 @@ class Check(BaseCheck):
             # TODO should take more action here
             logging.debug(sys.exc_info()[0])
             logging.debug(e)
+            return
+        observe(
+            self.metrics_queue, "mozalert_status_patch_seconds", monotonic() - started
+        )
 
-    def delete_job(self):
+    def delete_job(self, uid=None):
         """
-        after a check is complete delete the job which executed it
+        after a check is complete delete the job which executed it.
+
+        Only the job with uid (by default the one this check created) is
+        deleted: the job name is shared with whichever replica runs the check
+        next, so a delete by name alone could take out its job.
         """
-        logging.debug(f"deleting job")
+        if self.pooled:
+            # there's no job, the runner is left for the next run
+            return
+        uid = uid or self._job_uid
+        if not uid:
+            logging.debug("No job to delete")
+            return
+        logging.debug(f"deleting job {uid}")
         try:
             res = self.client.delete_namespaced_job(
                 self.config.name,
                 self.config.namespace,
+                body=client.V1DeleteOptions(
+                    preconditions=client.V1Preconditions(uid=uid)
+                ),
                 propagation_policy="Foreground",
                 grace_period_seconds=0,
             )
@@ -1,18 +1,63 @@
-from kubernetes import client, config, watch
+from kubernetes import client, config
 import os
 import logging
 import threading
-import queue
-from time import sleep
+from time import sleep, monotonic
 import sys
 import signal
 
 from mozalert.check import Check
-from mozalert.metrics import MetricsThread
+from mozalert.metrics import MetricsThread, MetricsQueue, observe, forget
 from mozalert.service import ServiceEndpoint
+from mozalert.scheduler import Scheduler
+from mozalert.jobwatch import JobWatcher
+from mozalert.statuswriter import StatusWriter
+from mozalert.sharding import ShardCoordinator
+from mozalert.dispatcher import EscalationDispatcher
+from mozalert.logstore import get_log_store
+from mozalert.runnerpool import RunnerPool, DEFAULT_ENTRYPOINT
+from mozalert.batch import PingBatcher
+from mozalert.probe import ProbeCheck, PROBE_TYPES
+from mozalert.admission import AdmissionController
+from mozalert.informer import CheckInformer, object_key
+from mozalert.snapshot import get_state_store, StateSnapshotter
 
 import re
-from datetime import timedelta
+from functools import lru_cache
+
+TIME_PATTERN = re.compile(r"((?P<hours>\d+)h)?((?P<minutes>\d+)m)?((?P<seconds>\d+)s)?")
+
+
+@lru_cache(maxsize=4096)
+def parse_time(time_str):
+    """
+    parse_time takes either a number (in minutes) or a formatted time string [XXh][XXm][XXs]
+    and returns the total number of seconds. An empty string is 0 seconds, anything else
+    raises a ValueError.
+
+    This runs for every interval of every check event, and the same handful of interval
+    strings come up over and over, so results are cached.
+    """
+    if time_str is None:
+        raise ValueError(
+            "missing time, expected a number of minutes or [XXh][XXm][XXs]"
+        )
+    try:
+        return float(time_str) * 60
+    except ValueError:
+        # didn't pass a number, move on to parse the string
+        pass
+    parts = TIME_PATTERN.fullmatch(time_str.strip())
+    if not parts:
+        raise ValueError(
+            f"invalid time {time_str!r}, expected a number of minutes or [XXh][XXm][XXs]"
+        )
+    parts = parts.groupdict()
+    return float(
+        int(parts["hours"] or 0) * 3600
+        + int(parts["minutes"] or 0) * 60
+        + int(parts["seconds"] or 0)
+    )
 
 
 class Controller:
@@ -26,16 +71,40 @@ class Controller:
         self._version = kwargs.get("version", "v1")
         self._plural = kwargs.get("plural", "checks")
         self._check_cluster_interval = kwargs.get("check_cluster_interval", 60)
+        # /healthz fails once due checks wait on the scheduler this long
+        self._health_max_lag = float(
+            kwargs.get("health_max_lag", os.environ.get("MOZALERT_HEALTH_MAX_LAG", 300))
+        )
         self._shutdown = False
+        self._resource_version = ""
+
+        self.metrics_queue = MetricsQueue()
+
+        self._threads = {}
+        # the spec_version each check was last configured from
+        self._spec_versions = {}
+        # the informer, the shard coordinator and the cluster monitor all
+        # touch the check table
+        self._lock = threading.RLock()
+        # set once rebalance has adopted the checks this replica owns
+        self._rebalanced = threading.Event()
 
-        self.metrics_queue = queue.Queue()
+        self.setup(**kwargs)
 
+    def setup(self, **kwargs):
+        """
+        load the kube config, then create the clients and the shared services
+        which every check is handed
+        """
         if "KUBERNETES_PORT" in os.environ:
             config.load_incluster_config()
         else:
             config.load_kube_config()
 
-        self._client_config = client.Configuration()
+        # newer clients no longer copy the loaded config into every new
+        # Configuration, so ask for the copy explicitly
+        get_default = getattr(client.Configuration, "get_default_copy", None)
+        self._client_config = get_default() if get_default else client.Configuration()
         self._client_config.assert_hostname = False
 
         self._api_client = client.api_client.ApiClient(
@@ -47,7 +116,80 @@ class Controller:
             "crd_client": client.CustomObjectsApi(self._api_client),
         }
 
-        self._threads = {}
+        # the one list and watch of the check objects, which everything
+        # else reads from
+        self.informer = CheckInformer(
+            self.clients["crd_client"],
+            self.domain,
+            self.version,
+            self.plural,
+            handlers=[self.on_event],
+        )
+
+        # bounds how many checks run at once, in total and per namespace
+        self.admission = AdmissionController()
+
+        # every check (and the cluster monitor) is run from this one scheduler
+        # instead of a threading.Timer each. Each check admitted may hold a
+        # worker while it runs, on top of the workers for everything else
+        self.scheduler = Scheduler(
+            workers=kwargs.get("scheduler_workers", None),
+            reserved=self.admission.max_running,
+        )
+        self.admission.scheduler = self.scheduler
+
+        # a single watch over all check jobs, which the checks wait on for
+        # job completion instead of polling the apiserver
+        self.job_watcher = JobWatcher(self.clients["client"])
+
+        # status patches from every check are coalesced and rate limited
+        # by a single writer
+        self.status_writer = StatusWriter(
+            self.clients["crd_client"],
+            domain=self.domain,
+            version=self.version,
+            plural=self.plural,
+            metrics_queue=self.metrics_queue,
+        )
+
+        # escalations are sent from a pool of workers instead of the check threads
+        self.escalation_dispatcher = EscalationDispatcher(
+            metrics_queue=self.metrics_queue
+        )
+
+        # optionally keep the full logs of each run outside the check status
+        self.log_store = get_log_store(
+            client=self.clients["pod_client"], domain=self.domain, version=self.version
+        )
+
+        # long-lived runner pods for the checks with execution: pool
+        self.runner_pool = RunnerPool()
+
+        # url checks with execution: batch are run many to a pinger Job
+        self.batcher = PingBatcher(
+            client=self.clients["client"],
+            pod_client=self.clients["pod_client"],
+            job_watcher=self.job_watcher,
+            scheduler=self.scheduler,
+            admission=self.admission,
+        )
+
+        # optionally snapshot the scheduler state of every check, so a
+        # restarted controller picks up where this one left off and adopts
+        # the jobs it left running
+        self.snapshotter = None
+        self._snapshot = {}
+        state_store = get_state_store(client=self.clients["pod_client"])
+        if state_store is not None:
+            self.snapshotter = StateSnapshotter(state_store, self.snapshot)
+            self._snapshot = self.snapshotter.load()
+
+        # when running as several replicas, the checks are split between
+        # them on a consistent hash ring
+        self.sharding = None
+        sharding = str(kwargs.get("sharding", os.environ.get("MOZALERT_SHARDING", "")))
+        if sharding.lower() in ["1", "true", "yes"]:
+            self.sharding = ShardCoordinator(on_change=self.rebalance)
 
         signal.signal(signal.SIGINT, self.terminate)
         signal.signal(signal.SIGTERM, self.terminate)
@@ -103,38 +245,45 @@ class Controller:
     def parse_time(time_str):
         """
         parse_time takes either a number (in minutes) or a formatted time string [XXh][XXm][XXs]
+        and returns the total number of seconds (see mozalert.controller.parse_time)
         """
-        try:
-            minutes = float(time_str)
-            return timedelta(minutes=minutes)
-        except:
-            # didn't pass a number, move on to parse the string
-            pass
-        regex = re.compile(
-            r"((?P<hours>\d+?)h)?((?P<minutes>\d+?)m)?((?P<seconds>\d+?)s)?"
-        )
-        parts = regex.match(time_str)
-        if not parts:
-            return
-        parts = parts.groupdict()
-        time_params = {}
-        for (name, param) in iter(parts.items()):
-            if param:
-                time_params[name] = int(param)
-        return timedelta(**time_params)
+        return parse_time(time_str)
 
     def terminate(self, signum=-1, frame=None):
         logging.info("Received SIGTERM. Shutting down.")
         self._shutdown = True
-        for t in self.threads.keys():
-            self._threads[t].terminate()
-
+        # stop everything which adds or removes checks first, then take the
+        # checks as they are; events still in flight are dropped (on_event)
+        self.informer.terminate()
+        if self.sharding is not None:
+            self.sharding.terminate()
         self._check_thread.cancel()
+        with self._lock:
+            checks = list(self._threads.values())
+
+        # with a snapshot the next controller adopts the running jobs
+        keep_jobs = self.snapshotter is not None
+        for check in checks:
+            check.terminate(keep_job=keep_jobs)
+
         self.metrics_thread.terminate()
         self.service_thread.terminate()
+        self.job_watcher.terminate()
+        self.admission.terminate()
+        self.runner_pool.terminate()
+        self.batcher.terminate()
 
-        for t in self.threads.keys():
-            self._threads[t].join()
+        for check in checks:
+            check.join()
+
+        if self.snapshotter is not None and self.snapshotter.is_alive():
+            self.snapshotter.terminate()
+            self.snapshotter.save()
+
+        self.scheduler.terminate()
+        self.status_writer.terminate()
+        self.escalation_dispatcher.terminate()
+        self.escalation_dispatcher.join()
 
         sys.exit()
 
@@ -154,15 +303,25 @@ class Controller:
         """
         logging.info("Checking Cluster Status")
 
-        checks = {}
-        check_list = self.clients["crd_client"].list_cluster_custom_object(
-            self.domain, self.version, self.plural, watch=False
-        )
+        # the informer keeps the server-side checks, so no list is needed
+        if self.informer.synced:
+            with self._lock:
+                self.audit_checks(self.informer.store.list())
 
-        for obj in check_list.get("items"):
+        if not self.shutdown:
+            self.start_cluster_monitor()
+
+    def audit_checks(self, items):
+        """
+        compare the server-side check objects with the checks we are running
+        """
+        checks = {}
+        for obj in items:
             name = obj["metadata"]["name"]
             namespace = obj["metadata"]["namespace"]
             tname = f"{namespace}/{name}"
+            if self.sharding is not None and not self.sharding.owns(tname):
+                continue
             checks[tname] = obj
 
         for tname in checks.keys():
@@ -186,9 +345,6 @@ class Controller:
             if str(tname) not in checks:
                 logging.info(f"{tname} not found in server-side checks")
 
-        if not self.shutdown:
-            self.start_cluster_monitor()
-
     def start_cluster_monitor(self):
         """
         Handle the check_cluster thread
@@ -197,169 +353,412 @@ class Controller:
         logging.info(
             f"Starting cluster monitor thread at interval {self._check_cluster_interval}"
         )
-        self._check_thread = threading.Timer(
-            self._check_cluster_interval, self.check_cluster
+        self._check_thread = self.scheduler.schedule(
+            self._check_cluster_interval, self.check_cluster, name="cluster-monitor"
         )
-        self._check_thread.setName("cluster-monitor")
-        self._check_thread.start()
 
     def run(self):
         """
-        the main thread watches the api server event stream for our crd objects and process
-        events as they come in. Each event has an associated operation:
-        
+        start the shared services, then process the events for our crd objects as the
+        informer (see mozalert.informer) delivers them. Each event has an associated
+        operation:
+
         ADDED: a new check has been created. the main thread creates a new check object which
-               creates a threading.Timer set to the check_interval.
-        
+               schedules its first run on the scheduler at the check_interval.
+
         DELETED: a check has been removed. Cancel/resolve any running threads and delete the
                  check object.
 
         MODIFIED: this can be triggered by the user patching their check, or by a check thread
                   updating the object status. NOTE: updating the status subresource SHOULD NOT
                   trigger a modify, this is probably a bug in k8s. when a check is updated the
-                  changes are applied to the check object.
+                  changes are applied to the check object. Events which don't change the
+                  spec_version of a check are status-only and dropped right away.
 
         ERROR: this can occur sometimes when the CRD is changed; it causes the process to die
-               and restart.
+               and restart. The informer handles an expired resourceVersion itself by
+               relisting, and only hands on what changed.
 
         """
 
+        self.scheduler.setName("scheduler")
+        self.scheduler.start()
+
+        self.job_watcher.setName("job-watcher")
+        self.job_watcher.start()
+
+        self.status_writer.setName("status-writer")
+        self.status_writer.start()
+
+        self.escalation_dispatcher.start()
+
+        self.runner_pool.setName("runner-pool")
+        self.runner_pool.start()
+
+        self.batcher.setName("ping-batcher")
+        self.batcher.start()
+
+        if self.sharding is not None:
+            # until the first membership is known this replica owns nothing,
+            # and the checks seen in the meantime are adopted by rebalance
+            self.sharding.setName("shard-coordinator")
+            self.sharding.start()
+
         self.start_cluster_monitor()
 
         self.metrics_thread = MetricsThread(q=self.metrics_queue)
         self.metrics_thread.setName("metrics-thread")
         self.metrics_thread.start()
+        self.metrics_thread.registry.register(self.admission)
 
-        self.service_thread = ServiceEndpoint()
+        self.service_thread = ServiceEndpoint(
+            registry=self.metrics_thread.registry, controller=self
+        )
         self.service_thread.setName("service-endpoint")
         self.service_thread.start()
 
         logging.info("Waiting for events...")
-        resource_version = ""
-        while not self.shutdown:
-            stream = watch.Watch().stream(
-                self.clients["crd_client"].list_cluster_custom_object,
-                self.domain,
-                self.version,
-                self.plural,
-                resource_version=resource_version,
+        self.informer.setName("check-informer")
+        self.informer.start()
+        if self.snapshotter is not None:
+            # only snapshot once every check has been picked up, so the
+            # state of the checks not added yet isn't overwritten. With
+            # sharding the checks seen before the ring was ready are only
+            # picked up by the first rebalance
+            while not self.shutdown and not self.informer.wait_synced(1):
+                pass
+            while (
+                not self.shutdown
+                and self.sharding is not None
+                and not self._rebalanced.wait(1)
+            ):
+                pass
+            with self._lock:
+                # what's left belongs to checks other replicas run
+                self._snapshot = {}
+            self.snapshotter.setName("state-snapshotter")
+            self.snapshotter.start()
+        while not self.shutdown and self.informer.is_alive():
+            self.informer.join(1)
+        logging.info("Controller shut down")
+
+    def on_event(self, event):
+        """
+        the informer handler: events are delivered on the informer thread
+        """
+        with self._lock:
+            if self.shutdown:
+                return
+            started = monotonic()
+            self.handle_event(event)
+        observe(
+            self.metrics_queue,
+            "mozalert_event_processing_seconds",
+            monotonic() - started,
+        )
+
+    def new_check(self, **kwargs):
+        """
+        create a check object, handing it the clients and shared services
+        """
+        cls = Check
+        if kwargs.get("check_type") in PROBE_TYPES:
+            cls = ProbeCheck
+        return cls(
+            metrics_queue=self.metrics_queue,
+            scheduler=self.scheduler,
+            job_watcher=self.job_watcher,
+            status_writer=self.status_writer,
+            escalation_dispatcher=self.escalation_dispatcher,
+            log_store=self.log_store,
+            runner_pool=self.runner_pool,
+            batcher=self.batcher,
+            admission=self.admission,
+            **self.clients,
+            **kwargs,
+        )
+
+    def parse_check(self, obj):
+        """
+        turn a check object from the apiserver into the kwargs for new_check
+        """
+        spec = obj.get("spec")
+        metadata = obj.get("metadata")
+        name = metadata.get("name")
+
+        # you can define the pod template either by specifying the entire
+        # template, or specifying the values necessary to generate one:
+        # image: the check image to run
+        # secretRef: where you store secrets to be passed to your chec
+        #            as env vars
+        # check_cm: the configMap containing the body of your check
+        check_type = spec.get("type", "job")
+        pod_spec = spec.get("template", {}).get("spec", {})
+        if check_type in PROBE_TYPES:
+            # probes run in the controller and have no pod
+            pod_spec = {}
+        elif not pod_spec:
+            pod_spec = self.build_spec(
+                name=name,
+                image=spec.get("image", None),
+                secret_ref=spec.get("secret_ref", None),
+                check_cm=spec.get("check_cm", None),
+                check_url=spec.get("check_url", None),
             )
-            for event in stream:
-                obj = event.get("object")
-                operation = event.get("type")
-                # restart the controller if ERROR operation is detected.
-                # dying is harsh but in theory states should be preserved in the k8s object.
-                # I've only seen the ERROR state when applying changes to the CRD definition
-                # and in those cases restarting the controller pod is appropriate. TODO validate
-                if operation == "ERROR":
-                    logging.error("Received ERROR operation, Dying.")
-                    sys.exit()
-                if operation not in ["ADDED", "MODIFIED", "DELETED"]:
-                    logging.warning(
-                        f"Received unexpected operation {operation}. Moving on."
-                    )
-                    continue
 
-                spec = obj.get("spec")
-                status = obj.get("status", {})
-                intervals = {
-                    "check_interval": self.parse_time(
-                        spec.get("check_interval")
-                    ).seconds,
-                    "retry_interval": self.parse_time(
-                        spec.get("retry_interval", "")
-                    ).seconds,
-                    "notification_interval": self.parse_time(
-                        spec.get("notification_interval", "")
-                    ).seconds,
-                }
-                max_attempts = spec.get("max_attempts", 3)
-                timeout = self.parse_time(
-                    spec.get("timeout", "5m")
-                ).seconds  # TODO consider parameterizing some cluster defaults
-
-                escalations = spec.get("escalations", [])
-
-                metadata = obj.get("metadata")
-                name = metadata.get("name")
-                namespace = metadata.get("namespace")
-                thread_name = f"{namespace}/{name}"
-
-                # when we restart the stream start from events after this version
-                resource_version = metadata.get("resourceVersion")
-
-                # you can define the pod template either by specifying the entire
-                # template, or specifying the values necessary to generate one:
-                # image: the check image to run
-                # secretRef: where you store secrets to be passed to your chec
-                #            as env vars
-                # check_cm: the configMap containing the body of your check
-                pod_spec = spec.get("template", {}).get("spec", {})
-                if not pod_spec:
-                    pod_spec = self.build_spec(
-                        name=name,
-                        image=spec.get("image", None),
-                        secret_ref=spec.get("secret_ref", None),
-                        check_cm=spec.get("check_cm", None),
-                        check_url=spec.get("check_url", None),
-                    )
+        return {
+            "name": name,
+            "namespace": metadata.get("namespace"),
+            "uid": metadata.get("uid"),
+            "spec": pod_spec,
+            "check_interval": self.parse_time(spec.get("check_interval")),
+            "retry_interval": self.parse_time(spec.get("retry_interval", "")),
+            "notification_interval": self.parse_time(
+                spec.get("notification_interval", "")
+            ),
+            "max_attempts": spec.get("max_attempts", 3),
+            # TODO consider parameterizing some cluster defaults
+            "timeout": self.parse_time(
+                spec.get("timeout", "10s" if check_type in PROBE_TYPES else "5m")
+            ),
+            "escalations": spec.get("escalations", []),
+            "execution": spec.get("execution", "job"),
+            "entrypoint": spec.get("entrypoint", DEFAULT_ENTRYPOINT),
+            "check_url": spec.get("check_url", None),
+            "check_type": check_type,
+            "expected_status": spec.get("expected_status", None),
+        }
+
+    @staticmethod
+    def config_changed(check, check_config):
+        """
+        compare a running check to the config parsed from its object
+        """
+        # TODO come up with a better way to do this
+        return (
+            check.config.spec != check_config["spec"]
+            or check.config.notification_interval
+            != check_config["notification_interval"]
+            or check.config.check_interval != check_config["check_interval"]
+            or check.config.retry_interval != check_config["retry_interval"]
+            or check.config.max_attempts != check_config["max_attempts"]
+            or check.config.escalations != check_config["escalations"]
+            or check.config.timeout != check_config["timeout"]
+            or check.config.execution != check_config["execution"]
+            or check.config.entrypoint != check_config["entrypoint"]
+            or check.config.check_type != check_config["check_type"]
+            or check.config.check_url != check_config["check_url"]
+            or check.config.expected_status != check_config["expected_status"]
+        )
+
+    @staticmethod
+    def spec_version(obj):
+        """
+        something which changes whenever the spec of a check object changes.
+        That's metadata.generation, which the apiserver only bumps for spec
+        changes since checks have a status subresource. The spec itself is
+        the fallback for objects without one.
+        """
+        generation = obj.get("metadata").get("generation")
+        if generation is not None:
+            return generation
+        return obj.get("spec")
+
+    def handle_event(self, event):
+        """
+        process a single event from the check object stream (see run)
+        """
+        obj = event.get("object")
+        operation = event.get("type")
+        # restart the controller if ERROR operation is detected.
+        # dying is harsh but in theory states should be preserved in the k8s object.
+        # I've only seen the ERROR state when applying changes to the CRD definition
+        # and in those cases restarting the controller pod is appropriate. TODO validate
+        if operation == "ERROR":
+            logging.error("Received ERROR operation, Dying.")
+            sys.exit()
+        if operation not in ["ADDED", "MODIFIED", "DELETED"]:
+            logging.warning(f"Received unexpected operation {operation}. Moving on.")
+            return
 
-                logging.debug(
-                    f"{operation} operation detected for thread {thread_name}"
+        metadata = obj.get("metadata")
+        thread_name = f"{metadata.get('namespace')}/{metadata.get('name')}"
+
+        # when we restart the stream start from events after this version
+        self._resource_version = metadata.get("resourceVersion")
+
+        if (
+            self.sharding is not None
+            and operation != "DELETED"
+            and not self.sharding.owns(thread_name)
+        ):
+            # the informer still keeps the object, so the check can be
+            # adopted when the shard ring changes (see rebalance)
+            if thread_name in self._threads:
+                # another replica has taken this check over
+                self.remove_check(thread_name, keep_job=True)
+            return
+
+        if operation == "MODIFIED" and thread_name in self.threads:
+            if self._spec_versions.get(thread_name) == self.spec_version(obj):
+                # only the status changed, which is almost always our own
+                # status patch coming back. there's nothing to do so stop here,
+                # before doing any of the parsing below
+                logging.debug("Detected a status change")
+                return
+
+        logging.debug(f"{operation} operation detected for thread {thread_name}")
+
+        if operation in ["ADDED", "MODIFIED"]:
+            try:
+                check_config = self.parse_check(obj)
+            except ValueError as e:
+                # leave a running check as it is until its spec is fixed
+                logging.error(f"Invalid check {thread_name}: {e}")
+                return
+
+        if operation == "ADDED":
+            # create a new check
+            self.add_check(thread_name, obj, check_config)
+        elif operation == "DELETED":
+            if thread_name in self._threads:
+                # stop the thread and delete the check object
+                self.remove_check(thread_name)
+                logging.info(f"{thread_name} deleted")
+        elif operation == "MODIFIED":
+            if thread_name not in self.threads:
+                # most likely the check was invalid when it was added
+                logging.info(f"Detected a modification to unknown {thread_name}")
+                self.add_check(thread_name, obj, check_config)
+            elif self.config_changed(self.threads[thread_name], check_config):
+                logging.info(
+                    f"Detected a modification to {thread_name}, restarting the thread"
+                )
+                self.remove_check(thread_name, keep_metrics=True)
+                self._threads[thread_name] = self.new_check(
+                    fence=self.fence(thread_name), **check_config
                 )
+                self._spec_versions[thread_name] = self.spec_version(obj)
+            else:
+                self._spec_versions[thread_name] = self.spec_version(obj)
+                logging.debug("Detected a status change")
+
+    def add_check(self, thread_name, obj, check_config):
+        """
+        start a check for obj, picking up from the status stored in the object
+        """
+        self._threads[thread_name] = self.new_check(
+            pre_status=obj.get("status", {}),
+            snapshot=self._snapshot.pop(thread_name, None),
+            fence=self.fence(thread_name),
+            **check_config,
+        )
+        self._spec_versions[thread_name] = self.spec_version(obj)
 
-                if operation == "ADDED":
-                    # create a new check
-                    self._threads[thread_name] = Check(
-                        name=name,
-                        namespace=namespace,
-                        spec=pod_spec,
-                        max_attempts=max_attempts,
-                        escalations=escalations,
-                        pre_status=status,
-                        timeout=timeout,
-                        metrics_queue=self.metrics_queue,
-                        **self.clients,
-                        **intervals,
+    def remove_check(self, thread_name, keep_job=False, keep_metrics=False):
+        """
+        stop a check and forget everything about it. With keep_job its
+        running job is left alone, for the replica taking the check over.
+        With keep_metrics its series stay exported, for a check which is
+        only restarted.
+        """
+        check = self._threads.pop(thread_name)
+        check.terminate(keep_job=keep_job)
+        self._spec_versions.pop(thread_name, None)
+        if self.status_writer is not None:
+            self.status_writer.forget(check.config.namespace, check.config.name)
+        if not keep_metrics:
+            forget(self.metrics_queue, check.config.name, check.config.namespace)
+
+    def fence(self, thread_name):
+        """
+        how long a check has to wait before its first run here, see
+        ShardCoordinator.fence
+        """
+        if self.sharding is None:
+            return 0
+        return self.sharding.fence(thread_name)
+
+    def health(self):
+        """
+        the health of the controller for /healthz: it's healthy while the
+        informer follows the checks and the scheduler keeps up with them.
+        The job watcher is only reported, checks fall back to polling
+        without it.
+        """
+        lag = self.scheduler.lag
+        informer = {
+            "healthy": self.informer.healthy,
+            "synced": self.informer.synced,
+            "last_contact_seconds": self.informer.last_contact,
+            "resource_version": self.informer.resource_version,
+        }
+        scheduler = {
+            "healthy": self.scheduler.is_alive() and lag < self._health_max_lag,
+            "lag_seconds": round(lag, 3),
+            "pending": self.scheduler.pending,
+            "workers": self.scheduler.workers,
+        }
+        healthy = informer["healthy"] and scheduler["healthy"] and not self.shutdown
+        return {
+            "healthy": healthy,
+            "checks": len(self._threads),
+            "informer": informer,
+            "scheduler": scheduler,
+            "job_watcher": {"healthy": self.job_watcher.healthy},
+            "admission": {
+                "running": self.admission.running,
+                "queued": self.admission.queued,
+            },
+            "status_writer": self.status_writer.stats,
+            "escalations": self.escalation_dispatcher.stats,
+            "metrics_dropped": self.metrics_queue.dropped,
+        }
+
+    def debug_checks(self, namespace=None):
+        """
+        the in-memory state of every check (or those in namespace) for
+        /debug/checks
+        """
+        with self._lock:
+            checks = list(self._threads.values())
+        return [
+            check.describe()
+            for check in checks
+            if namespace is None or check.config.namespace == namespace
+        ]
+
+    def snapshot(self):
+        """
+        the scheduler state of every check, for the StateSnapshotter
+        """
+        with self._lock:
+            return {name: check.snapshot() for name, check in self._threads.items()}
+
+    def rebalance(self, members=None):
+        """
+        called by the ShardCoordinator when the controller membership changes:
+        hand off the checks this replica no longer owns and adopt the ones it
+        now does
+        """
+        with self._lock:
+            if self.shutdown:
+                return
+            for thread_name in list(self._threads):
+                if not self.sharding.owns(thread_name):
+                    logging.info(
+                        f"Handing {thread_name} off to {self.sharding.owner(thread_name)}"
                     )
-                elif operation == "DELETED":
-                    if thread_name in self._threads:
-                        # stop the thread
-                        self._threads[thread_name].terminate()
-                        # delete the check object
-                        del self._threads[thread_name]
-                        logging.info("{thread_name} deleted")
-                elif operation == "MODIFIED":
-                    # TODO come up with a better way to do this
-                    if (
-                        self.threads[thread_name].config.spec != pod_spec
-                        or self.threads[thread_name].config.notification_interval
-                        != intervals["notification_interval"]
-                        or self.threads[thread_name].config.check_interval
-                        != intervals["check_interval"]
-                        or self.threads[thread_name].config.retry_interval
-                        != intervals["retry_interval"]
-                        or self.threads[thread_name].config.max_attempts != max_attempts
-                        or self.threads[thread_name].config.escalations != escalations
-                        or self.threads[thread_name].config.timeout != timeout
-                    ):
-                        logging.info(
-                            f"Detected a modification to {thread_name}, restarting the thread"
-                        )
-                        if thread_name in self.threads:
-                            self._threads[thread_name].terminate()
-                            del self._threads[thread_name]
-                            self._threads[thread_name] = Check(
-                                name=name,
-                                namespace=namespace,
-                                spec=pod_spec,
-                                max_attempts=max_attempts,
-                                escalations=escalations,
-                                timeout=timeout,
-                                metrics_queue=self.metrics_queue,
-                                **self.clients,
-                                **intervals,
-                            )
-                    else:
-                        logging.debug("Detected a status change")
-        logging.info("Controller shut down")
+                    self.remove_check(thread_name, keep_job=True)
+            for obj in self.informer.store.list():
+                thread_name = object_key(obj)
+                if thread_name in self._threads or not self.sharding.owns(thread_name):
+                    continue
+                try:
+                    check_config = self.parse_check(obj)
+                except ValueError as e:
+                    logging.error(f"Invalid check {thread_name}: {e}")
+                    continue
+                logging.info(f"Adopting {thread_name}")
+                self.add_check(thread_name, obj, check_config)
+            self._rebalanced.set()
@@ -0,0 +1,236 @@
+import os
+import sys
+import logging
+import threading
+import queue
+from time import monotonic
+
+from mozalert.metrics import observe
+from mozalert.utils.backoff import backoff
+
+
+class EscalationDispatcher:
+    """
+    the EscalationDispatcher sends escalations from a small pool of worker
+    threads, so a slow webhook or mail API never holds up the check which
+    escalated. Escalations are queued on a bounded queue; when it is full new
+    escalations are dropped (and logged) rather than blocking the check.
+    Failed escalations are retried with capped exponential backoff.
+
+    When many checks fail together (e.g. a shared dependency goes down) they
+    would all escalate at once, so escalations are aggregated before they
+    are queued:
+    * escalations for the same destination are held for up to window
+      seconds and then sent as a single digest, if the plugin supports it
+    * an escalation which repeats the last status sent for the same check
+      and destination within its dedupe interval is dropped. An escalation
+      which is dropped or fails to send isn't deduped against
+    """
+
+    def __init__(self, **kwargs):
+        self._shutdown = False
+        self._workers = int(
+            kwargs.get("workers", os.environ.get("MOZALERT_ESCALATION_WORKERS", 4))
+        )
+        self.metrics_queue = kwargs.get("metrics_queue", None)
+        self._max_retries = int(kwargs.get("max_retries", 3))
+        self._backoff = float(kwargs.get("backoff", 1))
+        self._max_backoff = float(kwargs.get("max_backoff", 30))
+        self._window = float(
+            kwargs.get("window", os.environ.get("MOZALERT_ESCALATION_WINDOW", 10))
+        )
+        self._queue = queue.Queue(
+            maxsize=int(
+                kwargs.get(
+                    "queue_size", os.environ.get("MOZALERT_ESCALATION_QUEUE_SIZE", 1000)
+                )
+            )
+        )
+        self._threads = []
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        # destination -> (flush deadline, [escalations])
+        self._batches = {}
+        # (destination, name) -> (status, expiry) of the last escalation sent
+        # or on its way
+        self._sent = {}
+        # digest -> the escalations it reports
+        self._digests = {}
+        self._stats = {"submitted": 0, "deduped": 0, "digests": 0, "dropped": 0}
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    def start(self):
+        for i in range(self._workers):
+            t = threading.Thread(target=self.work, name=f"escalation-worker-{i}")
+            t.start()
+            self._threads.append(t)
+        if self._window > 0:
+            t = threading.Thread(target=self.aggregate, name="escalation-aggregator")
+            t.start()
+            self._threads.append(t)
+
+    def terminate(self):
+        logging.info("Stopping escalation dispatcher")
+        with self._cond:
+            # hand every pending batch to the workers before they stop
+            self.flush(force=True)
+            self._shutdown = True
+            self._cond.notify()
+        self._stop.set()
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def submit(self, escalation, dedupe_interval=0):
+        """
+        queue an escalation (anything with a run method) to be sent. Returns
+        False if it was dropped as a duplicate or because the queue is full.
+        """
+        destination = getattr(escalation, "destination", None)
+        with self._cond:
+            self._stats["submitted"] += 1
+            if dedupe_interval > 0:
+                key = self._key(escalation)
+                now = monotonic()
+                last = self._sent.get(key)
+                if last and last[0] == escalation.status and last[1] > now:
+                    logging.info(
+                        f"Dropping duplicate {escalation.status} escalation "
+                        f"for {escalation.name}"
+                    )
+                    self._stats["deduped"] += 1
+                    return False
+                self._sent[key] = (escalation.status, now + dedupe_interval)
+            if destination is None or self._window <= 0 or self.shutdown:
+                return self._enqueue(escalation)
+            if destination not in self._batches:
+                self._batches[destination] = (monotonic() + self._window, [])
+                self._cond.notify()
+            self._batches[destination][1].append(escalation)
+        return True
+
+    @staticmethod
+    def _key(escalation):
+        destination = getattr(escalation, "destination", None)
+        return (destination or type(escalation), escalation.name)
+
+    def _forget(self, escalation):
+        """
+        forget an escalation (or the escalations in a digest) which was never
+        sent, so the next one for the check isn't dropped as a duplicate of
+        it. Must be called with the lock held.
+        """
+        for escalation in self._digests.pop(escalation, [escalation]):
+            key = self._key(escalation)
+            last = self._sent.get(key)
+            if last and last[0] == escalation.status:
+                del self._sent[key]
+
+    def _enqueue(self, escalation):
+        try:
+            self._queue.put_nowait(escalation)
+            return True
+        except queue.Full:
+            logging.error(
+                f"Escalation queue is full, dropping escalation for {escalation.name}"
+            )
+            self._stats["dropped"] += 1
+            self._forget(escalation)
+            return False
+
+    def flush(self, force=False):
+        """
+        queue every batch whose window has passed (or all of them if force)
+        as a digest. Must be called with the lock held. Returns how long
+        until the next batch is due, or None if there are none.
+        """
+        now = monotonic()
+        next_due = None
+        for destination, (deadline, batch) in list(self._batches.items()):
+            if not force and deadline > now:
+                next_due = deadline if next_due is None else min(next_due, deadline)
+                continue
+            del self._batches[destination]
+            digest = None
+            if len(batch) > 1:
+                digest = type(batch[0]).digest(batch)
+            if digest is not None:
+                logging.info(
+                    f"Sending a digest of {len(batch)} escalations to {destination}"
+                )
+                self._stats["digests"] += 1
+                self._digests[digest] = batch
+                self._enqueue(digest)
+            else:
+                for escalation in batch:
+                    self._enqueue(escalation)
+        # forget dedupe entries which have expired
+        for key, (_, expiry) in list(self._sent.items()):
+            if expiry <= now:
+                del self._sent[key]
+        return None if next_due is None else next_due - now
+
+    def aggregate(self):
+        with self._cond:
+            while not self.shutdown:
+                self._cond.wait(self.flush())
+
+    def send(self, escalation):
+        """
+        run an escalation, retrying with backoff until it succeeds or runs out
+        of retries
+        """
+        for attempt in range(self._max_retries + 1):
+            try:
+                started = monotonic()
+                escalation.run()
+                observe(
+                    self.metrics_queue,
+                    "mozalert_escalation_send_seconds",
+                    monotonic() - started,
+                )
+                return True
+            except Exception as e:
+                logging.warning(
+                    f"Escalation for {escalation.name} failed "
+                    f"(attempt {attempt + 1}/{self._max_retries + 1})"
+                )
+                logging.warning(sys.exc_info()[0])
+                logging.warning(e)
+            if attempt < self._max_retries:
+                # full jitter, so a storm of failures doesn't retry in lockstep
+                if self._stop.wait(backoff(attempt, self._backoff, self._max_backoff)):
+                    break
+        logging.error(f"Giving up on escalation for {escalation.name}")
+        return False
+
+    def work(self):
+        # escalations still queued at shutdown are sent, without retries
+        while not self.shutdown or not self._queue.empty():
+            try:
+                escalation = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            sent = False
+            try:
+                sent = self.send(escalation)
+            finally:
+                with self._cond:
+                    if sent:
+                        self._digests.pop(escalation, None)
+                    else:
+                        self._forget(escalation)
+                self._queue.task_done()
@@ -1,3 +1,18 @@
+import asyncio
+import importlib
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_escalation(escalation_type):
+    """
+    look up the Escalation class implemented by the plugin module
+    mozalert.escalations.<escalation_type>. The lookup is cached.
+    """
+    module = importlib.import_module(f".escalations.{escalation_type}", "mozalert")
+    return getattr(module, "Escalation")
+
+
 class BaseEscalation:
     def __init__(self, name, status, **kwargs):
         self.name = name
@@ -6,7 +21,35 @@ class BaseEscalation:
         self.max_attempts = kwargs.get("max_attempts", None)
         self.last_check = kwargs.get("last_check", None)
         self.logs = kwargs.get("logs", None)
+        self.logs_ref = kwargs.get("logs_ref", None)
         self.args = kwargs.get("args", {})
 
+    @property
+    def destination(self):
+        """
+        where the escalation is sent, e.g. a slack channel or an email
+        address. Escalations with the same destination may be batched into
+        one digest; None means the escalation is always sent on its own.
+        """
+        return None
+
+    @classmethod
+    def digest(cls, escalations):
+        """
+        build one escalation which reports all of escalations, which share a
+        destination. Returns None if the plugin can't send digests.
+        """
+        return None
+
     def run(self):
         pass
+
+    async def arun(self, session=None):
+        """
+        run the escalation from the asyncio engine. By default this runs the
+        blocking run() in the loop's executor; plugins with an async client
+        should override it and send through session, the controller's
+        aiohttp session, when there is one.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.run)
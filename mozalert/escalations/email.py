@@ -27,9 +27,27 @@ class Escalation(BaseEscalation):
             self.message += (
                 "\n" + f"<b>More Details:</b><br> <pre>{self.logs}</pre><br>"
             )
+        if self.logs_ref:
+            self.message += "\n" + f"<b>Full Logs:</b> {self.logs_ref}<br>"
         self.message += "\n" + "</p>"
         self.subject = f"Mozalert {self.status}: {self.name}"
 
+    @property
+    def destination(self):
+        return ("email", self.email)
+
+    @classmethod
+    def digest(cls, escalations):
+        first = escalations[0]
+        digest = cls(f"{len(escalations)} checks", "DIGEST", args=first.args)
+        counts = {}
+        for escalation in escalations:
+            counts[escalation.status] = counts.get(escalation.status, 0) + 1
+        summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+        digest.subject = f"Mozalert: {len(escalations)} checks ({summary})"
+        digest.message = "\n<hr>\n".join(e.message for e in escalations)
+        return digest
+
     def run(self):
         SendGridTools.send_message(
             api_key=self.api_key,
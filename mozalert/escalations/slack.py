@@ -2,9 +2,16 @@ from mozalert.escalations import BaseEscalation
 
 import os
 
-import requests
 import json
 
+from mozalert.utils.http import get_session, DEFAULT_TIMEOUT
+
+try:
+    import aiohttp
+except ImportError:
+    # aiohttp comes with the asyncio engine's dependencies
+    aiohttp = None
+
 
 class Escalation(BaseEscalation):
     def __init__(self, name, status, **kwargs):
@@ -32,9 +39,49 @@ class Escalation(BaseEscalation):
         }
         self.slack_message = json.dumps(self.slack_message)
 
+    @property
+    def destination(self):
+        return ("slack", self.webhook_url, self.channel)
+
+    @classmethod
+    def digest(cls, escalations, max_attachments=50):
+        first = escalations[0]
+        digest = cls(f"{len(escalations)} checks", "DIGEST", args=first.args)
+        attachments = []
+        for escalation in escalations[:max_attachments]:
+            attachments += json.loads(escalation.slack_message)["attachments"]
+        text = f"{len(escalations)} checks changed status"
+        if len(escalations) > max_attachments:
+            text += f", showing the first {max_attachments}"
+        digest.slack_message = json.dumps(
+            {
+                "channel": first.channel,
+                "username": "Mozalert",
+                "icon_emoji": ":scream_cat:",
+                "text": text,
+                "attachments": attachments,
+            }
+        )
+        return digest
+
     def run(self):
-        resp = requests.post(
+        resp = get_session(self.webhook_url).post(
             self.webhook_url,
             data=self.slack_message,
             headers={"Content-Type": "application/json"},
+            timeout=DEFAULT_TIMEOUT,
         )
+        resp.raise_for_status()
+
+    async def arun(self, session=None):
+        if aiohttp is None or session is None:
+            return await super().arun(session)
+        connect, read = DEFAULT_TIMEOUT
+        async with session.post(
+            self.webhook_url,
+            data=self.slack_message,
+            headers={"Content-Type": "application/json"},
+            timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+        ) as resp:
+            await resp.read()
+            resp.raise_for_status()
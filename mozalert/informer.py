@@ -0,0 +1,265 @@
+import os
+import sys
+import logging
+import threading
+from time import sleep, monotonic
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+
+def object_key(obj):
+    metadata = obj.get("metadata")
+    return f"{metadata.get('namespace')}/{metadata.get('name')}"
+
+
+class CheckStore:
+    """
+    the latest version of every check object, keyed by namespace/name and
+    indexed by namespace. Reads are safe from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._objects = {}
+        # namespace -> {namespace/name: object}
+        self._namespaces = {}
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, key):
+        return key in self._objects
+
+    def get(self, namespace, name):
+        return self._objects.get(f"{namespace}/{name}")
+
+    def get_by_key(self, key):
+        return self._objects.get(key)
+
+    def keys(self):
+        with self._lock:
+            return list(self._objects)
+
+    def list(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                return list(self._objects.values())
+            return list(self._namespaces.get(namespace, {}).values())
+
+    def namespaces(self):
+        with self._lock:
+            return list(self._namespaces)
+
+    def put(self, obj):
+        """
+        store obj, returning the version it replaced (or None)
+        """
+        key = object_key(obj)
+        namespace = obj.get("metadata").get("namespace")
+        with self._lock:
+            old = self._objects.get(key)
+            self._objects[key] = obj
+            self._namespaces.setdefault(namespace, {})[key] = obj
+        return old
+
+    def delete(self, key):
+        with self._lock:
+            obj = self._objects.pop(key, None)
+            if obj is not None:
+                namespace = obj.get("metadata").get("namespace")
+                index = self._namespaces.get(namespace, {})
+                index.pop(key, None)
+                if not index:
+                    self._namespaces.pop(namespace, None)
+        return obj
+
+
+class CheckInformer(threading.Thread):
+    """
+    the CheckInformer lists the check objects once, then follows a watch
+    from the version of that list, keeping a CheckStore up to date. The
+    controller, the cluster monitor and the service endpoint all read from
+    the store instead of listing the CRD themselves.
+
+    Watches are resumed from the last resourceVersion seen, which bookmark
+    events keep fresh even when no check changes. Only when that version
+    has expired (410 Gone) is the CRD listed again; the list is diffed
+    against the store so only real changes are handed on.
+
+    Every handler is called with each change as a watch-style event dict
+    ({"type": ADDED/MODIFIED/DELETED, "object": obj}). Every resync_interval
+    seconds the whole store is handed to the handlers again as MODIFIED
+    events, without calling the apiserver, so a missed event is repaired.
+    """
+
+    def __init__(self, client, domain, version, plural, **kwargs):
+        super().__init__()
+        self.client = client
+        self.domain = domain
+        self.version = version
+        self.plural = plural
+        self._shutdown = False
+        self._synced = threading.Event()
+        self._watch = None
+        self._resource_version = ""
+        self._timeout_seconds = int(kwargs.get("timeout_seconds", 300))
+        self._retry_interval = float(kwargs.get("retry_interval", 5))
+        self._resync_interval = float(
+            kwargs.get(
+                "resync_interval", os.environ.get("MOZALERT_INFORMER_RESYNC", 600)
+            )
+        )
+        self._last_resync = monotonic()
+        # when the apiserver last answered a list or watch
+        self._last_contact = None
+        self._handlers = list(kwargs.get("handlers", []))
+        self.store = CheckStore()
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def synced(self):
+        return self._synced.is_set()
+
+    @property
+    def last_contact(self):
+        """
+        seconds since the apiserver last answered a list or watch, or None
+        if it never has
+        """
+        if self._last_contact is None:
+            return None
+        return monotonic() - self._last_contact
+
+    @property
+    def healthy(self):
+        """
+        whether the checks are being followed: the informer is running, has
+        synced, and its watch has been answered within twice the watch
+        timeout (a quiet watch still ends and restarts every timeout)
+        """
+        age = self.last_contact
+        return (
+            self.is_alive()
+            and self.synced
+            and age is not None
+            and age < 2 * self._timeout_seconds + self._retry_interval
+        )
+
+    @property
+    def resource_version(self):
+        return self._resource_version
+
+    def wait_synced(self, timeout=None):
+        return self._synced.wait(timeout)
+
+    def add_handler(self, handler):
+        self._handlers.append(handler)
+
+    def terminate(self):
+        logging.info("Stopping check informer")
+        self._shutdown = True
+        if self._watch:
+            self._watch.stop()
+
+    def notify(self, operation, obj):
+        for handler in self._handlers:
+            try:
+                handler({"type": operation, "object": obj})
+            except Exception as e:
+                logging.error(f"Failed to handle {operation} for {object_key(obj)}")
+                logging.error(sys.exc_info()[0])
+                logging.error(e)
+
+    def relist(self):
+        """
+        replace the store with a full list of the checks, handing on only
+        what changed since the store was last up to date
+        """
+        res = self.client.list_cluster_custom_object(
+            self.domain, self.version, self.plural
+        )
+        seen = set()
+        for obj in res.get("items", []):
+            key = object_key(obj)
+            seen.add(key)
+            old = self.store.put(obj)
+            if old is None:
+                self.notify("ADDED", obj)
+            elif old.get("metadata").get("resourceVersion") != obj.get("metadata").get(
+                "resourceVersion"
+            ):
+                self.notify("MODIFIED", obj)
+        for key in self.store.keys():
+            if key not in seen:
+                self.notify("DELETED", self.store.delete(key))
+        self._resource_version = res.get("metadata", {}).get("resourceVersion", "")
+        self._last_contact = monotonic()
+        self._synced.set()
+
+    def resync(self):
+        if self._resync_interval <= 0:
+            return
+        if monotonic() - self._last_resync < self._resync_interval:
+            return
+        self._last_resync = monotonic()
+        logging.debug(f"Resyncing {len(self.store)} checks")
+        for obj in self.store.list():
+            self.notify("MODIFIED", obj)
+
+    def handle(self, event):
+        self._last_contact = monotonic()
+        operation = event.get("type")
+        obj = event.get("object")
+        if obj.get("metadata", {}).get("resourceVersion"):
+            self._resource_version = obj["metadata"]["resourceVersion"]
+        if operation == "BOOKMARK":
+            return
+        if operation == "DELETED":
+            self.store.delete(object_key(obj))
+        elif operation in ["ADDED", "MODIFIED"]:
+            self.store.put(obj)
+        self.notify(operation, obj)
+
+    def run(self):
+        logging.info("Starting check informer")
+        while not self.shutdown:
+            try:
+                if not self._resource_version:
+                    self.relist()
+                self._watch = watch.Watch()
+                # the watch ends after timeout_seconds so resyncs happen
+                # even when nothing changes
+                timeout = self._timeout_seconds
+                if self._resync_interval > 0:
+                    timeout = max(min(timeout, int(self._resync_interval)), 1)
+                for event in self._watch.stream(
+                    self.client.list_cluster_custom_object,
+                    self.domain,
+                    self.version,
+                    self.plural,
+                    resource_version=self._resource_version,
+                    allow_watch_bookmarks=True,
+                    timeout_seconds=timeout,
+                ):
+                    self.handle(event)
+                    self.resync()
+                # the watch ran to its timeout
+                self._last_contact = monotonic()
+                self.resync()
+            except ApiException as e:
+                if e.status == 410:
+                    logging.info("Check watch resourceVersion expired, relisting")
+                    self._resource_version = ""
+                else:
+                    logging.warning(f"Check watch failed: {e.reason}")
+                    sleep(self._retry_interval)
+            except Exception as e:
+                logging.warning("Check watch failed")
+                logging.warning(sys.exc_info()[0])
+                logging.warning(e)
+                sleep(self._retry_interval)
+        logging.info("Check informer shut down")
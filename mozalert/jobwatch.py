@@ -0,0 +1,228 @@
+import sys
+import logging
+import threading
+from time import sleep, monotonic
+from types import SimpleNamespace
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+# every job created by a check carries this label so a single watch can
+# follow all of them without seeing anything else in the cluster
+JOB_LABELS = {"app.kubernetes.io/managed-by": "mozalert"}
+JOB_LABEL_SELECTOR = ",".join(f"{k}={v}" for k, v in JOB_LABELS.items())
+
+
+def job_status(job):
+    """
+    translate a V1Job into the SimpleNamespace status the checks work with
+    """
+    status = SimpleNamespace(
+        uid=None, active=False, succeeded=False, failed=False, start_time=None
+    )
+    if job.metadata:
+        status.uid = job.metadata.uid
+    if not job.status:
+        return status
+
+    if job.status.active == 1:
+        status.active = True
+
+    if job.status.succeeded:
+        status.succeeded = True
+
+    if job.status.failed:
+        status.failed = True
+
+    if job.status.start_time:
+        status.start_time = job.status.start_time
+
+    return status
+
+
+class JobWatcher(threading.Thread):
+    """
+    the JobWatcher keeps one watch stream open over every mozalert job in the
+    cluster and wakes up the check waiting on a job as soon as that job
+    completes or fails. This replaces polling read_namespaced_job_status from
+    every running check.
+
+    Checks should only rely on the watcher while it is healthy, and fall back
+    to polling otherwise.
+    """
+
+    def __init__(self, client, **kwargs):
+        # the watcher holds no state worth flushing, so it shouldn't keep the
+        # process alive while it sits in a long-running watch request
+        super().__init__(daemon=True)
+        self.client = client
+        self._shutdown = False
+        self._healthy = False
+        self._watch = None
+        self._timeout_seconds = int(kwargs.get("timeout_seconds", 300))
+        self._retry_interval = float(kwargs.get("retry_interval", 5))
+        self._lock = threading.Lock()
+        # latest known status of each job, keyed by namespace/name
+        self._jobs = {}
+        # the checks waiting on a job, keyed by namespace/name
+        self._waiters = {}
+        # (uid, callback) of the checks to call back once their job is done,
+        # keyed by namespace/name
+        self._callbacks = {}
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def healthy(self):
+        return self._healthy and not self._shutdown
+
+    def terminate(self):
+        logging.info("Stopping job watcher")
+        self._shutdown = True
+        self._healthy = False
+        if self._watch:
+            self._watch.stop()
+        # don't keep checks waiting on a watch which is going away
+        self._wake_all()
+
+    def wait(self, namespace, name, uid, timeout=None):
+        """
+        block until the job namespace/name with the given uid has finished,
+        and return its status. Returns None if the timeout expires first.
+        """
+        key = f"{namespace}/{name}"
+        deadline = monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                with self._lock:
+                    status = self._jobs.get(key)
+                    if (
+                        status
+                        and status.uid == uid
+                        and (status.succeeded or status.failed)
+                    ):
+                        return status
+                    # clearing under the lock means an update which lands
+                    # after this point is never missed
+                    event = self._waiters.setdefault(key, threading.Event())
+                    event.clear()
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return None
+                if not event.wait(remaining) or not self.healthy:
+                    return None
+        finally:
+            with self._lock:
+                self._waiters.pop(key, None)
+
+    def notify(self, namespace, name, uid, callback):
+        """
+        call callback() once the job namespace/name with the given uid has
+        finished or gone away, or as soon as the watch can no longer be
+        relied on. Unlike wait this doesn't tie up the calling thread.
+
+        The callback is called on the watcher thread (or right away on the
+        calling thread), so it should only hand the work off. A later
+        notify for the same job replaces the callback.
+        """
+        key = f"{namespace}/{name}"
+        with self._lock:
+            status = self._jobs.get(key)
+            done = status and status.uid == uid and (status.succeeded or status.failed)
+            if not done and self.healthy:
+                self._callbacks[key] = (uid, callback)
+                return
+        callback()
+
+    def _update(self, job, deleted=False):
+        key = f"{job.metadata.namespace}/{job.metadata.name}"
+        callback = None
+        with self._lock:
+            if deleted:
+                status = self._jobs.get(key)
+                if status and status.uid == job.metadata.uid:
+                    del self._jobs[key]
+            else:
+                status = self._jobs[key] = job_status(job)
+            event = self._waiters.get(key)
+            if event:
+                event.set()
+            uid, _ = self._callbacks.get(key, (None, None))
+            if uid == job.metadata.uid and (
+                deleted or status.succeeded or status.failed
+            ):
+                callback = self._callbacks.pop(key)[1]
+        if callback:
+            callback()
+
+    def _wake_all(self):
+        with self._lock:
+            for event in self._waiters.values():
+                event.set()
+            callbacks = [callback for _, callback in self._callbacks.values()]
+            self._callbacks = {}
+        for callback in callbacks:
+            callback()
+
+    def run(self):
+        logging.info("Starting job watcher")
+        resource_version = ""
+        while not self.shutdown:
+            try:
+                if not resource_version:
+                    # (re)seed the cache from a full list, then watch from
+                    # the version of that list
+                    res = self.client.list_job_for_all_namespaces(
+                        label_selector=JOB_LABEL_SELECTOR
+                    )
+                    with self._lock:
+                        self._jobs = {}
+                    for job in res.items:
+                        self._update(job)
+                    resource_version = res.metadata.resource_version
+                self._healthy = True
+                self._watch = watch.Watch()
+                for event in self._watch.stream(
+                    self.client.list_job_for_all_namespaces,
+                    label_selector=JOB_LABEL_SELECTOR,
+                    resource_version=resource_version,
+                    timeout_seconds=self._timeout_seconds,
+                ):
+                    operation = event.get("type")
+                    job = event.get("object")
+                    if operation == "ERROR":
+                        # most likely our resource_version is too old
+                        logging.info("Job watch returned an error, relisting")
+                        resource_version = ""
+                        break
+                    resource_version = job.metadata.resource_version
+                    self._update(job, deleted=(operation == "DELETED"))
+            except ApiException as e:
+                if e.status == 410:
+                    logging.info("Job watch resource_version expired, relisting")
+                else:
+                    logging.warning(f"Job watch failed: {e.reason}")
+                    self._degrade()
+                resource_version = ""
+            except Exception as e:
+                logging.warning("Job watch failed")
+                logging.warning(sys.exc_info()[0])
+                logging.warning(e)
+                self._degrade()
+                resource_version = ""
+        self._healthy = False
+        self._wake_all()
+        logging.info("Job watcher shut down")
+
+    def _degrade(self):
+        """
+        mark the watcher unhealthy so checks go back to polling, and hand the
+        waiting checks back to their poll loops before backing off
+        """
+        self._healthy = False
+        self._wake_all()
+        sleep(self._retry_interval)
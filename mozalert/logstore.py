@@ -0,0 +1,145 @@
+import io
+import os
+import datetime
+
+import pytz
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+LOG_STORE_LABELS = {
+    "app.kubernetes.io/managed-by": "mozalert",
+    "app.kubernetes.io/component": "check-logs",
+}
+
+
+# a ConfigMap holds at most 1MiB, leave room for the rest of the object
+CONFIGMAP_MAX_BYTES = 900 * 1024
+TRUNCATED_MARKER = "[... earlier output truncated ...]\n"
+
+
+def as_file(logs):
+    """
+    logs are handed to a store either as a string or as a binary file
+    holding the raw pod logs (see BaseCheck.new_log_capture)
+    """
+    if isinstance(logs, str):
+        return io.BytesIO(logs.encode("utf-8"))
+    logs.seek(0)
+    return logs
+
+
+def get_log_store(**kwargs):
+    """
+    build the log store configured with MOZALERT_LOG_STORE, or return None
+    if the logs of a check run are only kept in its status
+    """
+    kind = kwargs.get("kind", os.environ.get("MOZALERT_LOG_STORE", ""))
+    if not kind:
+        return None
+    if kind == "file":
+        return FileLogStore(**kwargs)
+    if kind == "configmap":
+        return ConfigMapLogStore(**kwargs)
+    raise ValueError(f"Unknown log store {kind}")
+
+
+class FileLogStore:
+    """
+    appends the logs of every check run to a file per check under path,
+    <path>/<namespace>/<name>.log, each run preceded by a header line. Once
+    a file grows past max_bytes it is rotated to <name>.log.1.
+    """
+
+    def __init__(self, **kwargs):
+        self.path = kwargs.get(
+            "path", os.environ.get("MOZALERT_LOG_STORE_PATH", "/var/lib/mozalert/logs")
+        )
+        self._max_bytes = int(
+            kwargs.get(
+                "max_bytes", os.environ.get("MOZALERT_LOG_STORE_MAX_BYTES", 10485760)
+            )
+        )
+
+    def write(self, namespace, name, logs, **kwargs):
+        """
+        store the logs of a run and return the logsRef for the check status
+        """
+        directory = os.path.join(self.path, namespace)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.log")
+        try:
+            if os.path.getsize(path) > self._max_bytes:
+                os.replace(path, f"{path}.1")
+        except OSError:
+            pass
+        timestamp = kwargs.get("timestamp") or datetime.datetime.now(pytz.utc)
+        status = kwargs.get("status", "")
+        with open(path, "ab") as f:
+            header = f"--- {str(timestamp).split('.')[0]} {status} ---\n"
+            f.write(header.encode("utf-8"))
+            logs = as_file(logs)
+            last = b""
+            for chunk in iter(lambda: logs.read(65536), b""):
+                f.write(chunk)
+                last = chunk
+            if last and not last.endswith(b"\n"):
+                f.write(b"\n")
+        return f"file://{path}"
+
+
+class ConfigMapLogStore:
+    """
+    keeps the logs of the last run of each check in a ConfigMap named
+    mozalert-logs-<name> next to the check. The ConfigMap is owned by the
+    check object, so it's garbage collected along with it. ConfigMaps are
+    limited in size, so only the last max_bytes of the logs are kept.
+    """
+
+    def __init__(self, **kwargs):
+        self.client = kwargs.get("client", None) or client.CoreV1Api()
+        self._max_bytes = int(kwargs.get("max_bytes", CONFIGMAP_MAX_BYTES))
+        self._domain = kwargs.get("domain", "crd.k8s.afrank.local")
+        self._version = kwargs.get("version", "v1")
+
+    def write(self, namespace, name, logs, **kwargs):
+        """
+        store the logs of a run and return the logsRef for the check status
+        """
+        cm_name = f"mozalert-logs-{name}"
+        logs = as_file(logs)
+        logs.seek(0, os.SEEK_END)
+        size = logs.tell()
+        logs.seek(max(size - self._max_bytes, 0))
+        text = logs.read().decode("utf-8", errors="replace")
+        if size > self._max_bytes:
+            text = TRUNCATED_MARKER + text
+        timestamp = kwargs.get("timestamp") or datetime.datetime.now(pytz.utc)
+        owner_references = None
+        if kwargs.get("uid"):
+            owner_references = [
+                client.V1OwnerReference(
+                    api_version=f"{self._domain}/{self._version}",
+                    kind="Check",
+                    name=name,
+                    uid=kwargs.get("uid"),
+                )
+            ]
+        body = client.V1ConfigMap(
+            metadata=client.V1ObjectMeta(
+                name=cm_name,
+                labels=LOG_STORE_LABELS,
+                owner_references=owner_references,
+            ),
+            data={
+                "logs": text,
+                "status": kwargs.get("status", ""),
+                "lastCheckTimestamp": str(timestamp).split(".")[0],
+            },
+        )
+        try:
+            self.client.replace_namespaced_config_map(cm_name, namespace, body)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            self.client.create_namespaced_config_map(namespace, body)
+        return f"configmap://{namespace}/{cm_name}"
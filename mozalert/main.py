@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
+import os
 import sys
 import logging
+import argparse
 
 from mozalert.controller import Controller
 
@@ -11,6 +13,23 @@ logging.basicConfig(
 
 
 def main():
+    parser = argparse.ArgumentParser(description="mozalert controller")
+    parser.add_argument(
+        "--engine",
+        choices=["threaded", "asyncio"],
+        default=os.environ.get("MOZALERT_ENGINE", "threaded"),
+        help="run checks on threads (the default) or as coroutines on one event loop",
+    )
+    args = parser.parse_args()
+
+    if args.engine == "asyncio":
+        try:
+            from mozalert.aio.controller import AsyncController
+        except ImportError as e:
+            logging.error(f"The asyncio engine requires kubernetes_asyncio: {e}")
+            return 1
+        return AsyncController().run()
+
     sys.exit(Controller().run())
 
 
@@ -1,25 +1,77 @@
 import os
-from time import sleep
+import sys
+from time import monotonic
 import logging
 
 import threading
 import queue
 
-from prometheus_client import CollectorRegistry, Gauge, push_to_gateway, Counter
+from prometheus_client import (
+    CollectorRegistry,
+    Gauge,
+    push_to_gateway,
+    Counter,
+    Histogram,
+)
+
+# the label set of most check metrics
+CHECK_LABELS = ("name", "namespace", "status", "escalated")
+# the labels which only identify the check, for metrics like histograms
+# which would multiply if they were also labelled by status
+CHECK_NAME_LABELS = CHECK_LABELS[:2]
+
+# the key of the sample which removes a check's series, see forget
+FORGET = "forget"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STARTUP_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# timings of the controller's hot paths. These aren't labelled by check, so
+# they stay cheap no matter how many checks there are.
+TIMINGS = {
+    "mozalert_schedule_lag_seconds": (
+        "how late check runs start, compared to their next_check",
+        LAG_BUCKETS,
+    ),
+    "mozalert_job_create_seconds": (
+        "latency of creating a check Job",
+        LATENCY_BUCKETS,
+    ),
+    "mozalert_job_start_seconds": (
+        "time from creating a check Job until its container was running",
+        STARTUP_BUCKETS,
+    ),
+    "mozalert_status_patch_seconds": (
+        "latency of check status patches",
+        LATENCY_BUCKETS,
+    ),
+    "mozalert_event_processing_seconds": (
+        "time spent handling each check event",
+        LATENCY_BUCKETS,
+    ),
+    "mozalert_escalation_send_seconds": (
+        "latency of sending an escalation",
+        LATENCY_BUCKETS,
+    ),
+}
 
 
 class MetricsQueueItem:
-    def __init__(self, key, **kwargs):
-        self._key = key
-        self._name = kwargs.get("name", None)
-        self._namespace = kwargs.get("namespace", None)
-        self._status = kwargs.get("status", None)
-        self._escalated = kwargs.get("escalated", None)
-        self._value = kwargs.get("value", None)
+    """
+    one metrics sample. Every check run queues several of these, so they
+    are kept small with __slots__.
+    """
 
-    @property
-    def key(self):
-        return self._key
+    __slots__ = ("key", "name", "namespace", "status", "escalated", "value")
+
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.name = kwargs.get("name", None)
+        self.namespace = kwargs.get("namespace", None)
+        self.status = kwargs.get("status", None)
+        self.escalated = kwargs.get("escalated", None)
+        self.value = kwargs.get("value", None)
 
     @property
     def labels(self):
@@ -30,33 +82,90 @@ class MetricsQueueItem:
             "escalated": self.escalated,
         }
 
-    @property
-    def name(self):
-        return self._name
 
-    @property
-    def namespace(self):
-        return self._namespace
+def observe(q, key, seconds):
+    """
+    queue a sample for one of the TIMINGS histograms, if there's a queue
+    """
+    if q is not None:
+        q.put(MetricsQueueItem(key, value=seconds))
 
-    @property
-    def status(self):
-        return self._status
 
-    @property
-    def escalated(self):
-        return self._escalated
+def forget(q, name, namespace):
+    """
+    queue the removal of every series of a deleted check, if there's a
+    queue, so the registry doesn't keep exporting it
+    """
+    if q is not None:
+        q.put(MetricsQueueItem(FORGET, name=name, namespace=namespace))
+
+
+class MetricsQueue(queue.Queue):
+    """
+    a bounded queue for metrics samples. put never blocks the check which
+    reports the sample: when the queue is full the sample is dropped and
+    counted instead, since a lost sample is better than a stalled check.
+
+    forget samples are the exception, and are queued even past the bound:
+    there's one per deleted check, and losing one would leave the check's
+    series in the registry (and the MetricsThread's cache) for good.
+    """
+
+    def __init__(self, maxsize=None):
+        if maxsize is None:
+            maxsize = int(os.environ.get("MOZALERT_METRICS_QUEUE_SIZE", 10000))
+        super().__init__(maxsize)
+        self._dropped = 0
 
     @property
-    def value(self):
-        return self._value
+    def dropped(self):
+        return self._dropped
 
-    @value.setter
-    def value(self, value):
-        self._value = value
+    def put(self, item, block=False, timeout=None):
+        if getattr(item, "key", None) == FORGET:
+            with self.not_full:
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+            return
+        try:
+            super().put(item, block=block, timeout=timeout)
+        except queue.Full:
+            with self.mutex:
+                self._dropped += 1
+                dropped = self._dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logging.warning(
+                    f"Metrics queue is full, {dropped} samples dropped so far"
+                )
+
+    def drain(self, timeout=None):
+        """
+        wait up to timeout for a sample, then remove and return everything
+        queued. The samples are marked done as they are removed.
+        """
+        with self.not_empty:
+            if not self._qsize():
+                self.not_empty.wait(timeout)
+            items = [self._get() for _ in range(self._qsize())]
+            if items:
+                self.unfinished_tasks -= len(items)
+                if not self.unfinished_tasks:
+                    self.all_tasks_done.notify_all()
+                self.not_full.notify_all()
+            return items
 
 
 class MetricsThread(threading.Thread):
-    def __init__(self, q, prometheus_gateway=None):
+    """
+    the MetricsThread consumes the metrics queue and keeps the prometheus
+    registry up to date. The registry is scraped from /metrics on the
+    service endpoint; if a pushgateway is configured the registry is also
+    pushed to it, at most once every push_interval seconds and only when
+    something changed.
+    """
+
+    def __init__(self, q, prometheus_gateway=None, **kwargs):
         super().__init__()
         self._shutdown = False
         self.q = q
@@ -65,76 +174,175 @@ class MetricsThread(threading.Thread):
         if not self.prometheus_gateway:
             self.prometheus_gateway = os.environ.get("PROMETHEUS_GATEWAY", None)
 
-    @property
-    def shutdown(self):
-        return self._shutdown
-
-    def terminate(self):
-        self._shutdown = True
-
-    def run(self):
-        """
-        Start the metrics queue subscriber which sends metrics to prometheus
+        self._push_interval = float(
+            kwargs.get(
+                "push_interval",
+                os.environ.get("MOZALERT_METRICS_PUSH_INTERVAL", 15),
+            )
+        )
+        self._last_push = 0
+        self._dirty = False
+        # (key, name, namespace, status, escalated) -> (child, metric type)
+        self._children = {}
+        self._dropped = 0
 
-        Available metrics are defined here.
-        """
-
-        registry = CollectorRegistry()
+        self.registry = CollectorRegistry()
         # all available metrics
-        metrics = {
+        self.metrics = {
             "mozalert_check_runtime": Gauge(
                 "mozalert_check_runtime",
                 "check runtimes",
-                ("name", "namespace", "status", "escalated"),
-                registry=registry,
+                CHECK_LABELS,
+                registry=self.registry,
             ),
             "mozalert_check_OK_count": Counter(
                 "mozalert_check_OK_count",
                 "mozalert check OK count",
-                ("name", "namespace", "status", "escalated"),
-                registry=registry,
+                CHECK_LABELS,
+                registry=self.registry,
             ),
             "mozalert_check_CRITICAL_count": Counter(
                 "mozalert_check_CRITICAL_count",
                 "mozalert check CRITICAL count",
-                ("name", "namespace", "status", "escalated"),
-                registry=registry,
+                CHECK_LABELS,
+                registry=self.registry,
             ),
             "mozalert_check_escalations": Gauge(
                 "mozalert_check_escalations",
                 "mozalert check escalations",
-                ("name", "namespace", "status", "escalated"),
-                registry=registry,
+                CHECK_LABELS,
+                registry=self.registry,
             ),
         }
 
-        while not self.shutdown:
-            try:
-                metric = self.q.get(timeout=3)
-            except queue.Empty:
-                sleep(1)
-                continue
+        self.metrics["mozalert_probe_latency_seconds"] = Histogram(
+            "mozalert_probe_latency_seconds",
+            "latency of in-process http and tcp checks",
+            CHECK_NAME_LABELS,
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        # metrics not listed here are labelled with CHECK_LABELS
+        self._labelnames = {"mozalert_probe_latency_seconds": CHECK_NAME_LABELS}
 
-            if type(metric) != MetricsQueueItem:
-                logging.info("Got a weird queue entry, skipping")
-                self.q.task_done()
-                continue
+        for key, (documentation, buckets) in TIMINGS.items():
+            self.metrics[key] = Histogram(
+                key, documentation, buckets=buckets, registry=self.registry
+            )
+            self._labelnames[key] = ()
 
-            if metric.key not in metrics:
-                logging.info(f"{metric.key} not in available metrics, discarding")
-                self.q.task_done()
-                continue
+        # health of the metrics path itself
+        self.queue_depth = Gauge(
+            "mozalert_metrics_queue_depth",
+            "metrics samples waiting to be processed",
+            registry=self.registry,
+        )
+        self.queue_depth.set_function(self.q.qsize)
+        self.dropped = Counter(
+            "mozalert_metrics_dropped",
+            "metrics samples dropped because the queue was full",
+            registry=self.registry,
+        )
 
-            prom = metrics[metric.key]
+    @property
+    def shutdown(self):
+        return self._shutdown
 
-            if metric.value is not None and type(prom) == Gauge:
-                prom.labels(**metric.labels).set(metric.value)
-            else:
-                prom.labels(**metric.labels).inc()
+    def terminate(self):
+        self._shutdown = True
 
-            if self.prometheus_gateway:
-                logging.debug("pushing metric to prometheus")
-                push_to_gateway(
-                    self.prometheus_gateway, job=__name__, registry=registry
+    def push(self, force=False):
+        """
+        push the registry to the pushgateway if it changed and push_interval
+        has passed since the last push
+        """
+        if not self.prometheus_gateway or not self._dirty:
+            return
+        if not force and monotonic() - self._last_push < self._push_interval:
+            return
+        logging.debug("pushing metrics to prometheus")
+        try:
+            push_to_gateway(
+                self.prometheus_gateway, job=__name__, registry=self.registry
+            )
+        except Exception as e:
+            logging.info(sys.exc_info()[0])
+            logging.info(e)
+        # on failure the next push is still a push_interval away, so a down
+        # gateway isn't hammered
+        self._last_push = monotonic()
+        self._dirty = False
+
+    def run(self):
+        """
+        Start the metrics queue subscriber which updates the registry. All
+        queued samples are applied in one batch per wakeup.
+        """
+        while not self.shutdown:
+            batch = self.q.drain(timeout=1)
+            if batch:
+                self.apply(batch)
+                self._dirty = True
+            dropped = self.q.dropped
+            if dropped > self._dropped:
+                self.dropped.inc(dropped - self._dropped)
+                self._dropped = dropped
+            self.push()
+        self.push(force=True)
+
+    def forget(self, name, namespace):
+        """
+        remove the series of one check from the registry and the cache
+        """
+        for key in [k for k in self._children if k[1:3] == (name, namespace)]:
+            self._children.pop(key)
+            labelnames = self._labelnames.get(key[0], CHECK_LABELS)
+            labels = dict(zip(CHECK_LABELS, key[1:]))
+            try:
+                self.metrics[key[0]].remove(*[labels[l] for l in labelnames])
+            except KeyError:
+                pass
+
+    def apply(self, batch):
+        children = self._children
+        for metric in batch:
+            try:
+                if metric.key == FORGET:
+                    self.forget(metric.name, metric.namespace)
+                    continue
+                key = (
+                    metric.key,
+                    metric.name,
+                    metric.namespace,
+                    metric.status,
+                    metric.escalated,
                 )
-            self.q.task_done()
+                child = children.get(key)
+                if child is None:
+                    prom = self.metrics.get(metric.key)
+                    if prom is None:
+                        logging.info(
+                            f"{metric.key} not in available metrics, discarding"
+                        )
+                        continue
+                    # bind the labels once per series rather than per sample
+                    labelnames = self._labelnames.get(metric.key, CHECK_LABELS)
+                    if labelnames:
+                        prom_child = prom.labels(
+                            *[getattr(metric, l) for l in labelnames]
+                        )
+                    else:
+                        prom_child = prom
+                    child = children[key] = (prom_child, type(prom))
+                prom, kind = child
+                if metric.value is not None and kind == Gauge:
+                    prom.set(metric.value)
+                elif kind == Histogram:
+                    prom.observe(metric.value)
+                else:
+                    prom.inc()
+            except Exception as e:
+                # one bad sample mustn't take the rest of the batch with it
+                logging.info("Got a weird queue entry, skipping")
+                logging.info(sys.exc_info()[0])
+                logging.info(e)
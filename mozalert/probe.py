@@ -0,0 +1,175 @@
+import sys
+import socket
+import logging
+import datetime
+from time import monotonic
+from urllib.parse import urlsplit
+
+import pytz
+
+from mozalert.status import EnumStatus, EnumState
+from mozalert.check import Check
+from mozalert.metrics import MetricsQueueItem
+from mozalert.utils.http import get_session
+
+# check types which are run in the controller instead of in a pod
+PROBE_TYPES = ("http", "tcp")
+
+# bodies up to this size are read off so their connection can be reused
+MAX_DRAIN_BYTES = 1024 * 1024
+
+
+def tcp_target(url):
+    """
+    the (host, port) of a tcp check_url, given as host:port or
+    tcp://host:port
+    """
+    if "://" not in url:
+        url = f"tcp://{url}"
+    parts = urlsplit(url)
+    if not parts.hostname or not parts.port:
+        raise ValueError(f"tcp checks need a host:port, not {url}")
+    return parts.hostname, parts.port
+
+
+def http_ok(code, expected_status=None):
+    if expected_status:
+        return code == int(expected_status)
+    return code < 400
+
+
+def drain(resp, limit=MAX_DRAIN_BYTES):
+    """
+    read off the rest of a streamed response and close it. A connection only
+    goes back to the session's pool once its body has been read, so a small
+    body is read and thrown away; past limit the connection is dropped
+    instead of downloading the whole thing.
+    """
+    read = 0
+    try:
+        for chunk in resp.iter_content(65536):
+            read += len(chunk)
+            if read > limit:
+                break
+    finally:
+        resp.close()
+
+
+def http_probe(url, timeout=None, expected_status=None):
+    """
+    GET url on the shared session for its host, returning a short
+    description of the result or raising if the check failed
+    """
+    connect_timeout = min(timeout, 5) if timeout else 5
+    resp = get_session(url).get(url, timeout=(connect_timeout, timeout), stream=True)
+    # only the status matters, the body is read off and thrown away
+    drain(resp)
+    if not http_ok(resp.status_code, expected_status):
+        raise Exception(f"unexpected status {resp.status_code}")
+    return f"status {resp.status_code}"
+
+
+def report_probe(check, ok, result, latency):
+    """
+    apply the result of a probe to the check status, metrics and log store
+    """
+    record_probe(check, ok, result, latency)
+    check.store_logs()
+    finish_probe(check)
+
+
+def record_probe(check, ok, result, latency):
+    """
+    the first half of report_probe, up to storing the logs. This is shared
+    by the threaded and asyncio probe checks; the latter store the logs off
+    the loop.
+    """
+    check.status.status = EnumStatus.OK if ok else EnumStatus.CRITICAL
+    check._runtime = datetime.timedelta(seconds=latency)
+    check.status.logs = (
+        f"{check.config.check_type} {check.config.check_url}: "
+        f"{result} in {latency:.3f} seconds\n"
+    )
+    if check.metrics_queue:
+        check.metrics_queue.put(
+            MetricsQueueItem(
+                "mozalert_probe_latency_seconds",
+                name=check.config.name,
+                namespace=check.config.namespace,
+                value=latency,
+            )
+        )
+    logging.info(
+        f"Probe finished in {latency:.3f} seconds with status {check.status.status.name}"
+    )
+
+
+def finish_probe(check):
+    """
+    the second half of report_probe, once the logs are stored
+    """
+    check.status.state = EnumState.IDLE
+    check.status.last_check = pytz.utc.localize(datetime.datetime.utcnow())
+    check.set_crd_status()
+
+
+class ProbeCheck(Check):
+    """
+    the ProbeCheck runs a check of type http or tcp directly in the
+    controller, with no pod at all:
+    * http: GET check_url on the shared session for its host, so the
+      connections are reused between runs. The check passes on a status
+      below 400, or on expected_status if one is set.
+    * tcp: open a connection to the host:port in check_url.
+
+    Results go through the same status, escalation and metrics paths as
+    every other check, and the latency of each probe is recorded in the
+    mozalert_probe_latency_seconds histogram.
+    """
+
+    @property
+    def batched(self):
+        return False
+
+    @property
+    def pooled(self):
+        return False
+
+    @property
+    def admitted(self):
+        # there's no pod to make room for
+        return False
+
+    def run_job(self):
+        self.status.state = EnumState.RUNNING
+        self.set_crd_status()
+
+        start = monotonic()
+        try:
+            result = self.probe()
+            ok = True
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            result = f"{type(e).__name__}: {e}"
+            ok = False
+        report_probe(self, ok, result, monotonic() - start)
+
+    def probe(self):
+        """
+        run the probe, returning a short description of the result or
+        raising if the check failed
+        """
+        timeout = self.config.timeout or None
+        if self.config.check_type == "tcp":
+            with socket.create_connection(
+                tcp_target(self.config.check_url), timeout=timeout
+            ):
+                return "connected"
+        return http_probe(self.config.check_url, timeout, self.config.expected_status)
+
+    def get_job_logs(self):
+        pass
+
+    def delete_job(self):
+        pass
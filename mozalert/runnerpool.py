@@ -0,0 +1,350 @@
+import os
+import sys
+import copy
+import json
+import socket
+import hashlib
+import logging
+import threading
+from time import monotonic
+from types import SimpleNamespace
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from kubernetes.stream import stream
+
+RUNNER_LABELS = {
+    "app.kubernetes.io/managed-by": "mozalert",
+    "app.kubernetes.io/component": "runner",
+}
+RUNNER_LABEL_SELECTOR = ",".join(f"{k}={v}" for k, v in RUNNER_LABELS.items())
+
+# the controller replica a runner belongs to
+REPLICA_LABEL = "app.kubernetes.io/instance"
+
+DEFAULT_ENTRYPOINT = "/app/entrypoint.sh"
+
+# the name of the container in every runner pod. Check pod specs name their
+# container after the check, which would otherwise give each check a runner
+RUNNER_CONTAINER = "runner"
+
+# keeps the runner container alive between check runs
+KEEPALIVE_COMMAND = [
+    "/bin/sh",
+    "-c",
+    "trap 'exit 0' TERM; while :; do sleep 3600 & wait $!; done",
+]
+
+
+def runner_spec(spec):
+    """
+    the pod spec of the runner for a check pod spec: the same container and
+    volumes, but idling instead of running the check. The check arguments
+    are passed on every exec instead.
+    """
+    spec = copy.deepcopy(spec)
+    container = spec["containers"][0]
+    container.pop("args", None)
+    container["name"] = RUNNER_CONTAINER
+    container["command"] = KEEPALIVE_COMMAND
+    spec["restart_policy"] = "Always"
+    return spec
+
+
+def runner_name(namespace, spec, identity=None):
+    """
+    checks whose pods only differ in their arguments (and container name)
+    share runners. Each controller replica (identity) has runners of its
+    own, since the runners are only locked within one process.
+    """
+    key = json.dumps([namespace, runner_spec(spec), identity], sort_keys=True)
+    return f"mozalert-runner-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}"
+
+
+class RunnerPool(threading.Thread):
+    """
+    the RunnerPool keeps long-lived runner pods for checks which set
+    execution: pool, and runs each check by exec'ing its entrypoint in the
+    runner instead of creating a Job. That skips pod scheduling and
+    container start on every run, which is most of the runtime of short
+    browser checks.
+
+    A runner is created for each distinct check pod spec (ignoring the
+    arguments) the first time it's needed, and deleted once it has been idle
+    for idle_timeout seconds. Runners are named after their spec and the
+    controller replica (identity) which runs them, so they're picked up
+    again after a restart of that replica, and no two replicas ever use
+    the same runner.
+
+    A runner runs one check at a time, so checks don't trip over each other
+    in the container. When checks sharing a spec come due together more
+    runners are started for it, up to runners_per_spec; past that a run
+    waits for a runner to be free, holding its scheduler worker and
+    admission slot.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self._shutdown = False
+        # stream() swaps out the api client's transport while it connects,
+        # so the pool has a client of its own which nothing else uses
+        self.client = kwargs.get("client", None) or client.CoreV1Api(client.ApiClient())
+        # the replica's name, as in ShardCoordinator
+        self.identity = kwargs.get("identity", None) or os.environ.get(
+            "POD_NAME", socket.gethostname()
+        )
+        self._idle_timeout = float(
+            kwargs.get(
+                "idle_timeout", os.environ.get("MOZALERT_RUNNER_IDLE_TIMEOUT", 600)
+            )
+        )
+        self._startup_timeout = float(
+            kwargs.get(
+                "startup_timeout",
+                os.environ.get("MOZALERT_RUNNER_STARTUP_TIMEOUT", 300),
+            )
+        )
+        self._runners_per_spec = int(
+            kwargs.get(
+                "runners_per_spec", os.environ.get("MOZALERT_RUNNERS_PER_SPEC", 4)
+            )
+        )
+        self._poll_interval = float(kwargs.get("poll_interval", 1))
+        self._lock = threading.Lock()
+        self._stream_lock = threading.Lock()
+        # (namespace, name) -> SimpleNamespace(container, last_used, lock)
+        self._runners = {}
+        self._stop = threading.Event()
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def runners(self):
+        with self._lock:
+            return list(self._runners)
+
+    def terminate(self):
+        logging.info("Stopping runner pool")
+        self._shutdown = True
+        self._stop.set()
+
+    def runner(self, namespace, name, spec):
+        key = (namespace, name)
+        with self._lock:
+            if key not in self._runners:
+                self._runners[key] = SimpleNamespace(
+                    container=RUNNER_CONTAINER,
+                    spec=None,
+                    ready=False,
+                    last_used=monotonic(),
+                    lock=threading.Lock(),
+                )
+            runner = self._runners[key]
+            if runner.spec is None:
+                # new, or adopted from a previous controller
+                runner.spec = spec
+            return key, runner
+
+    def acquire(self, namespace, spec):
+        """
+        take a free runner for spec, starting another one if they're all
+        busy and there's room, or else wait for the first one
+        """
+        name = runner_name(namespace, spec, self.identity)
+        while True:
+            for i in range(max(self._runners_per_spec, 1)):
+                key, runner = self.runner(namespace, f"{name}-{i}", spec)
+                if self.claim(key, runner, blocking=False):
+                    return key, runner
+            key, runner = self.runner(namespace, f"{name}-0", spec)
+            logging.debug(f"Every runner for {name} is busy, waiting")
+            if self.claim(key, runner):
+                return key, runner
+
+    def claim(self, key, runner, blocking=True):
+        """
+        lock runner for a check. A runner which reap or forget dropped while
+        the lock was being taken has lost its pod, so it's let go again
+        rather than exec'd in; acquire then picks up (or starts) a live one.
+        """
+        if not runner.lock.acquire(blocking=blocking):
+            return False
+        with self._lock:
+            if self._runners.get(key) is runner:
+                return True
+        runner.lock.release()
+        return False
+
+    def forget(self, key, delete=True):
+        """
+        drop a runner, deleting its pod unless it's already gone
+        """
+        with self._lock:
+            runner = self._runners.pop(key, None)
+            if runner is not None:
+                runner.ready = False
+        if not delete:
+            return
+        namespace, name = key
+        try:
+            self.client.delete_namespaced_pod(name, namespace, grace_period_seconds=0)
+        except ApiException as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+
+    def start_runner(self, key, runner):
+        """
+        create the runner pod (or pick up the one left by a previous
+        controller) and wait for it to be running
+        """
+        namespace, name = key
+        pod = client.V1Pod(
+            api_version="v1",
+            kind="Pod",
+            metadata=client.V1ObjectMeta(name=name, labels=self.labels),
+            spec=client.V1PodSpec(**runner_spec(runner.spec)),
+        )
+        try:
+            self.client.create_namespaced_pod(namespace, pod)
+            logging.info(f"Created runner {namespace}/{name}")
+        except ApiException as e:
+            if e.status != 409:
+                raise
+        deadline = monotonic() + self._startup_timeout
+        while monotonic() < deadline:
+            res = self.client.read_namespaced_pod(name, namespace)
+            phase = res.status.phase if res.status else None
+            if phase == "Running":
+                runner.ready = True
+                return
+            if phase in ["Succeeded", "Failed"]:
+                break
+            if self._stop.wait(self._poll_interval):
+                break
+        raise Exception(f"Runner {namespace}/{name} did not start")
+
+    @property
+    def labels(self):
+        return dict(RUNNER_LABELS, **{REPLICA_LABEL: self.identity})
+
+    def run(self):
+        logging.info("Runner pool running")
+        self.adopt()
+        while not self._stop.wait(30):
+            self.reap()
+        logging.info("Runner pool shut down")
+
+    def run_check(self, namespace, spec, entrypoint, logs, timeout=0):
+        """
+        run a check in its runner, feeding the output into logs (a
+        LogBuffer). Returns a SimpleNamespace of returncode, runtime (in
+        seconds) and timed_out.
+        """
+        key, runner = self.acquire(namespace, spec)
+        try:
+            if not runner.ready:
+                try:
+                    self.start_runner(key, runner)
+                except Exception:
+                    self.forget(key)
+                    raise
+            command = [entrypoint or DEFAULT_ENTRYPOINT] + list(
+                spec["containers"][0].get("args", None) or []
+            )
+            try:
+                result = self.exec(key, runner.container, command, logs, timeout)
+            except Exception:
+                # most likely the runner went away; start a new one next time
+                self.forget(key)
+                raise
+            runner.last_used = monotonic()
+            if result.timed_out:
+                # the check may still be running in there
+                self.forget(key)
+            return result
+        finally:
+            runner.lock.release()
+
+    def exec(self, key, container, command, logs, timeout=0):
+        namespace, name = key
+        start = monotonic()
+        with self._stream_lock:
+            resp = stream(
+                self.client.connect_get_namespaced_pod_exec,
+                name,
+                namespace,
+                container=container,
+                command=command,
+                stderr=True,
+                stdin=False,
+                stdout=True,
+                tty=False,
+                _preload_content=False,
+            )
+        timed_out = False
+        try:
+            while resp.is_open():
+                resp.update(timeout=1)
+                if resp.peek_stdout():
+                    logs.feed(resp.read_stdout())
+                if resp.peek_stderr():
+                    logs.feed(resp.read_stderr())
+                if timeout and monotonic() - start > timeout:
+                    timed_out = True
+                    break
+        finally:
+            resp.close()
+        return SimpleNamespace(
+            returncode=None if timed_out else resp.returncode,
+            runtime=monotonic() - start,
+            timed_out=timed_out,
+        )
+
+    def adopt(self):
+        """
+        track the runners left behind by a previous run of this replica, so
+        they're reaped if no check claims them. The runners of the other
+        replicas are left to them.
+        """
+        try:
+            pods = self.client.list_pod_for_all_namespaces(
+                label_selector=f"{RUNNER_LABEL_SELECTOR},{REPLICA_LABEL}={self.identity}"
+            )
+        except Exception as e:
+            logging.info(sys.exc_info()[0])
+            logging.info(e)
+            return
+        with self._lock:
+            for pod in pods.items:
+                key = (pod.metadata.namespace, pod.metadata.name)
+                if key not in self._runners:
+                    self._runners[key] = SimpleNamespace(
+                        container=RUNNER_CONTAINER,
+                        spec=None,
+                        ready=False,
+                        last_used=monotonic(),
+                        lock=threading.Lock(),
+                    )
+
+    def reap(self):
+        """
+        delete the runners which have been idle for idle_timeout
+        """
+        now = monotonic()
+        with self._lock:
+            idle = [
+                (key, runner)
+                for key, runner in self._runners.items()
+                if now - runner.last_used > self._idle_timeout
+            ]
+        for key, runner in idle:
+            # skip runners a check has just picked up, or already dropped
+            if not self.claim(key, runner, blocking=False):
+                continue
+            try:
+                logging.info(f"Deleting idle runner {key[0]}/{key[1]}")
+                self.forget(key)
+            finally:
+                runner.lock.release()
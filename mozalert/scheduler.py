@@ -0,0 +1,274 @@
+import os
+import sys
+import logging
+import threading
+import heapq
+import hashlib
+import itertools
+import random
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor
+
+from mozalert.utils.ratelimit import TokenBucket
+
+
+def phase(key, window):
+    """
+    a deterministic offset in [0, window) for key, so things keyed
+    differently are spread evenly over the window, and the same key always
+    lands in the same place
+    """
+    if window <= 0:
+        return 0
+    digest = hashlib.md5(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 * window
+
+
+class ScheduledTask:
+    """
+    a handle to a function scheduled on the Scheduler. It provides the parts
+    of the threading.Timer interface the checks rely on (cancel and join) so a
+    task can be used anywhere a Timer was used before.
+    """
+
+    def __init__(self, deadline, function, name=None, rate_limited=True):
+        self._deadline = deadline
+        self.rate_limited = rate_limited
+        self._function = function
+        self._name = name
+        self._lock = threading.Lock()
+        self._started = False
+        self._cancelled = False
+        self._finished = threading.Event()
+
+    @property
+    def deadline(self):
+        return self._deadline
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def cancel(self):
+        """
+        stop the task from running if it hasn't started yet. Like
+        threading.Timer, a task that is already running is not interrupted.
+        Returns True if this call is what kept the task from running.
+        """
+        with self._lock:
+            if self._cancelled or self._started:
+                self._cancelled = True
+                return False
+            self._cancelled = True
+            self._finished.set()
+            return True
+
+    def join(self, timeout=None):
+        """
+        wait until the task has either run to completion or been cancelled
+        """
+        return self._finished.wait(timeout)
+
+    def run(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._started = True
+        try:
+            self._function()
+        finally:
+            self._finished.set()
+
+
+class Scheduler(threading.Thread):
+    """
+    the Scheduler replaces a threading.Timer per check with a single thread
+    which keeps every pending task in a min-heap keyed by its deadline. When
+    a task comes due it is handed off to a bounded pool of worker threads, so
+    the number of threads stays constant no matter how many checks exist.
+
+    To keep checks from starting in lockstep:
+    * jittered(delay) adds a random extra of up to jitter (a fraction of
+      the delay), capped at max_jitter seconds, which checks use for their
+      first run
+    * tasks are started at no more than start_rate per second (with bursts
+      of start_burst); a task which comes due while the limit is hit waits
+      its turn. Tasks which aren't rate_limited (e.g. job polls) are kept
+      in a heap of their own, so they're never held up behind a throttled
+      task.
+
+    reserved workers are added on top of workers, for tasks which are
+    bounded elsewhere (e.g. by the AdmissionController) and shouldn't be
+    bounded by the pool as well.
+    """
+
+    def __init__(self, workers=None, **kwargs):
+        super().__init__()
+        self._shutdown = False
+        self._workers = int(
+            workers or os.environ.get("MOZALERT_SCHEDULER_WORKERS", 64)
+        ) + int(kwargs.get("reserved", 0))
+        self._jitter = float(
+            kwargs.get("jitter", os.environ.get("MOZALERT_SCHEDULE_JITTER", 0.1))
+        )
+        self._max_jitter = float(
+            kwargs.get("max_jitter", os.environ.get("MOZALERT_SCHEDULE_MAX_JITTER", 30))
+        )
+        self._bucket = TokenBucket(
+            float(kwargs.get("start_rate", os.environ.get("MOZALERT_START_RATE", 200))),
+            float(
+                kwargs.get("start_burst", os.environ.get("MOZALERT_START_BURST", 400))
+            ),
+        )
+        self._heap = []
+        # the tasks which aren't rate_limited
+        self._unlimited = []
+        # tasks handed to the pool which haven't started on a worker yet
+        self._dispatched = set()
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self._workers, thread_name_prefix="check-worker"
+        )
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._heap) + len(self._unlimited)
+
+    @property
+    def lag(self):
+        """
+        how overdue the most overdue task which hasn't started yet is, in
+        seconds. This stays near 0 while the workers keep up.
+        """
+        with self._cond:
+            deadlines = [task.deadline for task in self._dispatched]
+            for heap in [self._heap, self._unlimited]:
+                if heap:
+                    deadlines.append(heap[0][0])
+        if not deadlines:
+            return 0
+        return max(monotonic() - min(deadlines), 0)
+
+    def jittered(self, delay):
+        """
+        delay plus a random extra of up to jitter * delay (at most
+        max_jitter seconds)
+        """
+        delay = max(float(delay), 0)
+        return delay + random.uniform(0, min(delay * self._jitter, self._max_jitter))
+
+    def schedule(self, delay, function, name=None, rate_limited=True):
+        """
+        run function after delay seconds on the worker pool and return a
+        ScheduledTask handle for it. Tasks which aren't rate_limited don't
+        count against the start rate.
+        """
+        task = ScheduledTask(
+            monotonic() + max(float(delay), 0), function, name, rate_limited
+        )
+        with self._cond:
+            heap = self._heap if rate_limited else self._unlimited
+            # the counter breaks ties between equal deadlines so tasks
+            # themselves never need to be compared
+            heapq.heappush(heap, (task.deadline, next(self._counter), task))
+            if heap[0][2] is task:
+                # the new task is now the earliest of its heap, wake the scheduler
+                # up so it can recompute how long to sleep
+                self._cond.notify()
+        return task
+
+    def terminate(self):
+        logging.info("Stopping scheduler")
+        with self._cond:
+            self._shutdown = True
+            for _, _, task in self._heap + self._unlimited:
+                task.cancel()
+            self._heap = []
+            self._unlimited = []
+            self._dispatched.clear()
+            self._cond.notify()
+        self._pool.shutdown(wait=False)
+
+    def _next_task(self):
+        """
+        block until a task is due (and, if it's rate_limited, may start) and
+        pop it off its heap. returns None when the scheduler is shutting down.
+        """
+        with self._cond:
+            while not self.shutdown:
+                now = monotonic()
+                wait = None
+                if self._unlimited:
+                    wait = self._unlimited[0][0] - now
+                    if wait <= 0:
+                        return heapq.heappop(self._unlimited)[2]
+                if self._heap:
+                    delay = self._heap[0][0] - now
+                    if delay <= 0:
+                        # cancelled tasks don't use up the start rate
+                        if self._heap[0][2].cancelled or self._bucket.try_acquire():
+                            return heapq.heappop(self._heap)[2]
+                        delay = self._bucket.delay()
+                    wait = delay if wait is None else min(wait, delay)
+                self._cond.wait(wait)
+        return None
+
+    def _run_task(self, task):
+        """
+        executes on a worker thread. The worker borrows the task name for the
+        duration of the run so log lines keep showing which check they
+        belong to, as they did when every check had its own thread.
+        """
+        with self._cond:
+            self._dispatched.discard(task)
+        thread = threading.current_thread()
+        worker_name = thread.name
+        if task.name:
+            thread.name = task.name
+        try:
+            task.run()
+        except Exception as e:
+            logging.error(f"Scheduled task {task.name} failed")
+            logging.error(sys.exc_info()[0])
+            logging.error(e)
+        finally:
+            thread.name = worker_name
+
+    def run(self):
+        logging.info(f"Scheduler running with {self.workers} workers")
+        while not self.shutdown:
+            task = self._next_task()
+            if not task or task.cancelled:
+                continue
+            with self._cond:
+                self._dispatched.add(task)
+            try:
+                self._pool.submit(self._run_task, task)
+            except RuntimeError:
+                # the pool has been shut down underneath us
+                task.cancel()
+                with self._cond:
+                    self._dispatched.discard(task)
+        logging.info("Scheduler shut down")
@@ -1,30 +1,141 @@
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+import os
+import json
 import threading
 import logging
 
+from prometheus_client.exposition import choose_encoder
+
+from mozalert.utils.profile import sample_stacks, collapse, dump_threads
+
+# the longest a single /debug/profile request may sample for
+MAX_PROFILE_SECONDS = 300
+
 
 class Router(BaseHTTPRequestHandler):
     """
     a simple http catch-all for doing k8s healthchecks in support
     of the statefulset, which requires a service endpoint. Use
     self.path here to define routes.
+
+    * /metrics: the prometheus registry
+    * /healthz: the controller's health as JSON, 503 if it's unhealthy
+
+    and only when the debug routes are turned on (MOZALERT_DEBUG_ENDPOINTS),
+    since they expose the controller's internals to anyone who can reach it:
+
+    * /debug/checks: the in-memory state of every check as JSON
+    * /debug/threads: the stack of every thread
+    * /debug/profile?seconds=N: sample every thread for N seconds (default
+      10) and return the collapsed stacks, e.g. for flamegraph.pl
+    * anything else: OK
     """
 
     def do_GET(self):
+        path, _, query = self.path.partition("?")
+        self.query = parse_qs(query)
+        if path == "/metrics" and self.server.registry is not None:
+            return self.metrics()
+        if path == "/healthz" and self.server.controller is not None:
+            return self.healthz()
+        if self.server.debug and path.startswith("/debug/"):
+            return self.debug(path)
         self.send_response(200)
         self.end_headers()
         self.wfile.write(bytes("OK", "utf-8"))
         self.wfile.write(bytes("\n", "utf-8"))
         return
 
+    def debug(self, path):
+        if path == "/debug/checks" and self.server.controller is not None:
+            return self.checks()
+        if path == "/debug/threads":
+            return self.respond(200, dump_threads())
+        if path == "/debug/profile":
+            return self.profile()
+        return self.respond(404, "Not found\n")
+
+    def respond(self, code, body, content_type="text/plain; charset=utf-8"):
+        output = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def respond_json(self, code, data):
+        self.respond(
+            code, json.dumps(data, indent=2, default=str) + "\n", "application/json"
+        )
+
+    def param(self, name, default=None):
+        return self.query.get(name, [default])[0]
+
+    def metrics(self):
+        """
+        serve the controller's prometheus registry for scraping
+        """
+        encoder, content_type = choose_encoder(self.headers.get("Accept"))
+        output = encoder(self.server.registry)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def healthz(self):
+        health = self.server.controller.health()
+        self.respond_json(200 if health.get("healthy") else 503, health)
+
+    def checks(self):
+        self.respond_json(
+            200, self.server.controller.debug_checks(self.param("namespace"))
+        )
+
+    def profile(self):
+        try:
+            seconds = float(self.param("seconds", 10))
+            interval = float(self.param("interval", 0.01))
+        except ValueError:
+            return self.respond(400, "seconds and interval must be numbers\n")
+        if not 0 < seconds <= MAX_PROFILE_SECONDS or interval <= 0:
+            return self.respond(400, f"seconds must be in (0, {MAX_PROFILE_SECONDS}]\n")
+        # profiles would skew each other, so only one runs at a time
+        if not self.server.profile_lock.acquire(blocking=False):
+            return self.respond(409, "a profile is already running\n")
+        try:
+            logging.info(f"Profiling for {seconds} seconds")
+            stacks = sample_stacks(seconds, interval)
+        finally:
+            self.server.profile_lock.release()
+        self.respond(200, collapse(stacks))
+
+    def log_message(self, format, *args):
+        # scrapes and probes would otherwise log every request to stderr
+        logging.debug(format % args)
+
 
 class ServiceEndpoint(threading.Thread):
-    def __init__(self, host="127.0.0.1", port=8080):
+    def __init__(
+        self, host=None, port=8080, registry=None, controller=None, debug=None
+    ):
         # note the port you use here should match what you define
         # in your service manifest
         super().__init__()
         self._shutdown = False
+        if host is None:
+            host = os.environ.get("MOZALERT_SERVICE_HOST", "127.0.0.1")
+        if debug is None:
+            debug = os.environ.get("MOZALERT_DEBUG_ENDPOINTS", "")
         self.server = ThreadingHTTPServer((host, port), Router)
+        # the prometheus registry served on /metrics
+        self.server.registry = registry
+        # provides health() and debug_checks() for /healthz and /debug/checks
+        self.server.controller = controller
+        self.server.profile_lock = threading.Lock()
+        # /debug/* is off unless asked for
+        self.server.debug = str(debug).lower() in ["1", "true", "yes"]
 
     @property
     def shutdown(self):
@@ -0,0 +1,266 @@
+import os
+import sys
+import socket
+import logging
+import threading
+import hashlib
+import bisect
+import datetime
+from time import monotonic
+
+import pytz
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+MEMBER_LABELS = {
+    "app.kubernetes.io/managed-by": "mozalert",
+    "app.kubernetes.io/component": "controller-member",
+}
+MEMBER_LABEL_SELECTOR = ",".join(f"{k}={v}" for k, v in MEMBER_LABELS.items())
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    a consistent hash ring over the controller replicas. Every member is
+    placed on the ring vnodes times, and a key belongs to the first member
+    found clockwise from the hash of the key. When a member joins or leaves
+    only the keys in the ring segments it gains or loses move.
+    """
+
+    def __init__(self, members=(), vnodes=256):
+        self._vnodes = vnodes
+        self._members = tuple(sorted(set(members)))
+        ring = []
+        for member in self._members:
+            for i in range(vnodes):
+                ring.append((_hash(f"{member}#{i}"), member))
+        ring.sort()
+        self._hashes = [h for h, _ in ring]
+        self._owners = [m for _, m in ring]
+
+    @property
+    def members(self):
+        return self._members
+
+    def owner(self, key):
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+class ShardCoordinator(threading.Thread):
+    """
+    the ShardCoordinator lets several controller replicas split the checks
+    between them.
+
+    Each replica holds a Lease named after itself, which it renews every
+    renew_interval. The live members are the replicas whose Lease has been
+    renewed within its lease duration. Checks are assigned to members with a
+    HashRing on namespace/name, and on_change is called whenever the
+    membership changes so the controller can hand off or adopt checks.
+
+    Replicas see a membership change at different times, so a check which
+    moves here isn't run until the previous owner has stopped running it,
+    see fence.
+
+    The member with the lowest identity is the leader. The leader cleans up
+    the Leases of replicas which went away without removing their own.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self._shutdown = False
+        self.client = kwargs.get("client", None) or client.CoordinationV1Api()
+        self.identity = kwargs.get("identity", None) or os.environ.get(
+            "POD_NAME", socket.gethostname()
+        )
+        self.namespace = kwargs.get("namespace", None) or os.environ.get(
+            "POD_NAMESPACE", "default"
+        )
+        self._lease_duration = int(kwargs.get("lease_duration", 15))
+        self._renew_interval = float(kwargs.get("renew_interval", 5))
+        self._on_change = kwargs.get("on_change", None)
+        self._ring = HashRing()
+        # (previous ring, when it was replaced) of recent membership changes
+        self._handoffs = []
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._last_renew = monotonic()
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def lease_name(self):
+        return f"mozalert-member-{self.identity}"
+
+    @property
+    def members(self):
+        return self._ring.members
+
+    @property
+    def leader(self):
+        return self.members[0] if self.members else None
+
+    @property
+    def is_leader(self):
+        return self.leader == self.identity
+
+    def owns(self, key):
+        return self._ring.owner(key) == self.identity
+
+    def owner(self, key):
+        return self._ring.owner(key)
+
+    def fence(self, key):
+        """
+        how many seconds this replica has to wait before running key. A key
+        which moved here from a live member is run by it until it sees the
+        change at its next renew, or until its own lease runs out if it can't
+        renew. A member whose lease expired gives its keys up within a
+        renew_interval of that.
+        """
+        now = monotonic()
+        wait = 0
+        for ring, changed in self._handoffs:
+            owner = ring.owner(key)
+            if owner is None or owner == self.identity:
+                continue
+            if owner in self.members:
+                until = changed + self._lease_duration + self._renew_interval
+            else:
+                until = changed + self._renew_interval
+            wait = max(wait, until - now)
+        return wait
+
+    def wait_ready(self, timeout=None):
+        """
+        block until the first membership has been established
+        """
+        return self._ready.wait(timeout)
+
+    def terminate(self):
+        logging.info("Stopping shard coordinator")
+        self._shutdown = True
+        self._stop.set()
+
+    def renew(self):
+        """
+        create or renew the Lease for this replica
+        """
+        now = datetime.datetime.now(pytz.utc)
+        lease = client.V1Lease(
+            metadata=client.V1ObjectMeta(name=self.lease_name, labels=MEMBER_LABELS),
+            spec=client.V1LeaseSpec(
+                holder_identity=self.identity,
+                lease_duration_seconds=self._lease_duration,
+                renew_time=now,
+            ),
+        )
+        try:
+            self.client.patch_namespaced_lease(self.lease_name, self.namespace, lease)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            lease.spec.acquire_time = now
+            self.client.create_namespaced_lease(self.namespace, lease)
+
+    def live_members(self):
+        """
+        the identities of every replica holding an unexpired Lease. Expired
+        Leases are deleted if we're the leader.
+        """
+        now = datetime.datetime.now(pytz.utc)
+        leases = self.client.list_namespaced_lease(
+            self.namespace, label_selector=MEMBER_LABEL_SELECTOR
+        )
+        live = []
+        expired = []
+        for lease in leases.items:
+            spec = lease.spec
+            renewed = spec.renew_time or spec.acquire_time
+            duration = datetime.timedelta(
+                seconds=spec.lease_duration_seconds or self._lease_duration
+            )
+            if renewed and renewed + duration > now:
+                live.append(spec.holder_identity)
+            else:
+                expired.append(lease.metadata.name)
+        if self.identity not in live:
+            # we just renewed, so we're in whether the list shows it or not
+            live.append(self.identity)
+        if self.is_leader:
+            for name in expired:
+                logging.info(f"Removing expired controller lease {name}")
+                self.release(name)
+        return live
+
+    def release(self, name=None):
+        try:
+            self.client.delete_namespaced_lease(name or self.lease_name, self.namespace)
+        except ApiException as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+
+    def tick(self):
+        self.renew()
+        self._last_renew = monotonic()
+        members = tuple(sorted(set(self.live_members())))
+        if members != self.members:
+            logging.info(
+                f"Controller membership changed to {', '.join(members)}, "
+                f"leader is {members[0]}"
+            )
+            self.handoff(members)
+            self._ring = HashRing(members)
+            self._ready.set()
+            if self._on_change:
+                self._on_change(members)
+
+    def handoff(self, members):
+        """
+        remember the ring being replaced by members, see fence
+        """
+        now = monotonic()
+        previous = self._ring
+        if not previous.members:
+            # we're joining (or rejoining), the keys were spread over the
+            # other members
+            previous = HashRing(m for m in members if m != self.identity)
+        self._handoffs = [
+            (ring, changed)
+            for ring, changed in self._handoffs
+            if now - changed < self._lease_duration + self._renew_interval
+        ]
+        self._handoffs.append((previous, now))
+
+    def run(self):
+        logging.info(f"Joining the controller shard ring as {self.identity}")
+        while not self.shutdown:
+            try:
+                self.tick()
+            except Exception as e:
+                logging.warning("Failed to renew controller membership")
+                logging.warning(sys.exc_info()[0])
+                logging.warning(e)
+                if (
+                    self.members
+                    and monotonic() - self._last_renew > self._lease_duration
+                ):
+                    # our lease has expired so the other replicas have taken
+                    # over our checks. stop running them until we're back
+                    logging.warning("Controller lease expired, giving up all checks")
+                    self._ring = HashRing()
+                    if self._on_change:
+                        self._on_change(())
+            self._stop.wait(self._renew_interval)
+        # leave right away so the other replicas pick up our checks without
+        # waiting for the lease to expire
+        self.release()
+        logging.info("Shard coordinator shut down")
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import socket
+import logging
+import threading
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+STATE_LABELS = {
+    "app.kubernetes.io/managed-by": "mozalert",
+    "app.kubernetes.io/component": "controller-state",
+}
+
+
+def get_state_store(**kwargs):
+    """
+    build the state store configured with MOZALERT_STATE_STORE, or return
+    None if the controller starts from the check statuses alone
+    """
+    kind = kwargs.get("kind", os.environ.get("MOZALERT_STATE_STORE", ""))
+    if not kind:
+        return None
+    if kind == "file":
+        return FileStateStore(**kwargs)
+    if kind == "configmap":
+        return ConfigMapStateStore(**kwargs)
+    raise ValueError(f"Unknown state store {kind}")
+
+
+def encode(state):
+    return json.dumps(state, separators=(",", ":"), sort_keys=True)
+
+
+class FileStateStore:
+    """
+    keeps the snapshot in a JSON file at path, replaced atomically on
+    every save
+    """
+
+    def __init__(self, **kwargs):
+        self.path = kwargs.get(
+            "path",
+            os.environ.get("MOZALERT_STATE_PATH", "/var/lib/mozalert/state.json"),
+        )
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, data):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+class ConfigMapStateStore:
+    """
+    keeps the snapshot in a ConfigMap, by default mozalert-state-<pod name>
+    in the controller's namespace, so each replica of a StatefulSet gets its
+    own state back after a restart
+    """
+
+    def __init__(self, **kwargs):
+        self.client = kwargs.get("client", None) or client.CoreV1Api()
+        pod_name = os.environ.get("POD_NAME", socket.gethostname())
+        self.name = kwargs.get(
+            "name",
+            os.environ.get("MOZALERT_STATE_CONFIGMAP", f"mozalert-state-{pod_name}"),
+        )
+        self.namespace = kwargs.get(
+            "namespace", os.environ.get("POD_NAMESPACE", "default")
+        )
+
+    def load(self):
+        try:
+            res = self.client.read_namespaced_config_map(self.name, self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return {}
+            raise
+        return json.loads((res.data or {}).get("state.json") or "{}")
+
+    def save(self, data):
+        body = client.V1ConfigMap(
+            metadata=client.V1ObjectMeta(name=self.name, labels=STATE_LABELS),
+            data={"state.json": data},
+        )
+        try:
+            self.client.replace_namespaced_config_map(self.name, self.namespace, body)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            self.client.create_namespaced_config_map(self.namespace, body)
+
+
+class StateSnapshotter(threading.Thread):
+    """
+    the StateSnapshotter saves the scheduler state of every check (see
+    BaseCheck.snapshot) to a state store every interval seconds, and once
+    more when the controller shuts down. A snapshot which hasn't changed
+    since the last save isn't written again.
+
+    collect is called to build the snapshot, and must return a dict of
+    namespace/name to check state.
+    """
+
+    def __init__(self, store, collect, **kwargs):
+        super().__init__(daemon=True)
+        self._shutdown = False
+        self.store = store
+        self.collect = collect
+        self._interval = float(
+            kwargs.get("interval", os.environ.get("MOZALERT_STATE_INTERVAL", 10))
+        )
+        self._last = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    def terminate(self):
+        logging.info("Stopping state snapshotter")
+        self._shutdown = True
+        self._stop.set()
+
+    def load(self):
+        """
+        the checks from the last saved snapshot, or {} if there's none
+        """
+        try:
+            return self.store.load().get("checks", {})
+        except Exception as e:
+            logging.warning("Failed to load the controller state")
+            logging.warning(sys.exc_info()[0])
+            logging.warning(e)
+            return {}
+
+    def save(self):
+        with self._lock:
+            try:
+                data = encode({"checks": self.collect()})
+                if data == self._last:
+                    return
+                self.store.save(data)
+                self._last = data
+            except Exception as e:
+                logging.warning("Failed to save the controller state")
+                logging.warning(sys.exc_info()[0])
+                logging.warning(e)
+
+    def run(self):
+        logging.info("State snapshotter running")
+        while not self._stop.wait(self._interval):
+            self.save()
+        logging.info("State snapshotter shut down")
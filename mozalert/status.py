@@ -39,6 +39,10 @@ class Status:
         self.next_check = kwargs.get("next_check", None)
         self.attempt = kwargs.get("attempt", 0)
         self.logs = kwargs.get("logs", "")
+        # where the full logs were stored, see mozalert.logstore. When set
+        # only the last summary_lines lines of the logs go in the status
+        self.logs_ref = kwargs.get("logs_ref", None)
+        self.summary_lines = int(kwargs.get("summary_lines", 10))
 
     @property
     def status(self):
@@ -115,6 +119,18 @@ class Status:
     def logs(self, logs):
         self._logs = logs
 
+    @property
+    def logs_summary(self):
+        """
+        the logs as they're written to the status subresource
+        """
+        if not self.logs_ref:
+            return self.logs
+        lines = self.logs.splitlines(keepends=True)
+        if len(lines) <= self.summary_lines:
+            return self.logs
+        return "".join(lines[-self.summary_lines :])
+
     def __iter__(self):
         return iter(
             [
@@ -124,9 +140,26 @@ class Status:
                 ("next_check", self.next_check),
                 ("attempt", self.attempt),
                 ("logs", self.logs),
+                ("logs_ref", self.logs_ref),
             ]
         )
 
+    def to_patch(self):
+        """
+        the body of a patch to the status subresource of the check object
+        """
+        return {
+            "status": {
+                "status": str(self.status.name),
+                "state": str(self.state.name),
+                "attempt": str(self.attempt),
+                "lastCheckTimestamp": str(self.last_check).split(".")[0],
+                "nextCheckTimestamp": str(self.next_check).split(".")[0],
+                "logs": self.logs_summary,
+                "logsRef": self.logs_ref,
+            }
+        }
+
     @property
     def OK(self):
         return self.status == EnumStatus.OK
@@ -0,0 +1,153 @@
+import os
+import sys
+import logging
+import threading
+from time import monotonic
+from collections import OrderedDict
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.utils.ratelimit import TokenBucket
+from mozalert.metrics import observe
+
+
+class StatusWriter(threading.Thread):
+    """
+    the StatusWriter sends the status subresource patches for every check from
+    a single background thread:
+    * patches for the same object are coalesced, so only the latest pending
+      status of a check is ever sent
+    * a patch which matches what was last written for that object is skipped
+    * patches are rate limited with a token bucket
+
+    Every patch comes back to the controller as a MODIFIED event, so this
+    keeps both the apiserver writes and the watch traffic proportional to
+    real changes of state rather than to how often checks run.
+    """
+
+    def __init__(self, crd_client, **kwargs):
+        super().__init__()
+        self.crd_client = crd_client
+        self._domain = kwargs.get("domain", "crd.k8s.afrank.local")
+        self._version = kwargs.get("version", "v1")
+        self._plural = kwargs.get("plural", "checks")
+        self._max_retries = int(kwargs.get("max_retries", 3))
+        self.metrics_queue = kwargs.get("metrics_queue", None)
+        self._bucket = TokenBucket(
+            float(kwargs.get("qps", os.environ.get("MOZALERT_STATUS_QPS", 20))),
+            float(kwargs.get("burst", os.environ.get("MOZALERT_STATUS_BURST", 40))),
+        )
+        self._shutdown = False
+        self._cond = threading.Condition()
+        # (namespace, name) -> (body, retries), oldest first
+        self._pending = OrderedDict()
+        # (namespace, name) -> the last body successfully written
+        self._written = {}
+        self._stats = {"submitted": 0, "written": 0, "skipped": 0, "failed": 0}
+
+    @property
+    def shutdown(self):
+        return self._shutdown
+
+    @property
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending))
+
+    def submit(self, namespace, name, body):
+        """
+        queue a status patch for the object. This never blocks on the
+        apiserver.
+        """
+        key = (namespace, name)
+        with self._cond:
+            self._stats["submitted"] += 1
+            if key in self._pending:
+                # replace the queued patch but keep its place in line
+                self._pending[key] = (body, 0)
+            elif self._written.get(key) == body:
+                self._stats["skipped"] += 1
+            else:
+                self._pending[key] = (body, 0)
+                self._cond.notify()
+
+    def forget(self, namespace, name):
+        """
+        drop everything known about an object, for when its check goes away
+        """
+        key = (namespace, name)
+        with self._cond:
+            self._pending.pop(key, None)
+            self._written.pop(key, None)
+
+    def terminate(self):
+        logging.info("Stopping status writer")
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify()
+
+    def _next(self):
+        """
+        block until a patch is pending and pop the oldest one. Returns None
+        once the writer is shut down and drained.
+        """
+        with self._cond:
+            while True:
+                while not self._pending:
+                    if self.shutdown:
+                        return None
+                    self._cond.wait()
+                key, (body, retries) = self._pending.popitem(last=False)
+                if self._written.get(key) == body:
+                    # coalescing brought us back to what's already written
+                    self._stats["skipped"] += 1
+                    continue
+                return key, body, retries
+
+    def write(self, key, body, retries=0):
+        namespace, name = key
+        started = monotonic()
+        try:
+            self.crd_client.patch_namespaced_custom_object_status(
+                self._domain,
+                self._version,
+                namespace,
+                self._plural,
+                name,
+                body=body,
+            )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            with self._cond:
+                self._stats["failed"] += 1
+                gone = isinstance(e, ApiException) and e.status == 404
+                if (
+                    not gone
+                    and retries < self._max_retries
+                    and key not in self._pending
+                    and not self.shutdown
+                ):
+                    # try again once everything queued before it has gone
+                    self._pending[key] = (body, retries + 1)
+            return False
+        observe(
+            self.metrics_queue, "mozalert_status_patch_seconds", monotonic() - started
+        )
+        with self._cond:
+            self._stats["written"] += 1
+            self._written[key] = body
+        return True
+
+    def run(self):
+        logging.info("Status writer running")
+        while True:
+            item = self._next()
+            if item is None:
+                break
+            key, body, retries = item
+            if not self.shutdown:
+                # on shutdown flush whatever is left as fast as we can
+                self._bucket.acquire()
+            self.write(key, body, retries)
+        logging.info("Status writer shut down")
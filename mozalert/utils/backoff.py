@@ -0,0 +1,77 @@
+import os
+import random
+from collections import deque
+
+# apiserver errors worth trying again: the object is still being deleted, or
+# the apiserver is overloaded or briefly unavailable
+RETRY_STATUSES = (409, 429, 500, 502, 503, 504)
+
+
+def backoff(attempt, base, cap):
+    """
+    the delay before retry number attempt (from 0): exponential backoff
+    from base, capped at cap, with full jitter so failures which happen
+    together don't retry in lockstep
+    """
+    return random.uniform(0, min(base * 2**attempt, cap))
+
+
+def retryable(e):
+    """
+    whether an ApiException is worth retrying
+    """
+    return getattr(e, "status", None) in RETRY_STATUSES
+
+
+class JobPoller:
+    """
+    the JobPoller picks how long to wait between polls of a job's status.
+    Polls start at min_interval right after the job is created and back off
+    by factor toward a ceiling set by how long the check's jobs usually
+    take: a tenth of the 90th percentile of the last runtimes, kept within
+    [min_interval, max_interval]. Until there's any history the ceiling is
+    default.
+
+    So a short check is seen to finish soon after it does, and a long check
+    isn't polled more often than its runtime warrants.
+    """
+
+    def __init__(self, default=3, **kwargs):
+        self.default = float(default)
+        self.min_interval = float(
+            kwargs.get("min_interval", os.environ.get("MOZALERT_JOB_POLL_MIN", 0.5))
+        )
+        self.max_interval = float(
+            kwargs.get("max_interval", os.environ.get("MOZALERT_JOB_POLL_MAX", 30))
+        )
+        self.factor = float(kwargs.get("factor", 2))
+        self._runtimes = deque(maxlen=int(kwargs.get("history", 20)))
+        self._next = self.min_interval
+
+    @property
+    def ceiling(self):
+        if not self._runtimes:
+            return max(min(self.default, self.max_interval), self.min_interval)
+        runtimes = sorted(self._runtimes)
+        p90 = runtimes[min(int(len(runtimes) * 0.9), len(runtimes) - 1)]
+        return max(min(p90 / 10, self.max_interval), self.min_interval)
+
+    def record(self, runtime):
+        """
+        remember how long a job ran for
+        """
+        self._runtimes.append(float(runtime))
+
+    def reset(self):
+        """
+        start polling a new job
+        """
+        self._next = self.min_interval
+
+    def next(self):
+        """
+        the delay before the next poll
+        """
+        delay = min(self._next, self.ceiling)
+        self._next = delay * self.factor
+        return delay
@@ -0,0 +1,29 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeout for outgoing requests
+DEFAULT_TIMEOUT = (5, 15)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url, pool_size=10):
+    """
+    return the shared requests.Session for the scheme and host of url, so
+    requests to the same host reuse their connections rather than opening a
+    new one every time
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount(f"{parts.scheme}://", adapter)
+            _sessions[key] = session
+        return session
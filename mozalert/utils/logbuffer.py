@@ -0,0 +1,91 @@
+from collections import deque
+
+TRUNCATED_MARKER = "[... {} truncated ...]\n"
+
+
+class LogBuffer:
+    """
+    a ring buffer which keeps only the tail of a log stream: at most
+    max_lines lines and max_bytes bytes. Log chunks are fed in as they are
+    read, so memory stays bounded no matter how much the check prints, and
+    getvalue() marks where output was dropped.
+    """
+
+    def __init__(self, max_bytes=16384, max_lines=200):
+        self._max_bytes = max_bytes
+        self._max_lines = max_lines
+        self._lines = deque()
+        self._size = 0
+        self._partial = b""
+        self._dropped_lines = 0
+        self._dropped_bytes = 0
+        self._truncated = False
+        # lines fed since the last close
+        self._stream_lines = 0
+
+    @property
+    def max_lines(self):
+        return self._max_lines
+
+    @property
+    def truncated(self):
+        return self._truncated or self._dropped_lines > 0
+
+    def feed(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if not chunk:
+            return
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._append(line + b"\n")
+        if len(self._partial) > self._max_bytes:
+            # a single runaway line, keep its tail
+            self._dropped_bytes += len(self._partial) - self._max_bytes
+            self._partial = self._partial[-self._max_bytes :]
+            self._truncated = True
+
+    def close(self, tail_lines=None):
+        """
+        flush the last line if the stream didn't end with a newline. If the
+        stream was read with tail_lines and that many lines came back, the
+        apiserver may have cut earlier output, so the logs are marked
+        truncated. The buffer can be fed again afterwards, e.g. with the
+        next pod's logs.
+        """
+        if self._partial:
+            self._append(self._partial + b"\n")
+            self._partial = b""
+        if tail_lines and self._stream_lines >= tail_lines:
+            self._truncated = True
+        self._stream_lines = 0
+
+    def _append(self, line):
+        self._stream_lines += 1
+        if len(line) > self._max_bytes:
+            self._dropped_bytes += len(line) - self._max_bytes
+            line = line[-self._max_bytes :]
+            self._truncated = True
+        self._lines.append(line)
+        self._size += len(line)
+        while len(self._lines) > self._max_lines or self._size > self._max_bytes:
+            dropped = self._lines.popleft()
+            self._size -= len(dropped)
+            self._dropped_lines += 1
+            self._dropped_bytes += len(dropped)
+
+    def getvalue(self):
+        logs = b"".join(self._lines) + self._partial
+        logs = logs.decode("utf-8", errors="replace")
+        if self._truncated:
+            # we can't tell how much was dropped
+            return TRUNCATED_MARKER.format("earlier output") + logs
+        if self._dropped_lines:
+            return (
+                TRUNCATED_MARKER.format(
+                    f"{self._dropped_lines} lines ({self._dropped_bytes} bytes)"
+                )
+                + logs
+            )
+        return logs
@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import traceback
+from collections import Counter
+from time import monotonic, sleep
+
+
+def frame_label(code):
+    """
+    module-ish name of a code object, e.g. mozalert/check.py:run_job
+    """
+    path = code.co_filename.replace(os.sep, "/").split("/")
+    return f"{'/'.join(path[-2:])}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval=0.01):
+    """
+    sample the stack of every other thread every interval seconds for
+    seconds, and return a Counter of collapsed stacks (root first, frames
+    separated by ;), the input format of flamegraph.pl and speedscope.
+
+    This is a plain sampling profiler built on sys._current_frames, so it
+    can be turned on in a running controller and costs nothing otherwise.
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stacks[";".join(reversed(labels))] += 1
+        sleep(interval)
+    return stacks
+
+
+def collapse(stacks):
+    """
+    the collapsed stack format: one "stack count" line per stack
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def dump_threads():
+    """
+    the current stack of every thread, like a JVM thread dump
+    """
+    frames = sys._current_frames()
+    out = []
+    for thread in sorted(threading.enumerate(), key=lambda t: t.name):
+        frame = frames.get(thread.ident)
+        daemon = " daemon" if thread.daemon else ""
+        out.append(f'"{thread.name}" ident={thread.ident}{daemon}\n')
+        if frame is not None:
+            out.extend(traceback.format_stack(frame))
+        out.append("\n")
+    return "".join(out)
@@ -0,0 +1,51 @@
+import threading
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    """
+    a thread-safe token bucket. Tokens refill at rate per second up to burst,
+    and a rate of 0 (or less) disables the limit entirely.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate, 1))
+        self._tokens = self.burst
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        """
+        take tokens if they are available right now, without waiting
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def delay(self, tokens=1):
+        """
+        seconds until tokens will be available
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            self._refill()
+            return max(tokens - self._tokens, 0) / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        block until tokens are available and take them
+        """
+        while not self.try_acquire(tokens):
+            sleep(self.delay(tokens))
@@ -1,10 +1,25 @@
 import logging
+import threading
 
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
 
 class SendGridTools:
+    # one client per api key, reused for every message
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, api_key, timeout=15):
+        with cls._clients_lock:
+            sg = cls._clients.get(api_key)
+            if sg is None:
+                sg = SendGridAPIClient(api_key)
+                sg.client.timeout = timeout
+                cls._clients[api_key] = sg
+            return sg
+
     @staticmethod
     def send_message(**kwargs):
         api_key = kwargs.get("api_key", "")
@@ -19,8 +34,9 @@ class SendGridTools:
             html_content=message,
         )
         try:
-            sg = SendGridAPIClient(api_key)
+            sg = SendGridTools.get_client(api_key)
             response = sg.send(message)
             # logging.info(response)
         except Exception as e:
-            logging.warning(e.message)
+            logging.warning(e)
+            raise
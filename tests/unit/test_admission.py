@@ -0,0 +1,86 @@
+import unittest
+
+from mozalert.admission import AdmissionController
+
+
+class Scheduler:
+    """
+    runs nothing, only records what was started
+    """
+
+    def __init__(self):
+        self.started = []
+
+    def schedule(self, delay, function, name=None, rate_limited=True):
+        self.started.append(name)
+
+
+class TestAdmissionController(unittest.TestCase):
+    def submit(self, admission, namespace, name, priority=False):
+        admission.submit(
+            namespace,
+            lambda: self.ran.append(name),
+            name=name,
+            priority=priority,
+        )
+
+    def setUp(self):
+        self.ran = []
+        self.scheduler = Scheduler()
+
+    def test_namespace_limit(self):
+        admission = AdmissionController(
+            scheduler=self.scheduler, max_running=0, max_per_namespace=1
+        )
+        self.submit(admission, "a", "a1")
+        self.submit(admission, "a", "a2")
+        self.submit(admission, "b", "b1")
+        self.assertEqual(self.ran, ["a1", "b1"])
+        self.assertEqual(admission.queued, 1)
+        admission.release("a")
+        self.assertEqual(self.scheduler.started, ["a2"])
+
+    def test_namespaces_take_turns(self):
+        admission = AdmissionController(
+            scheduler=self.scheduler, max_running=1, max_per_namespace=0
+        )
+        self.submit(admission, "a", "a0")
+        for i in range(1, 4):
+            self.submit(admission, "a", f"a{i}")
+        self.submit(admission, "b", "b1")
+        self.submit(admission, "b", "b2")
+        self.assertEqual(self.ran, ["a0"])
+        admission.release("a")
+        for _ in range(4):
+            # the check that last took the slot finishes
+            admission.release(self.scheduler.started[-1][0])
+        self.assertEqual(self.scheduler.started, ["a1", "b1", "a2", "b2", "a3"])
+
+    def test_priority_checks_go_first(self):
+        admission = AdmissionController(
+            scheduler=self.scheduler, max_running=1, max_per_namespace=0
+        )
+        self.submit(admission, "a", "a0")
+        self.submit(admission, "a", "a1")
+        self.submit(admission, "b", "b1", priority=True)
+        admission.release("a")
+        self.assertEqual(self.scheduler.started, ["b1"])
+        self.assertEqual(admission.running, 1)
+
+    def test_running_checks_are_admitted_past_the_limit(self):
+        admission = AdmissionController(
+            scheduler=self.scheduler, max_running=1, max_per_namespace=0
+        )
+        self.submit(admission, "a", "a0")
+        admission.admit("a")
+        self.assertEqual(admission.running, 2)
+        self.submit(admission, "a", "a1")
+        admission.release("a")
+        # still at the limit
+        self.assertEqual(self.scheduler.started, [])
+        admission.release("a")
+        self.assertEqual(self.scheduler.started, ["a1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+import asyncio
+import datetime
+import unittest
+from types import SimpleNamespace
+
+import pytest
+
+# the asyncio engine is an optional extra
+pytest.importorskip("kubernetes_asyncio")
+
+from kubernetes_asyncio.client.rest import ApiException
+
+from mozalert.aio.check import AsyncCheck
+from mozalert.aio.controller import AsyncController
+from mozalert.metrics import FORGET
+from mozalert.status import EnumStatus
+from mozalert.utils.backoff import JobPoller
+
+
+class Client:
+    """
+    an async stand in for the kubernetes_asyncio clients, recording the
+    jobs deleted
+    """
+
+    def __init__(self):
+        self.deletes = []
+
+    async def delete_namespaced_job(self, name, namespace, **kwargs):
+        self.deletes.append(name)
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            return SimpleNamespace(items=[])
+
+        return call
+
+
+class JobClient(Client):
+    """
+    creates jobs which are active for the given number of status reads,
+    and then succeed. With conflict the first create fails with a 409.
+    """
+
+    def __init__(self, reads=1, conflict=False, start_time=None):
+        super().__init__()
+        self.creates = []
+        self.reads = reads
+        self.conflict = conflict
+        self.start_time = start_time
+
+    async def create_namespaced_job(self, body, namespace):
+        self.creates.append(body)
+        if self.conflict and len(self.creates) == 1:
+            raise ApiException(status=409, reason="AlreadyExists")
+        return SimpleNamespace(metadata=SimpleNamespace(uid="uid-1"))
+
+    async def read_namespaced_job_status(self, name, namespace):
+        self.reads -= 1
+        done = self.reads < 0
+        return SimpleNamespace(
+            metadata=SimpleNamespace(uid="uid-1"),
+            status=SimpleNamespace(
+                active=None if done else 1,
+                succeeded=1 if done else None,
+                failed=None,
+                start_time=self.start_time,
+            ),
+        )
+
+
+class Session:
+    """
+    a stand in for the controller's aiohttp session, recording the posts
+    """
+
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append((url, kwargs))
+
+        class Response:
+            status = 200
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def read(self):
+                return b"ok"
+
+            def raise_for_status(self):
+                pass
+
+        return Response()
+
+
+def event(operation, image, generation, **spec):
+    return {
+        "type": operation,
+        "object": {
+            "metadata": {
+                "name": "test",
+                "namespace": "default",
+                "generation": generation,
+                "resourceVersion": str(generation),
+            },
+            "spec": {"image": image, "check_interval": "1m", **spec},
+        },
+    }
+
+
+class TestAsyncController(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.controller = AsyncController()
+        self.controller._loop = asyncio.get_running_loop()
+        self.controller._concurrency = None
+        self.client = Client()
+        self.controller._clients = {
+            "client": self.client,
+            "pod_client": Client(),
+            "crd_client": Client(),
+        }
+
+    def forgotten(self):
+        return [
+            (item.name, item.namespace)
+            for item in self.controller.metrics_queue.drain(0)
+            if item.key == FORGET
+        ]
+
+    async def test_modified_and_deleted_events(self):
+        self.controller.handle_event(event("ADDED", "busybox:1", 1))
+        first = self.controller.threads["default/test"]
+
+        self.controller.handle_event(event("MODIFIED", "busybox:2", 2))
+        second = self.controller.threads["default/test"]
+        self.assertIsNot(first, second)
+        self.assertTrue(first.shutdown)
+        self.assertFalse(second.shutdown)
+
+        self.assertEqual(self.forgotten(), [])
+
+        self.controller.handle_event(event("DELETED", "busybox:2", 2))
+        self.assertNotIn("default/test", self.controller.threads)
+        self.assertTrue(second.shutdown)
+        self.assertEqual(self.forgotten(), [("test", "default")])
+        await first.join()
+        await second.join()
+        self.assertEqual(self.client.deletes, ["test", "test"])
+
+    async def test_escalations_share_the_session(self):
+        session = Session()
+        self.controller._http_session = session
+        esc = {"type": "slack", "args": {"webhook_url": "https://hooks/x"}}
+        self.controller.handle_event(event("ADDED", "busybox:1", 1, escalations=[esc]))
+        check = self.controller.threads["default/test"]
+        await check._escalate(esc)
+        await check._escalate(esc)
+        check.terminate()
+        await check.join()
+
+        self.assertEqual([url for url, _ in session.posts], ["https://hooks/x"] * 2)
+        timeout = session.posts[0][1]["timeout"]
+        self.assertEqual((timeout.sock_connect, timeout.sock_read), (5, 15))
+
+
+class TestAsyncCheck(unittest.IsolatedAsyncioTestCase):
+    def new_check(self, client, **kwargs):
+        check = AsyncCheck(
+            client=client,
+            pod_client=Client(),
+            crd_client=Client(),
+            loop=asyncio.get_running_loop(),
+            name="test",
+            namespace="default",
+            check_interval=60,
+            spec={"containers": [{"name": "test", "image": "busybox"}]},
+            retry_backoff=0,
+            **kwargs,
+        )
+        check._job_poller = JobPoller(min_interval=0.01, max_interval=0.01)
+        return check
+
+    async def run_check(self, check):
+        await check.check()
+        check.terminate(keep_job=True)
+        await check.join()
+
+    async def test_a_job_is_followed_until_it_finishes(self):
+        jobs = JobClient(reads=3)
+        check = self.new_check(jobs)
+        await self.run_check(check)
+        self.assertEqual(jobs.creates, [check.job_body])
+        self.assertEqual(jobs.reads, -1)
+        self.assertTrue(check.status.OK)
+        self.assertTrue(check.status.IDLE)
+        self.assertEqual(check.status.attempt, 0)
+        self.assertEqual(jobs.deletes, ["test"])
+
+    async def test_a_conflicting_job_is_replaced(self):
+        jobs = JobClient(conflict=True)
+        check = self.new_check(jobs)
+        await self.run_check(check)
+        self.assertEqual(jobs.creates, [check.job_body] * 2)
+        self.assertEqual(jobs.deletes, ["test", "test"])
+        self.assertTrue(check.status.OK)
+
+    async def test_a_job_past_its_timeout_fails_the_check(self):
+        started = datetime.datetime.utcnow() - datetime.timedelta(seconds=30)
+        jobs = JobClient(reads=100, start_time=started)
+        check = self.new_check(jobs, timeout=10)
+        await self.run_check(check)
+        self.assertEqual(check.status.status, EnumStatus.CRITICAL)
+        self.assertEqual(check.status.attempt, 1)
+        self.assertEqual(jobs.deletes, ["test"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from types import SimpleNamespace
+
+from mozalert.utils.backoff import JobPoller, backoff, retryable
+
+
+class TestBackoff(unittest.TestCase):
+    def test_backoff_is_capped(self):
+        for attempt in range(10):
+            for _ in range(20):
+                delay = backoff(attempt, 0.5, 30)
+                self.assertTrue(0 <= delay <= min(0.5 * 2**attempt, 30))
+
+    def test_retryable(self):
+        self.assertTrue(retryable(SimpleNamespace(status=409)))
+        self.assertTrue(retryable(SimpleNamespace(status=503)))
+        self.assertFalse(retryable(SimpleNamespace(status=403)))
+        self.assertFalse(retryable(ValueError()))
+
+
+class TestJobPoller(unittest.TestCase):
+    def test_polls_back_off_to_the_default(self):
+        poller = JobPoller(default=3, min_interval=0.5, max_interval=30)
+        self.assertEqual([poller.next() for _ in range(5)], [0.5, 1, 2, 3, 3])
+        poller.reset()
+        self.assertEqual(poller.next(), 0.5)
+
+    def test_the_ceiling_follows_the_runtimes(self):
+        poller = JobPoller(default=3, min_interval=0.5, max_interval=30)
+        for runtime in [100] * 9 + [1000]:
+            poller.record(runtime)
+        # a tenth of the p90
+        self.assertEqual(poller.ceiling, 30)
+        poller = JobPoller(default=3, min_interval=0.5, max_interval=30)
+        for _ in range(10):
+            poller.record(50)
+        self.assertEqual(poller.ceiling, 5)
+        for _ in range(20):
+            poller.record(1)
+        self.assertEqual(poller.ceiling, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
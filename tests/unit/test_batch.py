@@ -0,0 +1,147 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.batch import RESULT_PREFIX, PingBatcher
+
+
+class BatchCheck:
+    """
+    the parts of a Check the batcher uses, recording its result
+    """
+
+    def __init__(self, url, timeout=10):
+        self.config = SimpleNamespace(
+            namespace="default",
+            check_url=url,
+            timeout=timeout,
+            spec={"containers": [{"name": "ping", "image": "pinger"}]},
+        )
+        self.results = []
+
+    def finish_batch(self, result):
+        self.results.append(result)
+
+
+class JobClient:
+    """
+    a batch Job which finishes (or fails) on its first status read
+    """
+
+    def __init__(self, failed=False, create_error=None):
+        self.failed = failed
+        self.create_error = create_error
+        self.bodies = []
+        self.deletes = []
+
+    def create_namespaced_job(self, body, namespace):
+        if self.create_error:
+            raise self.create_error
+        self.bodies.append(body)
+        return SimpleNamespace(metadata=SimpleNamespace(uid="uid-batch"))
+
+    def read_namespaced_job_status(self, name, namespace):
+        return SimpleNamespace(
+            metadata=SimpleNamespace(uid="uid-batch"),
+            status=SimpleNamespace(
+                active=None,
+                succeeded=None if self.failed else 1,
+                failed=1 if self.failed else None,
+                start_time=None,
+            ),
+        )
+
+    def delete_namespaced_job(self, name, namespace, **kwargs):
+        self.deletes.append(name)
+
+
+class LogResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def release_conn(self):
+        pass
+
+
+class PodClient:
+    """
+    the pinger pod of the batch, printing lines
+    """
+
+    def __init__(self, lines):
+        self.lines = [line.encode("utf-8") for line in lines]
+
+    def list_namespaced_pod(self, namespace, label_selector):
+        return SimpleNamespace(
+            items=[SimpleNamespace(metadata=SimpleNamespace(name="pod"))]
+        )
+
+    def read_namespaced_pod_log(self, name, namespace, **kwargs):
+        return LogResponse(self.lines)
+
+
+def result(index, code, url):
+    return RESULT_PREFIX + json.dumps(
+        {"index": index, "code": code, "url": url, "seconds": 0.1}
+    )
+
+
+class TestPingBatcher(unittest.TestCase):
+    def test_results_are_handed_back_to_their_checks(self):
+        checks = [BatchCheck(f"https://{host}") for host in "abc"]
+        jobs = JobClient()
+        pods = PodClient(
+            [
+                "starting",
+                result(2, 1, "https://c"),
+                f"{RESULT_PREFIX}not json",
+                result(0, 0, "https://a"),
+            ]
+        )
+        batcher = PingBatcher(client=jobs, pod_client=pods, poll_interval=0)
+        batcher.run_batch("batch", ("default", "pinger"), checks)
+
+        args = jobs.bodies[0].spec.template.spec.containers[0].args
+        self.assertEqual(
+            args, ["--batch", "10:https://a", "10:https://b", "10:https://c"]
+        )
+        self.assertEqual(checks[0].results[0]["code"], 0)
+        self.assertEqual(checks[2].results[0]["code"], 1)
+        # a url the pinger didn't report on fails on its own
+        self.assertIsNone(checks[1].results[0]["code"])
+        self.assertIn("No result", checks[1].results[0]["log"])
+        self.assertEqual(jobs.deletes, ["batch"])
+
+    def test_a_failed_batch_fails_every_check(self):
+        for jobs in [
+            JobClient(failed=True),
+            JobClient(create_error=ApiException(status=500, reason="Error")),
+        ]:
+            checks = [BatchCheck("https://a"), BatchCheck("https://b")]
+            batcher = PingBatcher(
+                client=jobs, pod_client=PodClient([]), poll_interval=0
+            )
+            batcher.run_batch("batch", ("default", "pinger"), checks)
+            for check in checks:
+                self.assertEqual(len(check.results), 1)
+                self.assertIsNone(check.results[0]["code"])
+            self.assertEqual(jobs.deletes, ["batch"])
+
+    def test_checks_due_together_share_a_batch(self):
+        batcher = PingBatcher(client=JobClient(), pod_client=PodClient([]), max_batch=2)
+        started = []
+        batcher.start_batch = lambda key, checks: started.append((key, checks))
+        checks = [BatchCheck(f"https://{host}") for host in "abc"]
+        for check in checks:
+            batcher.submit(check)
+        self.assertEqual(started, [(("default", "pinger"), checks[:2])])
+        self.assertEqual(batcher._pending[("default", "pinger")][1], checks[2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,405 @@
+import os
+import datetime
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+import pytz
+from kubernetes.client.rest import ApiException
+
+from mozalert.admission import AdmissionController
+from mozalert.check import Check
+from mozalert.scheduler import Scheduler
+from mozalert.jobwatch import JOB_LABELS, JobWatcher
+from mozalert.status import EnumState, EnumStatus
+from mozalert.logstore import FileLogStore
+
+SPEC = {"restart_policy": "Never", "containers": [{"name": "c", "image": "busybox"}]}
+
+
+class Stub:
+    """
+    answers any client call with an empty result
+    """
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: SimpleNamespace(items=[])
+
+
+class RecordingScheduler:
+    """
+    records the job body each check would run with at the moment its run is
+    scheduled, since a due run can start on a worker before the check's
+    constructor has returned
+    """
+
+    def __init__(self):
+        self.bodies = []
+        self.delays = []
+
+    def jittered(self, delay):
+        return delay
+
+    def schedule(self, delay, function, name=None, rate_limited=True):
+        self.bodies.append(function.__self__.job_body)
+        self.delays.append(delay)
+        return SimpleNamespace(cancel=lambda: None, join=lambda timeout=None: None)
+
+
+class LogResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, size):
+        for i in range(0, len(self.data), size):
+            yield self.data[i : i + size]
+
+    def release_conn(self):
+        pass
+
+
+class PodClient:
+    """
+    one pod, whose logs are the lines given, honouring tail_lines
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def list_namespaced_pod(self, namespace, label_selector):
+        pod = SimpleNamespace(metadata=SimpleNamespace(name="pod"), status=None)
+        return SimpleNamespace(items=[pod])
+
+    def read_namespaced_pod_log(self, name, namespace, tail_lines=None, **kwargs):
+        lines = self.lines[-tail_lines:] if tail_lines else self.lines
+        return LogResponse(b"".join(lines))
+
+
+class JitteringScheduler(RecordingScheduler):
+    def jittered(self, delay):
+        return delay + 7
+
+
+class JobClient(Stub):
+    """
+    records the job deletes
+    """
+
+    def __init__(self):
+        self.deletes = []
+
+    def delete_namespaced_job(self, name, namespace, body=None, **kwargs):
+        self.deletes.append((name, body.preconditions.uid))
+
+
+class ConflictClient(JobClient):
+    """
+    a job named after the check is already there
+    """
+
+    def __init__(self, labels=None, deleting=False, created=None, active=False):
+        super().__init__()
+        self.creates = 0
+        self.bodies = []
+        self.job = SimpleNamespace(
+            metadata=SimpleNamespace(
+                uid="uid-old",
+                labels=JOB_LABELS if labels is None else labels,
+                deletion_timestamp="now" if deleting else None,
+                creation_timestamp=created,
+            ),
+            status=SimpleNamespace(
+                active=1 if active else None,
+                succeeded=None if active else 1,
+                failed=None,
+                start_time=None,
+            ),
+        )
+
+    def create_namespaced_job(self, body, namespace):
+        self.creates += 1
+        self.bodies.append(body)
+        if self.creates == 1:
+            raise ApiException(status=409, reason="AlreadyExists")
+        self.job.metadata.uid = "uid-new"
+        self.job.metadata.deletion_timestamp = None
+        self.job.status.active = None
+        self.job.status.succeeded = 1
+        return self.job
+
+    def read_namespaced_job(self, name, namespace):
+        return self.job
+
+    def read_namespaced_job_status(self, name, namespace):
+        return self.job
+
+
+class RunningJobClient(JobClient):
+    """
+    every job runs until done is set
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.created = []
+        self.done = threading.Event()
+
+    def create_namespaced_job(self, body, namespace):
+        name = body["metadata"]["name"]
+        self.created.append(name)
+        return SimpleNamespace(
+            metadata=SimpleNamespace(uid=f"uid-{name}", creation_timestamp=None)
+        )
+
+    def read_namespaced_job_status(self, name, namespace):
+        done = self.done.is_set()
+        return SimpleNamespace(
+            metadata=SimpleNamespace(uid=f"uid-{name}"),
+            status=SimpleNamespace(
+                active=None if done else 1,
+                succeeded=1 if done else None,
+                failed=None,
+                start_time=None,
+            ),
+        )
+
+
+def new_check(**kwargs):
+    args = dict(
+        client=Stub(),
+        pod_client=Stub(),
+        crd_client=Stub(),
+        name="test",
+        namespace="default",
+        check_interval=60,
+        spec=SPEC,
+        scheduler=RecordingScheduler(),
+    )
+    args.update(kwargs)
+    return Check(**args)
+
+
+class TestCheck(unittest.TestCase):
+    def test_spec_is_set_before_the_first_run(self):
+        scheduler = RecordingScheduler()
+        new_check(scheduler=scheduler)
+        containers = scheduler.bodies[0]["spec"]["template"]["spec"]["containers"]
+        self.assertEqual(containers[0]["image"], "busybox")
+
+    def test_log_store_gets_the_full_logs(self):
+        lines = [f"line {i}\n".encode() for i in range(500)]
+        with tempfile.TemporaryDirectory() as path:
+            check = new_check(
+                pod_client=PodClient(lines),
+                log_store=FileLogStore(path=path),
+                log_max_lines=10,
+            )
+            check.get_job_logs()
+            check.store_logs()
+            with open(os.path.join(path, "default", "test.log"), "rb") as f:
+                stored = f.readlines()[1:]
+        self.assertEqual(stored, lines)
+        self.assertTrue(check.status.logs.endswith("line 499\n"))
+        self.assertLessEqual(len(check.status.logs.splitlines()), 11)
+
+    def test_without_a_log_store_only_the_tail_is_read(self):
+        lines = [f"line {i}\n".encode() for i in range(500)]
+        check = new_check(pod_client=PodClient(lines), log_max_lines=10)
+        check.get_job_logs()
+        self.assertIsNone(check._log_capture)
+        self.assertTrue(check.status.logs.endswith("line 499\n"))
+
+    def test_jobs_are_only_deleted_by_uid(self):
+        jobs = JobClient()
+        check = new_check(client=jobs)
+        check.delete_job()
+        self.assertEqual(jobs.deletes, [])
+        check._job_uid = "uid-1"
+        check.delete_job()
+        check.delete_job(uid="uid-2")
+        self.assertEqual(jobs.deletes, [("test", "uid-1"), ("test", "uid-2")])
+
+    def test_handoff_keeps_the_job(self):
+        jobs = JobClient()
+        check = new_check(client=jobs)
+        check._job_uid = "uid-1"
+        check.terminate(keep_job=True)
+        self.assertEqual(jobs.deletes, [])
+
+    def test_fence_delays_the_first_run(self):
+        scheduler = RecordingScheduler()
+        new_check(scheduler=scheduler, fence=20, check_interval=5)
+        self.assertEqual(scheduler.delays, [20])
+
+    def test_only_the_first_run_is_jittered(self):
+        scheduler = JitteringScheduler()
+        check = new_check(scheduler=scheduler, check_interval=60, retry_interval=10)
+        check.status.status = EnumStatus.CRITICAL
+        check.finish_check()
+        check.status.status = EnumStatus.OK
+        check.finish_check()
+        self.assertEqual(scheduler.delays, [67, 10, 60])
+
+    def test_job_body_is_built_once(self):
+        check = new_check()
+        body = check.job_body
+        self.assertIs(check.job_body, body)
+        self.assertEqual(body["metadata"]["name"], "test")
+        check.config.spec = dict(SPEC, restart_policy="OnFailure")
+        self.assertIsNot(check.job_body, body)
+        self.assertEqual(
+            check.job_body["spec"]["template"]["spec"]["restartPolicy"], "OnFailure"
+        )
+
+    def test_a_handed_off_job_is_adopted(self):
+        last_check = datetime.datetime(2020, 1, 1, 12, tzinfo=pytz.utc)
+        for jobs, running in [
+            (ConflictClient(active=True), True),
+            (ConflictClient(created=last_check + datetime.timedelta(minutes=1)), False),
+        ]:
+            check = new_check(client=jobs)
+            check.status.last_check = last_check
+            # a job still running is followed from the scheduler
+            self.assertEqual(check.run_job(), running)
+            self.assertEqual(jobs.creates, 1)
+            self.assertEqual(check._job_uid, "uid-old")
+            self.assertEqual(jobs.deletes, [])
+            self.assertEqual(check.status.RUNNING, running)
+            self.assertEqual(check.status.OK, not running)
+
+    def test_a_stale_finished_job_is_replaced(self):
+        last_check = datetime.datetime(2020, 1, 1, 12, tzinfo=pytz.utc)
+        for created in [last_check - datetime.timedelta(minutes=1), None]:
+            jobs = ConflictClient(created=created)
+            check = new_check(client=jobs, retry_backoff=0)
+            check.status.last_check = last_check
+            check.run_job()
+            self.assertEqual(jobs.deletes, [("test", "uid-old")])
+            self.assertEqual(jobs.bodies, [check.job_body] * 2)
+            self.assertEqual(check._job_uid, "uid-new")
+
+    def test_a_job_being_deleted_is_waited_out(self):
+        jobs = ConflictClient(deleting=True)
+        check = new_check(client=jobs, retry_backoff=0)
+        check.run_job()
+        self.assertEqual(jobs.creates, 2)
+        self.assertEqual(jobs.bodies, [check.job_body] * 2)
+        self.assertEqual(check._job_uid, "uid-new")
+        self.assertEqual(jobs.deletes, [])
+
+    def test_someone_elses_job_is_deleted(self):
+        jobs = ConflictClient(labels={})
+        check = new_check(client=jobs, retry_backoff=0)
+        check.run_job()
+        self.assertEqual(jobs.deletes, [("test", "uid-old")])
+        self.assertEqual(jobs.bodies, [check.job_body] * 2)
+        self.assertEqual(check._job_uid, "uid-new")
+
+    def test_a_running_job_doesnt_hold_a_worker(self):
+        scheduler = Scheduler(workers=1, start_rate=0)
+        scheduler.daemon = True
+        scheduler.start()
+        self.addCleanup(scheduler.terminate)
+        jobs = RunningJobClient()
+        checks = [
+            new_check(
+                name=name,
+                client=jobs,
+                scheduler=scheduler,
+                fence=3600,
+                job_poll_interval=0.05,
+            )
+            for name in ["one", "two"]
+        ]
+        for check in checks:
+            scheduler.schedule(0, check.check)
+        # both jobs are started by the one worker
+        for _ in range(100):
+            if len(jobs.created) == 2:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(sorted(jobs.created), ["one", "two"])
+        self.assertTrue(all(check.status.RUNNING for check in checks))
+        jobs.done.set()
+        for _ in range(100):
+            if all(check.status.OK for check in checks):
+                break
+            threading.Event().wait(0.05)
+        self.assertTrue(all(check.status.OK for check in checks))
+        self.assertEqual(sorted(jobs.deletes), [("one", "uid-one"), ("two", "uid-two")])
+        for check in checks:
+            check.terminate()
+
+    def test_a_restored_check_adopts_its_running_job(self):
+        jobs = RunningJobClient()
+        jobs.done.set()
+        check = new_check(client=jobs, uid="uid-check")
+        check._job_uid = "uid-test"
+        check.status.state = EnumState.RUNNING
+        check.status.attempt = 2
+        state = check.snapshot()
+        self.assertEqual(state["job"], "uid-test")
+        scheduler = RecordingScheduler()
+        restored = new_check(
+            client=jobs, uid="uid-check", snapshot=state, scheduler=scheduler
+        )
+        # the job is adopted right away, without counting another attempt
+        self.assertEqual(scheduler.delays, [0])
+        restored.check()
+        self.assertEqual(jobs.created, [])
+        self.assertTrue(restored.status.OK)
+        self.assertEqual(jobs.deletes, [("test", "uid-test")])
+
+    def test_an_adopted_job_doesnt_queue_for_admission(self):
+        jobs = RunningJobClient()
+        jobs.done.set()
+        admission = AdmissionController(max_running=1)
+        # the only slot is taken
+        admission.submit("default", lambda: None)
+        state = {"uid": "uid-check", "attempt": 1, "job": "uid-test"}
+        check = new_check(
+            client=jobs, uid="uid-check", snapshot=state, admission=admission
+        )
+        check.check()
+        self.assertEqual(jobs.created, [])
+        self.assertTrue(check.status.OK)
+        self.assertEqual(admission.queued, 0)
+        # and its slot is given back
+        self.assertEqual(admission.running, 1)
+
+    def test_a_job_gone_since_the_snapshot_is_replaced(self):
+        jobs = RunningJobClient()
+        jobs.done.set()
+        state = {"uid": "uid-check", "attempt": 1, "job": "uid-gone"}
+        check = new_check(client=jobs, uid="uid-check", snapshot=state)
+        check.check()
+        self.assertEqual(jobs.created, ["test"])
+        self.assertEqual(jobs.deletes, [("test", "uid-test")])
+
+    def test_snapshots_of_other_checks_are_ignored(self):
+        scheduler = RecordingScheduler()
+        state = {"uid": "uid-old", "attempt": 2, "job": "uid-test"}
+        check = new_check(uid="uid-new", snapshot=state, scheduler=scheduler)
+        self.assertEqual(check.status.attempt, 0)
+        self.assertIsNone(check._adopt_job_uid)
+        self.assertEqual(scheduler.delays, [60])
+
+    def test_checks_poll_without_a_healthy_watch(self):
+        watcher = JobWatcher(Stub())
+        scheduler = RecordingScheduler()
+        check = new_check(job_watcher=watcher, scheduler=scheduler)
+        check._job_uid = "uid-test"
+        check.schedule_job_poll()
+        # the poll interval, not the resync interval
+        self.assertLess(scheduler.delays[-1], 60)
+        self.assertEqual(watcher._callbacks, {})
+
+        watcher._healthy = True
+        check.schedule_job_poll()
+        self.assertEqual(scheduler.delays[-1], 60)
+        self.assertIn("default/test", watcher._callbacks)
+
+
+if __name__ == "__main__":
+    unittest.main()
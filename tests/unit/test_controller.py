@@ -0,0 +1,112 @@
+import unittest
+from types import SimpleNamespace
+
+from mozalert.controller import Controller, parse_time
+
+
+class FakeCheck:
+    """
+    holds the config a check was created with, and whether it was stopped
+    """
+
+    def __init__(self, **kwargs):
+        self.config = SimpleNamespace(**kwargs)
+        self.terminated = False
+
+    def terminate(self, keep_job=False):
+        self.terminated = True
+
+
+class EventController(Controller):
+    """
+    a controller without clients or shared services, running FakeChecks
+    """
+
+    def setup(self, **kwargs):
+        self.sharding = None
+        self.status_writer = None
+        self._snapshot = {}
+        self.parsed = 0
+
+    def new_check(self, **kwargs):
+        return FakeCheck(**kwargs)
+
+    def parse_check(self, obj):
+        self.parsed += 1
+        return super().parse_check(obj)
+
+
+def event(operation, generation, image="busybox:1", status=None):
+    return {
+        "type": operation,
+        "object": {
+            "metadata": {
+                "name": "test",
+                "namespace": "default",
+                "generation": generation,
+                "resourceVersion": str(generation * 10 + len(status or {})),
+            },
+            "spec": {"image": image, "check_interval": "1m"},
+            "status": status or {},
+        },
+    }
+
+
+class TestParseTime(unittest.TestCase):
+    def test_minutes(self):
+        self.assertEqual(parse_time("5"), 300)
+        self.assertEqual(parse_time("1.5"), 90)
+
+    def test_time_strings(self):
+        self.assertEqual(parse_time("1h30m"), 5400)
+        self.assertEqual(parse_time("2m10s"), 130)
+        self.assertEqual(parse_time("45s"), 45)
+        self.assertEqual(parse_time(" 1h "), 3600)
+
+    def test_empty_is_zero(self):
+        self.assertEqual(parse_time(""), 0)
+
+    def test_invalid(self):
+        for time_str in [None, "abc", "1d", "5m1h"]:
+            with self.assertRaises(ValueError):
+                parse_time(time_str)
+
+
+class TestHandleEvent(unittest.TestCase):
+    def test_status_changes_are_dropped(self):
+        controller = EventController()
+        controller.handle_event(event("ADDED", 1))
+        check = controller.threads["default/test"]
+        self.assertEqual(controller.parsed, 1)
+        # our own status patches coming back, bumping only the resourceVersion
+        for status in [{"state": "RUNNING"}, {"state": "IDLE", "attempt": 0}]:
+            controller.handle_event(event("MODIFIED", 1, status=status))
+        self.assertIs(controller.threads["default/test"], check)
+        self.assertFalse(check.terminated)
+        self.assertEqual(controller.parsed, 1)
+
+    def test_spec_changes_restart_the_check(self):
+        controller = EventController()
+        controller.handle_event(event("ADDED", 1))
+        check = controller.threads["default/test"]
+        controller.handle_event(event("MODIFIED", 2, image="busybox:2"))
+        restarted = controller.threads["default/test"]
+        self.assertIsNot(restarted, check)
+        self.assertTrue(check.terminated)
+        self.assertEqual(restarted.config.spec["containers"][0]["image"], "busybox:2")
+        # and the new spec version is what later status changes compare to
+        controller.handle_event(event("MODIFIED", 2, status={"state": "IDLE"}))
+        self.assertIs(controller.threads["default/test"], restarted)
+        self.assertEqual(controller.parsed, 2)
+
+    def test_a_new_generation_with_the_same_config_keeps_the_check(self):
+        controller = EventController()
+        controller.handle_event(event("ADDED", 1))
+        check = controller.threads["default/test"]
+        controller.handle_event(event("MODIFIED", 2))
+        self.assertIs(controller.threads["default/test"], check)
+        self.assertFalse(check.terminated)
+
+
+if __name__ == "__main__":
+    unittest.main()
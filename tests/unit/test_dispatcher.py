@@ -0,0 +1,93 @@
+import unittest
+
+from mozalert.dispatcher import EscalationDispatcher
+from mozalert.escalations import BaseEscalation
+
+SENT = []
+
+
+class Escalation(BaseEscalation):
+    """
+    records what it sent, and batches into digests by channel
+    """
+
+    @property
+    def destination(self):
+        return self.args.get("channel")
+
+    @classmethod
+    def digest(cls, escalations):
+        names = ",".join(escalation.name for escalation in escalations)
+        return cls(names, "DIGEST", args=escalations[0].args)
+
+    def run(self):
+        SENT.append((self.name, self.status))
+
+
+class Failing(Escalation):
+    def run(self):
+        raise Exception("webhook is down")
+
+
+class TestEscalationDispatcher(unittest.TestCase):
+    def setUp(self):
+        SENT.clear()
+
+    def new_dispatcher(self, **kwargs):
+        dispatcher = EscalationDispatcher(workers=1, **kwargs)
+        dispatcher.start()
+        self.addCleanup(dispatcher.join)
+        self.addCleanup(dispatcher.terminate)
+        return dispatcher
+
+    def test_repeated_status_is_deduped(self):
+        dispatcher = self.new_dispatcher(window=0)
+        self.assertTrue(dispatcher.submit(Escalation("a", "CRITICAL"), 60))
+        dispatcher.queue.join()
+        self.assertFalse(dispatcher.submit(Escalation("a", "CRITICAL"), 60))
+        self.assertTrue(dispatcher.submit(Escalation("a", "OK"), 60))
+        self.assertTrue(dispatcher.submit(Escalation("b", "CRITICAL"), 60))
+        dispatcher.queue.join()
+        self.assertEqual(SENT, [("a", "CRITICAL"), ("a", "OK"), ("b", "CRITICAL")])
+        self.assertEqual(dispatcher.stats["deduped"], 1)
+
+    def test_failed_escalations_arent_deduped_against(self):
+        dispatcher = self.new_dispatcher(window=0, max_retries=0)
+        self.assertTrue(dispatcher.submit(Failing("a", "CRITICAL"), 60))
+        dispatcher.queue.join()
+        self.assertTrue(dispatcher.submit(Escalation("a", "CRITICAL"), 60))
+        dispatcher.queue.join()
+        self.assertEqual(SENT, [("a", "CRITICAL")])
+
+    def test_dropped_escalations_arent_deduped_against(self):
+        # no workers, so the queue fills up
+        dispatcher = EscalationDispatcher(window=0, queue_size=1)
+        self.assertTrue(dispatcher.submit(Escalation("a", "CRITICAL"), 60))
+        self.assertFalse(dispatcher.submit(Escalation("b", "CRITICAL"), 60))
+        dispatcher.queue.get_nowait()
+        self.assertTrue(dispatcher.submit(Escalation("b", "CRITICAL"), 60))
+        self.assertFalse(dispatcher.submit(Escalation("a", "CRITICAL"), 60))
+        self.assertEqual(dispatcher.stats["deduped"], 1)
+
+    def test_without_a_dedupe_interval_everything_is_sent(self):
+        dispatcher = self.new_dispatcher(window=0)
+        for _ in range(3):
+            dispatcher.submit(Escalation("a", "CRITICAL"))
+        dispatcher.queue.join()
+        self.assertEqual(len(SENT), 3)
+
+    def test_escalations_to_one_destination_are_sent_as_a_digest(self):
+        dispatcher = self.new_dispatcher(window=60)
+        for name in ["a", "b", "c"]:
+            dispatcher.submit(Escalation(name, "CRITICAL", args={"channel": "#ops"}))
+        dispatcher.submit(Escalation("d", "CRITICAL", args={"channel": "#dev"}))
+        self.assertEqual(SENT, [])
+        with dispatcher._cond:
+            dispatcher.flush(force=True)
+        dispatcher.queue.join()
+        self.assertEqual(sorted(SENT), [("a,b,c", "DIGEST"), ("d", "CRITICAL")])
+        self.assertEqual(dispatcher.stats["digests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
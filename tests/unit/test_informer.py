@@ -0,0 +1,171 @@
+import unittest
+from unittest import mock
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.informer import CheckInformer
+
+
+def check(name, version, namespace="default"):
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "resourceVersion": str(version),
+        }
+    }
+
+
+class CheckClient:
+    """
+    answers each list with the next of lists, and each watch with the next
+    of watches: a list of events, or an exception to raise
+    """
+
+    def __init__(self, lists, watches=()):
+        self.lists = list(lists)
+        self.watches = list(watches)
+        self.listed = 0
+        self.watched = []
+
+    def list_cluster_custom_object(self, domain, version, plural):
+        self.listed += 1
+        items, resource_version = self.lists.pop(0)
+        return {"items": items, "metadata": {"resourceVersion": resource_version}}
+
+
+class Watch:
+    """
+    plays the watches of the informer's CheckClient, and stops the informer
+    once they've all been played
+    """
+
+    informer = None
+
+    def stream(self, func, *args, **kwargs):
+        client = self.informer.client
+        client.watched.append(kwargs["resource_version"])
+        if not client.watches:
+            self.informer.terminate()
+            return
+        step = client.watches.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        yield from step
+
+    def stop(self):
+        pass
+
+
+class TestCheckInformer(unittest.TestCase):
+    def new_informer(self, client, **kwargs):
+        self.events = []
+        informer = CheckInformer(
+            client,
+            "crd.k8s.afrank.local",
+            "v1",
+            "checks",
+            handlers=[self.handle],
+            retry_interval=0,
+            **kwargs,
+        )
+        Watch.informer = informer
+        return informer
+
+    def handle(self, event):
+        metadata = event["object"]["metadata"]
+        self.events.append(
+            (event["type"], metadata["name"], metadata["resourceVersion"])
+        )
+
+    def test_relist_only_hands_on_changes(self):
+        client = CheckClient(
+            [
+                ([check("a", 1), check("b", 1), check("c", 1)], "5"),
+                ([check("a", 1), check("b", 2), check("d", 1)], "9"),
+            ]
+        )
+        informer = self.new_informer(client)
+        informer.relist()
+        self.events = []
+        informer.relist()
+        self.assertEqual(
+            self.events,
+            [("MODIFIED", "b", "2"), ("ADDED", "d", "1"), ("DELETED", "c", "1")],
+        )
+        self.assertEqual(
+            sorted(informer.store.keys()), ["default/a", "default/b", "default/d"]
+        )
+        self.assertEqual(informer.resource_version, "9")
+        self.assertTrue(informer.synced)
+
+    def test_the_store_is_indexed_by_namespace(self):
+        client = CheckClient([([check("a", 1), check("b", 1, "other")], "5")])
+        informer = self.new_informer(client)
+        informer.relist()
+        self.assertEqual(informer.store.namespaces(), ["default", "other"])
+        self.assertEqual(informer.store.list("other"), [check("b", 1, "other")])
+        informer.handle({"type": "DELETED", "object": check("b", 2, "other")})
+        self.assertEqual(informer.store.namespaces(), ["default"])
+        self.assertIsNone(informer.store.get("other", "b"))
+
+    def test_resync_hands_on_the_store(self):
+        client = CheckClient([([check("a", 1), check("b", 1)], "5")])
+        informer = self.new_informer(client, resync_interval=60)
+        informer.relist()
+        self.events = []
+        informer.resync()
+        self.assertEqual(self.events, [])
+        informer._last_resync -= 61
+        informer.resync()
+        self.assertEqual(self.events, [("MODIFIED", "a", "1"), ("MODIFIED", "b", "1")])
+        self.assertEqual(client.listed, 1)
+
+    def test_watches_resume_from_the_last_version(self):
+        client = CheckClient(
+            [([check("a", 1)], "5")],
+            [
+                [
+                    {"type": "MODIFIED", "object": check("a", 6)},
+                    {"type": "BOOKMARK", "object": check("", 8)},
+                ]
+            ],
+        )
+        informer = self.new_informer(client)
+        with mock.patch("mozalert.informer.watch.Watch", Watch):
+            informer.run()
+        self.assertEqual(client.listed, 1)
+        self.assertEqual(client.watched, ["5", "8"])
+        self.assertEqual(self.events, [("ADDED", "a", "1"), ("MODIFIED", "a", "6")])
+
+    def test_an_expired_version_relists(self):
+        client = CheckClient(
+            [
+                ([check("a", 1), check("b", 1)], "5"),
+                ([check("a", 7), check("c", 1)], "9"),
+            ],
+            [
+                [{"type": "MODIFIED", "object": check("b", 6)}],
+                ApiException(status=410, reason="Gone"),
+            ],
+        )
+        informer = self.new_informer(client)
+        with mock.patch("mozalert.informer.watch.Watch", Watch):
+            informer.run()
+        self.assertEqual(client.listed, 2)
+        self.assertEqual(client.watched, ["5", "6", "9"])
+        self.assertEqual(
+            self.events,
+            [
+                ("ADDED", "a", "1"),
+                ("ADDED", "b", "1"),
+                ("MODIFIED", "b", "6"),
+                ("MODIFIED", "a", "7"),
+                ("ADDED", "c", "1"),
+                ("DELETED", "b", "6"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
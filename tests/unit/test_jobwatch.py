@@ -0,0 +1,145 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.jobwatch import JobWatcher
+
+
+def job(name, uid, done=False, version="1"):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(
+            namespace="default", name=name, uid=uid, resource_version=version
+        ),
+        status=SimpleNamespace(
+            active=None if done else 1,
+            succeeded=1 if done else None,
+            failed=None,
+            start_time=None,
+        ),
+    )
+
+
+class JobClient:
+    """
+    lists the given jobs, then watches the given events. With error the
+    list fails instead
+    """
+
+    def __init__(self, jobs=(), events=(), error=None):
+        self.jobs = list(jobs)
+        self.events = list(events)
+        self.error = error
+
+    def list_job_for_all_namespaces(self, label_selector, **kwargs):
+        if self.error:
+            raise self.error
+        return SimpleNamespace(
+            items=self.jobs, metadata=SimpleNamespace(resource_version="1")
+        )
+
+
+class Watch:
+    """
+    plays the events of the watcher's client once, then stops the watcher
+    """
+
+    watcher = None
+
+    def stream(self, func, **kwargs):
+        events, self.watcher.client.events = self.watcher.client.events, []
+        yield from events
+        self.watcher.terminate()
+
+    def stop(self):
+        pass
+
+
+def healthy_watcher(client=None):
+    watcher = JobWatcher(client or JobClient(), retry_interval=0)
+    watcher._healthy = True
+    return watcher
+
+
+class TestJobWatcher(unittest.TestCase):
+    def test_waiting_checks_get_their_job_status(self):
+        watcher = healthy_watcher()
+        waited = []
+        waiter = threading.Thread(
+            target=lambda: waited.append(watcher.wait("default", "a", "uid-a", 5))
+        )
+        waiter.start()
+        # an older job of the same name, and a job still running, don't count
+        watcher._update(job("a", "uid-old", done=True))
+        watcher._update(job("a", "uid-a"))
+        watcher._update(job("b", "uid-b", done=True))
+        self.assertTrue(waiter.is_alive())
+        watcher._update(job("a", "uid-a", done=True))
+        waiter.join(5)
+        self.assertEqual(len(waited), 1)
+        self.assertTrue(waited[0].succeeded)
+        self.assertEqual(waited[0].uid, "uid-a")
+
+    def test_wait_times_out(self):
+        watcher = healthy_watcher()
+        watcher._update(job("a", "uid-a"))
+        self.assertIsNone(watcher.wait("default", "a", "uid-a", 0.05))
+
+    def test_checks_are_called_back_when_their_job_is_done(self):
+        watcher = healthy_watcher()
+        called = []
+        watcher.notify("default", "a", "uid-a", lambda: called.append("a"))
+        watcher.notify("default", "b", "uid-b", lambda: called.append("b"))
+        watcher._update(job("a", "uid-a"))
+        watcher._update(job("a", "uid-old", done=True))
+        self.assertEqual(called, [])
+        watcher._update(job("a", "uid-a", done=True))
+        watcher._update(job("b", "uid-b"), deleted=True)
+        watcher._update(job("a", "uid-a", done=True))
+        self.assertEqual(called, ["a", "b"])
+        # a job which is already done calls back right away
+        watcher.notify("default", "a", "uid-a", lambda: called.append("again"))
+        self.assertEqual(called, ["a", "b", "again"])
+
+    def test_a_failed_watch_hands_the_checks_back_to_polling(self):
+        client = JobClient(error=ApiException(status=500, reason="Error"))
+        watcher = healthy_watcher(client)
+        called = []
+        watcher.notify("default", "a", "uid-a", lambda: called.append("a"))
+        waited = []
+        waiter = threading.Thread(
+            target=lambda: waited.append(watcher.wait("default", "b", "uid-b", 5))
+        )
+        waiter.start()
+        while "default/b" not in watcher._waiters:
+            threading.Event().wait(0.01)
+
+        def stop(*args):
+            watcher.terminate()
+
+        with mock.patch("mozalert.jobwatch.sleep", side_effect=stop):
+            watcher.run()
+        waiter.join(5)
+        self.assertFalse(watcher.healthy)
+        self.assertEqual(called, ["a"])
+        self.assertEqual(waited, [None])
+        # once unhealthy nothing waits on the watch
+        watcher.notify("default", "c", "uid-c", lambda: called.append("c"))
+        self.assertEqual(called, ["a", "c"])
+
+    def test_the_watch_seeds_from_a_list(self):
+        client = JobClient(
+            jobs=[job("a", "uid-a", done=True)],
+            events=[{"type": "MODIFIED", "object": job("b", "uid-b", done=True)}],
+        )
+        watcher = JobWatcher(client)
+        Watch.watcher = watcher
+        with mock.patch("mozalert.jobwatch.watch.Watch", Watch):
+            watcher.run()
+        self.assertEqual(set(watcher._jobs), {"default/a", "default/b"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from mozalert.utils.logbuffer import LogBuffer
+
+
+class TestLogBuffer(unittest.TestCase):
+    def test_small_logs_are_kept_whole(self):
+        logs = LogBuffer()
+        logs.feed(b"one\ntw")
+        logs.feed("o\nthree")
+        logs.close()
+        self.assertEqual(logs.getvalue(), "one\ntwo\nthree\n")
+        self.assertFalse(logs.truncated)
+
+    def test_line_cap(self):
+        logs = LogBuffer(max_lines=3)
+        for i in range(5):
+            logs.feed(f"line {i}\n")
+        self.assertEqual(
+            logs.getvalue(),
+            "[... 2 lines (14 bytes) truncated ...]\nline 2\nline 3\nline 4\n",
+        )
+        self.assertTrue(logs.truncated)
+
+    def test_byte_cap(self):
+        logs = LogBuffer(max_bytes=20)
+        for i in range(5):
+            logs.feed(f"line {i}\n")
+        # lines are 7 bytes, so only two fit
+        self.assertEqual(
+            logs.getvalue(), "[... 3 lines (21 bytes) truncated ...]\nline 3\nline 4\n"
+        )
+
+    def test_runaway_line_keeps_its_tail(self):
+        logs = LogBuffer(max_bytes=10)
+        logs.feed(b"x" * 100 + b"end")
+        logs.close()
+        self.assertEqual(
+            logs.getvalue(), "[... earlier output truncated ...]\nxxxxxxend\n"
+        )
+
+    def test_a_full_tail_read_is_marked_truncated(self):
+        logs = LogBuffer()
+        logs.feed(b"a\nb\n")
+        logs.close(tail_lines=2)
+        self.assertTrue(logs.truncated)
+        logs = LogBuffer()
+        logs.feed(b"a\nb\n")
+        logs.close(tail_lines=3)
+        self.assertFalse(logs.truncated)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from mozalert.logstore import FileLogStore, ConfigMapLogStore, TRUNCATED_MARKER
+from mozalert.utils.logbuffer import LogBuffer
+
+
+class FakeCoreV1:
+    def __init__(self):
+        self.config_maps = {}
+
+    def replace_namespaced_config_map(self, name, namespace, body):
+        self.config_maps[(namespace, name)] = body
+
+
+class TestFileLogStore(unittest.TestCase):
+    def test_stores_the_whole_capture(self):
+        lines = [f"line {i}\n".encode() for i in range(1000)]
+        capture = tempfile.SpooledTemporaryFile()
+        tail = LogBuffer(max_lines=10)
+        for line in lines:
+            capture.write(line)
+            tail.feed(line)
+        with tempfile.TemporaryDirectory() as path:
+            ref = FileLogStore(path=path).write("ns", "check", capture, status="OK")
+            self.assertEqual(ref, f"file://{os.path.join(path, 'ns', 'check.log')}")
+            with open(os.path.join(path, "ns", "check.log"), "rb") as f:
+                header, *stored = f.readlines()
+        self.assertIn(b"OK", header)
+        self.assertEqual(stored, lines)
+        # the status only ever had the tail
+        self.assertEqual(len(tail.getvalue().splitlines()), 11)
+
+    def test_string_logs_end_with_a_newline(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = FileLogStore(path=path)
+            store.write("ns", "check", "no newline")
+            store.write("ns", "check", "")
+            with open(os.path.join(path, "ns", "check.log")) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1], "no newline")
+
+
+class TestConfigMapLogStore(unittest.TestCase):
+    def test_keeps_the_tail(self):
+        api = FakeCoreV1()
+        store = ConfigMapLogStore(client=api, max_bytes=10)
+        ref = store.write("ns", "check", "0123456789abcdef")
+        self.assertEqual(ref, "configmap://ns/mozalert-logs-check")
+        data = api.config_maps[("ns", "mozalert-logs-check")].data
+        self.assertEqual(data["logs"], TRUNCATED_MARKER + "6789abcdef")
+
+    def test_small_logs_are_kept_whole(self):
+        api = FakeCoreV1()
+        ConfigMapLogStore(client=api).write("ns", "check", "all of it\n")
+        data = api.config_maps[("ns", "mozalert-logs-check")].data
+        self.assertEqual(data["logs"], "all of it\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
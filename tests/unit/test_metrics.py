@@ -0,0 +1,67 @@
+import unittest
+
+from mozalert.metrics import MetricsQueue, MetricsQueueItem, MetricsThread, forget
+
+LABELS = dict(name="test", namespace="default", status="OK", escalated=False)
+
+
+class TestMetricsThread(unittest.TestCase):
+    def test_a_bad_sample_doesnt_lose_the_batch(self):
+        metrics = MetricsThread(q=MetricsQueue())
+        metrics.apply(
+            [
+                MetricsQueueItem("mozalert_check_runtime", **LABELS, value="slow"),
+                object(),
+                MetricsQueueItem("mozalert_check_runtime", **LABELS, value=2.5),
+            ]
+        )
+        labels = {k: str(v) for k, v in LABELS.items()}
+        self.assertEqual(
+            metrics.registry.get_sample_value("mozalert_check_runtime", labels), 2.5
+        )
+
+    def test_forget_removes_a_checks_series(self):
+        q = MetricsQueue()
+        metrics = MetricsThread(q=q)
+        other = dict(LABELS, name="other")
+        metrics.apply(
+            [
+                MetricsQueueItem("mozalert_check_runtime", **LABELS, value=1),
+                MetricsQueueItem("mozalert_check_runtime", **other, value=2),
+                MetricsQueueItem(
+                    "mozalert_probe_latency_seconds",
+                    name="test",
+                    namespace="default",
+                    value=0.2,
+                ),
+            ]
+        )
+        forget(q, "test", "default")
+        metrics.apply(q.drain(0))
+
+        def sample(key, **labels):
+            labels = {k: str(v) for k, v in labels.items()}
+            return metrics.registry.get_sample_value(key, labels)
+
+        self.assertIsNone(sample("mozalert_check_runtime", **LABELS))
+        self.assertIsNone(
+            sample(
+                "mozalert_probe_latency_seconds_count", name="test", namespace="default"
+            )
+        )
+        self.assertEqual(sample("mozalert_check_runtime", **other), 2)
+        self.assertEqual([k[1] for k in metrics._children], ["other"])
+
+
+class TestMetricsQueue(unittest.TestCase):
+    def test_forget_isnt_dropped_from_a_full_queue(self):
+        q = MetricsQueue(maxsize=1)
+        q.put(MetricsQueueItem("mozalert_check_runtime", **LABELS, value=1))
+        q.put(MetricsQueueItem("mozalert_check_runtime", **LABELS, value=2))
+        forget(q, "test", "default")
+        self.assertEqual(q.dropped, 1)
+        self.assertEqual([item.key for item in q.drain(0)][-1], "forget")
+
+
+if __name__ == "__main__":
+    unittest.main()
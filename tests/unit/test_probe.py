@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+from mozalert.logstore import FileLogStore
+from mozalert.probe import ProbeCheck, http_probe
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        body = b"x" * self.server.body_size
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpProbe(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.body_size = 4096
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        for _ in range(5):
+            self.assertEqual(http_probe(self.url, timeout=5), "status 200")
+        self.assertEqual(self.server.connections, 1)
+
+    def test_large_body_is_not_downloaded(self):
+        self.server.body_size = 4 * 1024 * 1024
+        self.assertEqual(http_probe(self.url, timeout=5), "status 200")
+
+    def test_unexpected_status(self):
+        self.server.status = 503
+        with self.assertRaises(Exception):
+            http_probe(self.url, timeout=5)
+        self.assertEqual(
+            http_probe(self.url, timeout=5, expected_status=503), "status 503"
+        )
+
+    def test_probe_logs_go_to_the_log_store(self):
+        scheduler = SimpleNamespace(
+            jittered=lambda delay: delay,
+            schedule=lambda *args, **kwargs: SimpleNamespace(cancel=lambda: None),
+        )
+        with tempfile.TemporaryDirectory() as path:
+            check = ProbeCheck(
+                client=object(),
+                pod_client=object(),
+                crd_client=object(),
+                name="probe",
+                namespace="default",
+                check_interval=60,
+                check_type="http",
+                check_url=self.url,
+                timeout=5,
+                spec={},
+                scheduler=scheduler,
+                log_store=FileLogStore(path=path),
+            )
+            check.set_crd_status = lambda: None
+            check.run_job()
+            with open(os.path.join(path, "default", "probe.log")) as f:
+                stored = f.read()
+        self.assertTrue(check.status.OK)
+        self.assertTrue(check.status.logs_ref)
+        self.assertIn("status 200", stored)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from unittest import mock
+
+from mozalert.utils.ratelimit import TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        with mock.patch("mozalert.utils.ratelimit.monotonic", return_value=100):
+            bucket = TokenBucket(10, burst=2)
+            self.assertTrue(bucket.try_acquire())
+            self.assertTrue(bucket.try_acquire())
+            self.assertFalse(bucket.try_acquire())
+            self.assertAlmostEqual(bucket.delay(), 0.1)
+        with mock.patch("mozalert.utils.ratelimit.monotonic", return_value=100.15):
+            self.assertTrue(bucket.try_acquire())
+            self.assertFalse(bucket.try_acquire())
+
+    def test_refill_is_capped_at_burst(self):
+        with mock.patch("mozalert.utils.ratelimit.monotonic", return_value=100):
+            bucket = TokenBucket(10, burst=2)
+        with mock.patch("mozalert.utils.ratelimit.monotonic", return_value=200):
+            self.assertTrue(bucket.try_acquire(2))
+            self.assertFalse(bucket.try_acquire())
+
+    def test_no_rate_is_no_limit(self):
+        bucket = TokenBucket(0)
+        for _ in range(1000):
+            self.assertTrue(bucket.try_acquire())
+        self.assertEqual(bucket.delay(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from mozalert.runnerpool import (
+    REPLICA_LABEL,
+    RUNNER_CONTAINER,
+    RunnerPool,
+    runner_name,
+)
+
+
+def spec(name, args):
+    return {
+        "restart_policy": "Never",
+        "containers": [{"name": name, "image": "mozlenium", "args": args}],
+    }
+
+
+class Pool(RunnerPool):
+    """
+    a pool whose runners start right away and whose execs block until
+    released
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("client", object())
+        super().__init__(identity="mozalert-0", **kwargs)
+        self.execs = []
+        self.starts = []
+        self.release = threading.Event()
+        self.waiting = threading.Event()
+
+    def start_runner(self, key, runner):
+        self.starts.append(key[1])
+        runner.ready = True
+
+    def claim(self, key, runner, blocking=True):
+        if blocking:
+            self.waiting.set()
+        return super().claim(key, runner, blocking=blocking)
+
+    def exec(self, key, container, command, logs, timeout=0):
+        self.execs.append((key[1], container, command))
+        self.release.wait(5)
+        return SimpleNamespace(returncode=0, runtime=0, timed_out=False)
+
+
+class PodClient:
+    """
+    lists the runner pods matching the label selector
+    """
+
+    def __init__(self, pods):
+        self.pods = pods
+
+    def list_pod_for_all_namespaces(self, label_selector):
+        wanted = dict(term.split("=") for term in label_selector.split(","))
+        items = [
+            SimpleNamespace(metadata=SimpleNamespace(namespace="default", name=name))
+            for name, labels in self.pods.items()
+            if all(labels.get(k) == v for k, v in wanted.items())
+        ]
+        return SimpleNamespace(items=items)
+
+
+class TestRunnerPool(unittest.TestCase):
+    def test_checks_differing_in_name_and_args_share_runners(self):
+        self.assertEqual(
+            runner_name("default", spec("check-a", ["https://a"])),
+            runner_name("default", spec("check-b", ["https://b"])),
+        )
+        self.assertNotEqual(
+            runner_name("default", spec("check-a", [])),
+            runner_name("other", spec("check-a", [])),
+        )
+
+    def test_replicas_have_runners_of_their_own(self):
+        self.assertNotEqual(
+            runner_name("default", spec("check-a", []), "mozalert-0"),
+            runner_name("default", spec("check-a", []), "mozalert-1"),
+        )
+
+    def test_only_our_own_runners_are_adopted(self):
+        pods = {
+            "ours": dict(Pool().labels),
+            "theirs": dict(Pool().labels, **{REPLICA_LABEL: "mozalert-1"}),
+        }
+        pool = Pool(client=PodClient(pods))
+        pool.adopt()
+        self.assertEqual(pool.runners, [("default", "ours")])
+
+    def test_busy_runners_get_company(self):
+        pool = Pool(runners_per_spec=2)
+        runs = [
+            threading.Thread(
+                target=pool.run_check,
+                args=("default", spec(f"check-{i}", [str(i)]), "/run", None),
+            )
+            for i in range(3)
+        ]
+        for run in runs:
+            run.start()
+        while len(pool.execs) < 2:
+            threading.Event().wait(0.01)
+        pool.release.set()
+        for run in runs:
+            run.join(5)
+        names = [name for name, _, _ in pool.execs]
+        base = runner_name("default", spec("check", []), "mozalert-0")
+        self.assertEqual(len(names), 3)
+        self.assertEqual(set(names), {f"{base}-0", f"{base}-1"})
+        self.assertEqual({c for _, c, _ in pool.execs}, {RUNNER_CONTAINER})
+        self.assertEqual(sorted(cmd[1] for _, _, cmd in pool.execs), ["0", "1", "2"])
+
+    def test_a_dropped_runner_isnt_handed_to_a_waiting_check(self):
+        pool = Pool(runners_per_spec=1)
+        first = threading.Thread(
+            target=pool.run_check, args=("default", spec("a", ["a"]), "/run", None)
+        )
+        first.start()
+        while not pool.execs:
+            threading.Event().wait(0.01)
+        second = threading.Thread(
+            target=pool.run_check, args=("default", spec("b", ["b"]), "/run", None)
+        )
+        second.start()
+        pool.waiting.wait(5)
+        # the runner's pod goes away while the second check waits for it
+        (key,) = pool.runners
+        dropped = pool._runners[key]
+        pool.forget(key, delete=False)
+        pool.release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(len(pool.execs), 2)
+        # the second check got a runner of its own, started afresh
+        self.assertEqual(pool.starts, [key[1], key[1]])
+        self.assertIsNot(pool._runners[key], dropped)
+        self.assertFalse(dropped.ready)
+
+
+if __name__ == "__main__":
+    unittest.main()
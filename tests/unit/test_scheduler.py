@@ -0,0 +1,77 @@
+import threading
+import unittest
+
+from mozalert.scheduler import Scheduler, phase
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(workers=1, start_rate=0)
+        self.scheduler.daemon = True
+        self.scheduler.start()
+        self.addCleanup(self.scheduler.terminate)
+
+    def test_tasks_run_in_deadline_order(self):
+        ran = []
+        tasks = [
+            self.scheduler.schedule(delay, lambda name=name: ran.append(name))
+            for delay, name in [(0.3, "c"), (0.1, "a"), (0.2, "b")]
+        ]
+        for task in tasks:
+            self.assertTrue(task.join(5))
+        self.assertEqual(ran, ["a", "b", "c"])
+
+    def test_cancelled_tasks_dont_run(self):
+        ran = threading.Event()
+        task = self.scheduler.schedule(0.2, ran.set)
+        task.cancel()
+        self.assertTrue(task.join(1))
+        self.assertTrue(task.cancelled)
+        self.assertFalse(task.started)
+        # a later task runs, so the cancelled one had its chance
+        self.assertTrue(self.scheduler.schedule(0.3, lambda: None).join(5))
+        self.assertFalse(ran.is_set())
+
+    def test_the_task_name_is_borrowed_by_the_worker(self):
+        names = []
+        task = self.scheduler.schedule(
+            0, lambda: names.append(threading.current_thread().name), name="ns/check"
+        )
+        self.assertTrue(task.join(5))
+        self.assertEqual(names, ["ns/check"])
+
+    def test_unlimited_tasks_skip_a_throttled_task(self):
+        scheduler = Scheduler(workers=2, start_rate=0.01, start_burst=1)
+        scheduler.daemon = True
+        scheduler.start()
+        self.addCleanup(scheduler.terminate)
+        # the first task takes the only token, the second waits for the next
+        self.assertTrue(scheduler.schedule(0, lambda: None).join(5))
+        throttled = scheduler.schedule(0, lambda: None)
+        poll = scheduler.schedule(0.05, lambda: None, rate_limited=False)
+        self.assertTrue(poll.join(5))
+        self.assertFalse(throttled.started)
+        self.assertEqual(scheduler.pending, 1)
+
+    def test_reserved_workers_are_added_to_the_pool(self):
+        scheduler = Scheduler(workers=4, reserved=10)
+        self.assertEqual(scheduler.workers, 14)
+
+    def test_jittered(self):
+        scheduler = Scheduler(workers=1, jitter=0.1, max_jitter=2)
+        for _ in range(100):
+            self.assertTrue(10 <= scheduler.jittered(10) <= 11)
+            self.assertTrue(100 <= scheduler.jittered(100) <= 102)
+
+
+class TestPhase(unittest.TestCase):
+    def test_phase_is_stable_and_in_the_window(self):
+        for i in range(100):
+            offset = phase(f"default/check-{i}", 60)
+            self.assertTrue(0 <= offset < 60)
+            self.assertEqual(offset, phase(f"default/check-{i}", 60))
+        self.assertEqual(phase("default/check", 0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import urllib.error
+import urllib.request
+
+from mozalert.service import ServiceEndpoint
+
+
+class TestServiceEndpoint(unittest.TestCase):
+    def serve(self, **kwargs):
+        service = ServiceEndpoint(host="127.0.0.1", port=0, **kwargs)
+        service.daemon = True
+        service.start()
+        self.addCleanup(service.server.shutdown)
+        return f"http://127.0.0.1:{service.server.server_address[1]}"
+
+    def get(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def test_debug_routes_are_off_by_default(self):
+        url = self.serve(debug="")
+        for path in ["/debug/threads", "/debug/profile?seconds=1"]:
+            status, body = self.get(url + path)
+            self.assertEqual((status, body), (200, b"OK\n"))
+
+    def test_debug_routes_when_turned_on(self):
+        url = self.serve(debug="true")
+        status, body = self.get(url + "/debug/threads")
+        self.assertEqual(status, 200)
+        self.assertIn(b"service", body.lower())
+        status, _ = self.get(url + "/debug/nothing")
+        self.assertEqual(status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
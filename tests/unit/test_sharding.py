@@ -0,0 +1,119 @@
+import datetime
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import pytz
+
+from mozalert.sharding import HashRing, ShardCoordinator
+
+KEYS = [f"default/check-{i}" for i in range(200)]
+
+
+class LeaseClient:
+    """
+    a Lease API holding a live lease for every member in members
+    """
+
+    def __init__(self, members):
+        self.members = members
+
+    def patch_namespaced_lease(self, name, namespace, body):
+        pass
+
+    def list_namespaced_lease(self, namespace, label_selector):
+        now = datetime.datetime.now(pytz.utc)
+        items = [
+            SimpleNamespace(
+                metadata=SimpleNamespace(name=f"mozalert-member-{member}"),
+                spec=SimpleNamespace(
+                    holder_identity=member,
+                    renew_time=now,
+                    acquire_time=now,
+                    lease_duration_seconds=15,
+                ),
+            )
+            for member in self.members
+        ]
+        return SimpleNamespace(items=items)
+
+    def delete_namespaced_lease(self, name, namespace):
+        pass
+
+
+def new_coordinator(identity, members):
+    return ShardCoordinator(
+        client=LeaseClient(members),
+        identity=identity,
+        namespace="default",
+        lease_duration=15,
+        renew_interval=5,
+    )
+
+
+class TestHashRing(unittest.TestCase):
+    def test_placement(self):
+        self.assertIsNone(HashRing().owner("default/check"))
+        ring = HashRing(["a", "b", "c"])
+        owners = [ring.owner(key) for key in KEYS]
+        self.assertEqual(owners, [HashRing(["c", "b", "a"]).owner(k) for k in KEYS])
+        # every member gets a fair share
+        for member in ["a", "b", "c"]:
+            self.assertGreater(owners.count(member), len(KEYS) / 6)
+
+    def test_only_the_new_members_keys_move_on_join(self):
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+        self.assertTrue(moved)
+        self.assertLess(len(moved), len(KEYS) / 2)
+        for key in moved:
+            self.assertEqual(after.owner(key), "d")
+
+    def test_only_the_leaving_members_keys_move_on_leave(self):
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "c"])
+        for key in KEYS:
+            if before.owner(key) != "b":
+                self.assertEqual(after.owner(key), before.owner(key))
+
+
+class TestFence(unittest.TestCase):
+    def test_keys_taken_from_a_live_member_are_fenced(self):
+        # b joins a ring a already runs
+        coordinator = new_coordinator("b", ["a", "b"])
+        with mock.patch("mozalert.sharding.monotonic", return_value=100):
+            coordinator.tick()
+        owned = [key for key in KEYS if coordinator.owns(key)]
+        self.assertTrue(owned)
+        with mock.patch("mozalert.sharding.monotonic", return_value=110):
+            self.assertEqual(coordinator.fence(owned[0]), 10)
+        with mock.patch("mozalert.sharding.monotonic", return_value=121):
+            self.assertEqual(coordinator.fence(owned[0]), 0)
+
+    def test_keys_of_an_expired_member_wait_a_renew_interval(self):
+        coordinator = new_coordinator("b", ["a", "b"])
+        with mock.patch("mozalert.sharding.monotonic", return_value=100):
+            coordinator.tick()
+        moved = [key for key in KEYS if coordinator.owner(key) == "a"]
+        coordinator.client.members = ["b"]
+        with mock.patch("mozalert.sharding.monotonic", return_value=200):
+            coordinator.tick()
+        with mock.patch("mozalert.sharding.monotonic", return_value=202):
+            self.assertEqual(coordinator.fence(moved[0]), 3)
+
+    def test_keys_we_already_owned_are_not_fenced(self):
+        coordinator = new_coordinator("b", ["a", "b"])
+        with mock.patch("mozalert.sharding.monotonic", return_value=100):
+            coordinator.tick()
+        owned = [key for key in KEYS if coordinator.owns(key)]
+        coordinator.client.members = ["a", "b", "c"]
+        with mock.patch("mozalert.sharding.monotonic", return_value=200):
+            coordinator.tick()
+            for key in owned:
+                if coordinator.owns(key):
+                    self.assertEqual(coordinator.fence(key), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
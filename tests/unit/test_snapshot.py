@@ -0,0 +1,93 @@
+import os
+import json
+import tempfile
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.snapshot import (
+    ConfigMapStateStore,
+    FileStateStore,
+    StateSnapshotter,
+)
+
+STATE = {"default/test": {"uid": "uid-1", "attempt": 2, "job": "job-1"}}
+
+
+class MemoryStore:
+    def __init__(self, data=None):
+        self.data = data
+        self.saves = 0
+
+    def load(self):
+        if self.data is None:
+            raise Exception("unreadable")
+        return json.loads(self.data)
+
+    def save(self, data):
+        self.saves += 1
+        self.data = data
+
+
+class ConfigMapClient:
+    """
+    a ConfigMap API for a ConfigMap which doesn't exist until it's created
+    """
+
+    def __init__(self):
+        self.config_map = None
+        self.created = 0
+
+    def read_namespaced_config_map(self, name, namespace):
+        if self.config_map is None:
+            raise ApiException(status=404, reason="Not Found")
+        return self.config_map
+
+    def replace_namespaced_config_map(self, name, namespace, body):
+        if self.config_map is None:
+            raise ApiException(status=404, reason="Not Found")
+        self.config_map = body
+
+    def create_namespaced_config_map(self, namespace, body):
+        self.created += 1
+        self.config_map = body
+
+
+class TestStateStores(unittest.TestCase):
+    def test_file_store_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = FileStateStore(path=os.path.join(path, "state", "state.json"))
+            self.assertEqual(store.load(), {})
+            store.save(json.dumps({"checks": STATE}))
+            self.assertEqual(store.load(), {"checks": STATE})
+            self.assertEqual(os.listdir(os.path.join(path, "state")), ["state.json"])
+
+    def test_configmap_store_round_trip(self):
+        client = ConfigMapClient()
+        store = ConfigMapStateStore(client=client, name="state", namespace="default")
+        self.assertEqual(store.load(), {})
+        store.save(json.dumps({"checks": STATE}))
+        store.save(json.dumps({"checks": {}}))
+        self.assertEqual(client.created, 1)
+        self.assertEqual(store.load(), {"checks": {}})
+
+
+class TestStateSnapshotter(unittest.TestCase):
+    def test_unchanged_snapshots_arent_saved(self):
+        state = dict(STATE)
+        store = MemoryStore()
+        snapshotter = StateSnapshotter(store, lambda: state)
+        snapshotter.save()
+        snapshotter.save()
+        self.assertEqual(store.saves, 1)
+        state["default/other"] = {"uid": "uid-2"}
+        snapshotter.save()
+        self.assertEqual(store.saves, 2)
+        self.assertEqual(snapshotter.load(), state)
+
+    def test_an_unreadable_snapshot_starts_from_scratch(self):
+        self.assertEqual(StateSnapshotter(MemoryStore(), dict).load(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from mozalert.statuswriter import StatusWriter
+
+
+class CrdClient:
+    """
+    records the status patches, failing those for the names in errors with
+    the given status
+    """
+
+    def __init__(self, errors=None):
+        self.patches = []
+        self.errors = dict(errors or {})
+
+    def patch_namespaced_custom_object_status(
+        self, domain, version, namespace, plural, name, body
+    ):
+        self.patches.append((name, body))
+        if name in self.errors:
+            raise ApiException(status=self.errors[name], reason="Error")
+
+
+def status(state, attempt=0):
+    return {"status": {"state": state, "attempt": attempt}}
+
+
+class TestStatusWriter(unittest.TestCase):
+    def flush(self, writer):
+        """
+        write everything pending. A writer which is shut down drains its
+        queue without waiting on the rate limit
+        """
+        writer.terminate()
+        writer.run()
+        writer._shutdown = False
+
+    def test_patches_for_the_same_check_are_merged(self):
+        client = CrdClient()
+        writer = StatusWriter(client)
+        writer.submit("default", "a", status("RUNNING"))
+        writer.submit("default", "b", status("RUNNING"))
+        writer.submit("default", "a", status("IDLE"))
+        self.flush(writer)
+        # the latest status of a, sent in the place of its first patch
+        self.assertEqual(
+            client.patches, [("a", status("IDLE")), ("b", status("RUNNING"))]
+        )
+        self.assertEqual(writer.stats["submitted"], 3)
+        self.assertEqual(writer.stats["written"], 2)
+
+    def test_unchanged_patches_are_skipped(self):
+        client = CrdClient()
+        writer = StatusWriter(client)
+        writer.submit("default", "a", status("IDLE"))
+        self.flush(writer)
+        writer.submit("default", "a", status("IDLE"))
+        # merged back into what was already written
+        writer.submit("default", "a", status("RUNNING"))
+        writer.submit("default", "a", status("IDLE"))
+        self.flush(writer)
+        self.assertEqual(client.patches, [("a", status("IDLE"))])
+        self.assertEqual(writer.stats["skipped"], 2)
+
+    def test_forgotten_checks_are_written_again(self):
+        client = CrdClient()
+        writer = StatusWriter(client)
+        writer.submit("default", "a", status("IDLE"))
+        self.flush(writer)
+        writer.forget("default", "a")
+        writer.submit("default", "a", status("IDLE"))
+        self.flush(writer)
+        self.assertEqual(len(client.patches), 2)
+
+    def test_failed_patches_are_retried(self):
+        client = CrdClient(errors={"a": 500, "gone": 404})
+        writer = StatusWriter(client, max_retries=2)
+        writer.submit("default", "a", status("IDLE"))
+        writer.submit("default", "gone", status("IDLE"))
+        writer.write(*writer._next())
+        writer.write(*writer._next())
+        del client.errors["a"]
+        self.flush(writer)
+        self.assertEqual([name for name, _ in client.patches], ["a", "gone", "a"])
+        self.assertEqual(writer.stats["failed"], 2)
+        self.assertEqual(writer.stats["pending"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()